@@ -21,13 +21,13 @@ from drivers.eudat import EudatClass
 from drivers.gdrive import GdriveClass
 from drivers.ipfs import IpfsClass
 from helper import helper
-from lib import (  # run_whisper_state_receiver
-    eblocbroker_function_call,
-    run_storage_thread,
-    session_start_msg,
-    state_code,
-)
+from drivers.storage_pool import StoragePool
+from drivers.admission import AdmissionScheduler
+from drivers.prefetch import Prefetcher
+from lib import eblocbroker_function_call, session_start_msg, state_code  # run_whisper_state_receiver
 from libs import mongodb
+from libs.cache_manager import CacheManager
+from libs.journal import journal
 from libs.user_setup import give_RWE_access, user_add
 from utils import (
     CacheType,
@@ -47,7 +47,6 @@ from utils import (
     read_file,
     read_json,
     run,
-    sleep_timer,
     terminate,
     write_to_file,
 )
@@ -59,16 +58,6 @@ given_block_number = vars(args)["bn"]
 pid = str(os.getpid())
 
 
-def wait_till_idle_core_available():
-    while True:
-        idle_cores = slurm.get_idle_cores(is_print_flag=False)
-        # log(f"idle_cores={idle_cores}", "blue")
-        if idle_cores == 0:
-            sleep_timer(sleep_duration=60)
-        else:
-            break
-
-
 def tools(block_number):
     """Checks whether the required functions are in use or not."""
     session_start_msg(env.SLURMUSER, block_number, pid)
@@ -118,7 +107,6 @@ def run_driver():
     # dummy sudo command to get the password when session starts for only to
     # create users and submit the slurm job under another user
     run(["sudo", "printf", "hello"])
-    env.IS_THREADING_ENABLED = False
     config.logging = setup_logger(env.DRIVER_LOG)
     columns = 100
     # driver_cancel_process = None
@@ -173,8 +161,14 @@ def run_driver():
             is_traceback=False,
         )
 
+    storage_pool = None
     if env.IS_THREADING_ENABLED:
         log(f"is_threading={env.IS_THREADING_ENABLED}", color="blue")
+        storage_pool = StoragePool()
+
+    # jobs are not blocked on idle cores, they are staged and queued to be submitted once their cores fit
+    scheduler = AdmissionScheduler()
+    prefetcher = Prefetcher()
 
     Ebb.is_eth_account_locked(env.PROVIDER_ID)
     log(f"is_web3_connected={Ebb.is_web3_connected()}", color="blue")
@@ -198,28 +192,54 @@ def run_driver():
     if not Ebb.is_orcid_verified(env.PROVIDER_ID):
         terminate(f"E: Provider's ({env.PROVIDER_ID}) ORCID is not verified")
 
+    def get_checkpoint(block_number) -> int:
+        """Checkpoint does not pass the jobs that are still in process or queued to be submitted."""
+        block_number = scheduler.get_checkpoint(block_number)
+        if storage_pool:
+            block_number = storage_pool.get_checkpoint(block_number)
+
+        return block_number
+
+    saved_checkpoint = 0
+
+    def save_checkpoint(block_number) -> None:
+        """Save the checkpoint, which never goes below the one that is already saved by a scanned window."""
+        nonlocal saved_checkpoint
+        saved_checkpoint = max(saved_checkpoint, get_checkpoint(block_number))
+        journal.flush()
+        write_to_file(env.BLOCK_READ_FROM_FILE, saved_checkpoint)
+
+    def checkpoint(block_number):
+        """Checkpoint the windows that are completely scanned in catch-up mode."""
+        save_checkpoint(block_number + 1)
+
+    journal.compact()
+    # receipts of the provider transactions, including the ones left pending by the exited end_code processes, are
+    # collected during the driver's lifetime
+    Ebb.tx_manager.start(is_keep_alive=True)
+    cache_manager = CacheManager()
+    cache_manager.scan()
     block_read_from = block_number_saved
     balance_temp = Ebb.get_balance(env.PROVIDER_ID)
     log(f"==> deployed_block_number={deployed_block_number}")
     log(f"==> balance={balance_temp}")
     while True:
-        wait_till_idle_core_available()
+        try:
+            # slurm state is read once per tick, where all the callers are served from the snapshot
+            slurm.snapshot.refresh()
+        except:
+            terminate("E: SLURM is not running on the background. Please run:\nsudo ./bash_scripts/run_slurm.sh")
+
         time.sleep(0.25)
         if not str(block_read_from).isdigit():
             terminate(f"E: block_read_from={block_read_from}")
 
         balance = Ebb.get_balance(env.PROVIDER_ID)
-        try:
-            squeue_output = run(["squeue"])
-            if "squeue: error:" in str(squeue_output):
-                raise
-        except:
-            terminate("E: SLURM is not running on the background. Please run:\nsudo ./bash_scripts/run_slurm.sh")
+        if len(scheduler):
+            log(f"==> [ admission ] {len(scheduler)} staged jobs are waiting for idle cores")
 
-        # Gets real info under the header after the first line
-        if len(f"{squeue_output}\n".split("\n", 1)[1]) > 0:
-            # checks if the squeue output's line number is gretaer than 1
-            log(f"Current slurm running jobs status:\n{squeue_output}", color="yellow")
+        if slurm.snapshot.queue:
+            log(f"Current slurm running jobs status:\n{slurm.snapshot.queue_str()}", color="yellow")
             log("-" * int(columns), "green")
 
         log(f"==> [{get_time()}]")
@@ -231,26 +251,31 @@ def run_driver():
         log(f"==> current_block={current_block_number} | sync_from={block_read_from}")
         log(f"==> is_web3_connected={Ebb.is_web3_connected()}")
         log(f"block_read_from={block_read_from}")
-        flag = True
-        while current_block_number < int(block_read_from):
-            current_block_number = Ebb.get_block_number()
-            if flag:
-                log(
-                    f"## Waiting block number to be updated, it remains constant at {current_block_number}...",
-                    color="blue",
-                )
-            flag = False
-            time.sleep(0.25)
+        if current_block_number < int(block_read_from):
+            log(
+                f"## Waiting block number to be updated, it remains constant at {current_block_number}...",
+                color="blue",
+            )
+            current_block_number = Ebb.wait_block_number(block_read_from)
+
+        Ebb.read_cache.sync(current_block_number)
+        cache_manager.evict(current_block_number)
+        log(f"==> read_cache: {Ebb.read_cache.stats()}")
 
         log(f"Passed incremented block number... Watching from block number={block_read_from}", color="yellow")
         block_read_from = str(block_read_from)  # reading event's location has been updated
         slurm.pending_jobs_check()
-        logged_jobs_to_process = Ebb.run_log_job(block_read_from, env.PROVIDER_ID)
+        logged_jobs_to_process = Ebb.run_log_job(block_read_from, env.PROVIDER_ID, on_window=checkpoint)
         max_blocknumber = 0
         is_provider_received_job = False
         is_already_cached = {}
+        if isinstance(logged_jobs_to_process, list):
+            # inputs are pulled while the jobs are validated one by one
+            for logged_job in logged_jobs_to_process:
+                if not journal.is_accepted(logged_job["blockNumber"], logged_job["logIndex"]):
+                    prefetcher.prefetch(logged_job)
+
         for idx, logged_job in enumerate(logged_jobs_to_process):
-            wait_till_idle_core_available()
             is_provider_received_job = True
             columns_size = int(int(columns) / 2 - 12)
             log("-" * columns_size + f" {idx} " + "-" * columns_size, color="blue")
@@ -260,6 +285,24 @@ def run_driver():
             cloud_storage_id = logged_job.args["cloudStorageID"]
             block_number = logged_job["blockNumber"]
             log(f"job_key={job_key} | index={index}", color="green")
+            if logged_job["blockNumber"] > max_blocknumber:
+                max_blocknumber = logged_job["blockNumber"]
+
+            if storage_pool and storage_pool.is_in_process(job_key, index):
+                log("==> Job is already in process", color="green")
+                continue
+
+            if scheduler.is_queued(job_key, index):
+                log("==> Job is already queued to be submitted", color="green")
+                continue
+
+            if journal.is_accepted(block_number, logged_job["logIndex"]):
+                log(f"==> [ journal ] Job is already {journal.get_state(block_number, logged_job['logIndex'])}")
+                continue
+
+            journal.mark(block_number, logged_job["logIndex"], "seen", job_key=job_key, index=index)
+            prefetcher.prefetch(logged_job)
+
             log(
                 f"received_block_number={block_number} \n"
                 f"transactionHash={logged_job['transactionHash'].hex()} | log_index={logged_job['logIndex']} \n"
@@ -306,9 +349,6 @@ def run_driver():
                     f"is_already_cached={is_already_cached[source_code_hash]}"
                 )
 
-            if logged_job["blockNumber"] > max_blocknumber:
-                max_blocknumber = logged_job["blockNumber"]
-
             try:
                 run(["bash", f"{env.EBLOCPATH}/bash_scripts/is_str_valid.sh", job_key])
             except Exception:
@@ -329,10 +369,12 @@ def run_driver():
             except Exception:
                 continue
 
-            for job in range(1, len(job_infos[0]["core"])):
-                try:
-                    job_infos.append(  # if workflow is given then add jobs into list
-                        Ebb.get_job_info(env.PROVIDER_ID, job_key, index, job, block_number)
+            if len(job_infos[0]["core"]) > 1:
+                try:  # if workflow is given then add jobs into list, fetched within a single batch request
+                    job_infos.extend(
+                        Ebb.get_job_infos(
+                            env.PROVIDER_ID, job_key, index, range(1, len(job_infos[0]["core"])), block_number
+                        )
                     )
                 except Exception:
                     pass
@@ -385,24 +427,32 @@ def run_driver():
                     storage_class = GdriveClass(logged_job, job_infos, requester_md5_id, is_already_cached,)
 
                 # run_storage_process(storage_class)
-                if env.IS_THREADING_ENABLED:
-                    run_storage_thread(storage_class)
+                storage_class.scheduler = scheduler
+                prefetcher.done(job_key, index)
+                if storage_pool:
+                    # job is staged in parallel, the main loop continues with the next job
+                    storage_pool.submit(storage_class, block_number)
                 else:
                     storage_class.run()
             except Exception:
                 _colorize_traceback()
                 sys.exit(1)
-        if len(logged_jobs_to_process) > 0 and max_blocknumber > 0:
+
+        # prefetches of the jobs that are found invalid, refunded or already processed are cancelled
+        prefetcher.cancel_all()
+        if is_provider_received_job and max_blocknumber > 0:
             # updates the latest read block number
             block_read_from = max_blocknumber + 1
-            write_to_file(env.BLOCK_READ_FROM_FILE, block_read_from)
         if not is_provider_received_job:
             # If there is no submitted job for the provider, than block start
             # to read from the current block number and updates the latest read
             # block number read from the file
-            write_to_file(env.BLOCK_READ_FROM_FILE, current_block_number)
             block_read_from = current_block_number
 
+        save_checkpoint(block_read_from)
+        # blocks of the windows that are already scanned are not read again
+        block_read_from = max(block_read_from, saved_checkpoint)
+
 
 if __name__ == "__main__":
     try:
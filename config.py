@@ -107,7 +107,20 @@ class ENV:
         self.WHISPER_INFO = f"{self.LOG_PATH}/whisper_info.json"
         self.WHISPER_LOG = f"{self.LOG_PATH}/whisper_state_receiver.out"
         self.WHISPER_TOPIC = "0x07678231"
-        self.IS_THREADING_ENABLED = False
+        self.IS_THREADING_ENABLED = str(_env.get("IS_THREADING_ENABLED", "")).lower() in ("yes", "true", "t", "1")
+        # number of jobs that are staged in parallel for each storage, used if threading is enabled
+        self.IPFS_WORKERS = int(_env.get("IPFS_WORKERS", 2))
+        self.EUDAT_WORKERS = int(_env.get("EUDAT_WORKERS", 2))
+        self.GDRIVE_WORKERS = int(_env.get("GDRIVE_WORKERS", 2))
+        # number of IPFS hashes that are fetched at the same time across all the jobs
+        self.IPFS_FETCH_CONCURRENCY = int(_env.get("IPFS_FETCH_CONCURRENCY", 4))
+        # disk quota of the public and private caches in GB, cached data is not evicted if it is not set
+        self.CACHE_QUOTA = float(_env.get("CACHE_QUOTA", 0))
+        # inputs of the jobs are prefetched as soon as they are seen, bounded by the in flight data in GB
+        self.PREFETCH_WORKERS = int(_env.get("PREFETCH_WORKERS", 2))
+        self.PREFETCH_BUDGET = float(_env.get("PREFETCH_BUDGET", 20))
+        # patches of the results are compressed by the multi-threaded pigz instead of gzip
+        self.IS_PIGZ_ENABLED = str(_env.get("IS_PIGZ_ENABLED", "")).lower() in ("yes", "true", "t", "1")
         self.PROVIDER_ID = None  # type: Union[str, None]
         if w3:
             self.PROVIDER_ID = w3.toChecksumAddress(_env["PROVIDER_ID"])
@@ -35,7 +35,10 @@ class DataStorage:
             if not w3.isChecksumAddress(provider):
                 provider = w3.toChecksumAddress(provider)
 
-            output = ebb.functions.getJobStorageTime(provider, source_code_hash).call({"from": provider})
+            if ebb == config.ebb:  # read through the cache of the contract
+                output = Contract.eblocbroker.get_job_storage_info(provider, source_code_hash)
+            else:
+                output = ebb.functions.getJobStorageTime(provider, source_code_hash).call({"from": provider})
 
         self.received_block = output[0]
         self.storage_duration = output[1]
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+import threading
+import time
+from typing import List
+
+import config
+import libs.slurm as slurm
+from config import logging
+from utils import _colorize_traceback, log
+
+# seconds a job could wait at the head of the queue, after that smaller jobs are not backfilled ahead of it
+BACKFILL_MAX_WAIT = 3600
+SCHEDULE_INTERVAL = 10
+
+
+class QueuedJob:
+    def __init__(self, storage_class) -> None:
+        self.storage_class = storage_class
+        self.cores = int(storage_class.cores[0])
+        self.run_time = int(storage_class.run_time[0])
+        self.block_number = int(storage_class.logged_job["blockNumber"])
+        self.enqueued_at = time.time()
+
+    def __str__(self) -> str:
+        return f"{self.storage_class.job_key}_{self.storage_class.index}"
+
+
+class AdmissionScheduler:
+    """Submit staged jobs into slurm whenever their cores fit into the idle cores.
+
+    Jobs are staged, where their inputs are downloaded, as soon as they are
+    received. They are queued afterwards instead of blocking the intake of
+    the following jobs. If the job at the head of the queue does not fit, the
+    queued jobs that fit into the idle cores are backfilled in order of their
+    requested run time, unless the head has been waiting for more than
+    `BACKFILL_MAX_WAIT` seconds.
+    """
+
+    def __init__(self) -> None:
+        self.queue: List[QueuedJob] = []
+        self.condition = threading.Condition()
+        self.is_running = True
+        self.thread = threading.Thread(target=self._run, name="admission_scheduler", daemon=True)
+        self.thread.start()
+
+    def __len__(self) -> int:
+        with self.condition:
+            return len(self.queue)
+
+    def is_queued(self, job_key, index) -> bool:
+        with self.condition:
+            return any(
+                queued_job.storage_class.job_key == job_key and int(queued_job.storage_class.index) == int(index)
+                for queued_job in self.queue
+            )
+
+    def get_checkpoint(self, block_number) -> int:
+        """Return the block number that is safe to continue reading from, queued jobs are not submitted yet."""
+        with self.condition:
+            if self.queue:
+                return min(min(queued_job.block_number for queued_job in self.queue), int(block_number))
+
+        return int(block_number)
+
+    def enqueue(self, storage_class) -> None:
+        queued_job = QueuedJob(storage_class)
+        log(f"==> [ admission ] {queued_job} is queued, requested_cores={queued_job.cores}")
+        with self.condition:
+            self.queue.append(queued_job)
+            self.condition.notify()
+
+    def select(self, idle_cores) -> List[QueuedJob]:
+        """Return the queued jobs to submit, that fit into the idle cores."""
+        selected = []
+        with self.condition:
+            if not self.queue:
+                return selected
+
+            head = self.queue[0]
+            if head.cores <= idle_cores:
+                selected.append(head)
+                idle_cores -= head.cores
+            elif time.time() - head.enqueued_at > BACKFILL_MAX_WAIT:
+                return selected  # cores are reserved for the head
+
+            for queued_job in sorted(self.queue[1:], key=lambda queued_job: queued_job.run_time):
+                if queued_job.cores <= idle_cores:
+                    selected.append(queued_job)
+                    idle_cores -= queued_job.cores
+
+            for queued_job in selected:
+                self.queue.remove(queued_job)
+
+        return selected
+
+    def _submit(self, queued_job) -> None:
+        storage_class = queued_job.storage_class
+        # thread is renamed to be able to log into the job's own log file
+        thread = threading.current_thread()
+        thread_name = thread.name
+        thread.name = storage_class.thread_name
+        # handler of the staging thread is already removed, records of this thread are attached to the job's log
+        handler = storage_class.get_thread_handler()
+        config.logging.addHandler(handler)
+        try:
+            storage_class.submit()
+        except BaseException:  # a failed submission should not stop the scheduling of the other jobs
+            _colorize_traceback(str(queued_job))
+            self.fail(queued_job)
+        finally:
+            config.logging.removeHandler(handler)
+            handler.close()
+            thread.name = thread_name
+
+    @staticmethod
+    def fail(queued_job) -> None:
+        """Refund the job that could not be submitted into slurm."""
+        logging.error(f"E: {queued_job} could not be submitted, it is refunded")
+        try:
+            queued_job.storage_class.complete_refund()
+        except Exception:
+            logging.error(f"E: {queued_job} could not be refunded")
+
+    def schedule(self) -> None:
+        with self.condition:
+            if not self.queue:
+                return
+
+        idle_cores = slurm.get_idle_cores(is_print_flag=False, is_refresh=True)
+        if not idle_cores:
+            return
+
+        for queued_job in self.select(idle_cores):
+            log(f"==> [ admission ] {queued_job} is submitted, requested_cores={queued_job.cores}")
+            self._submit(queued_job)
+
+    def _run(self) -> None:
+        while self.is_running:
+            with self.condition:
+                self.condition.wait(timeout=SCHEDULE_INTERVAL)
+
+            try:
+                self.schedule()
+            except BaseException as e:
+                logging.error(f"E: Admission scheduler failed: {e}")
+
+    def shutdown(self) -> None:
+        with self.condition:
+            self.is_running = False
+            self.condition.notify()
+
+        self.thread.join()
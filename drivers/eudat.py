@@ -4,16 +4,19 @@ import json
 import os
 import sys
 import time
-from typing import List
+from typing import Dict, List
 
 from pymongo import MongoClient
 
 import config
 import eblocbroker.Contract as Contract
+import libs.eudat as eudat
 import libs.mongodb as mongodb
+import libs.staging as staging
 from config import env, logging
 from drivers.storage_class import Storage
-from utils import CacheType, _colorize_traceback, generate_md5sum, get_time, log, mkdir, read_json, silent_remove, untar
+from libs.http_download import Transfer
+from utils import CacheType, _colorize_traceback, generate_md5sum, get_time, log, mkdir, read_json, silent_remove
 
 Ebb = Contract.eblocbroker
 
@@ -25,6 +28,7 @@ class EudatClass(Storage):
         self.accept_flag = 0
         self.shareID = {}
         self.tar_downloaded_path = {}
+        self.transfers: Dict[str, Transfer] = {}
         self.source_code_hashes_to_process: List[str] = []
         for source_code_hash in self.source_code_hashes:
             self.source_code_hashes_to_process.append(config.w3.toText(source_code_hash))
@@ -38,33 +42,26 @@ class EudatClass(Storage):
                 return False
         return True
 
-    def search_token(self, f_id, share_list, folder_name):
-        logging.info("Searching share tokens for the related source code folder")
-        for idx in range(len(share_list) - 1, -1, -1):
-            # starts iterating from last item to the first one
-            input_folder_name = share_list[idx]["name"]
-            # removes '/' on the beginning of the string
-            input_folder_name = input_folder_name[1:]
-            share_id = share_list[idx]["id"]
-            # inputOwner = share_list[i]['owner']
-            input_user = f"{share_list[idx]['user']}@b2drop.eudat.eu"
-            if input_folder_name == folder_name and input_user == f_id:
-                self.share_token = str(share_list[idx]["share_token"])
-                self.shareID[folder_name] = {
-                    "shareID": int(share_id),
-                    "share_token": self.share_token,
-                }
-                # adding into mongodb for future usage
-                if mongodb.add_item_share_id(folder_name, share_id, self.share_token):
-                    logging.info("Added into mongodb [ SUCCESS ]")
-                else:
-                    logging.error("E: Something is wrong, Not added into mongodb")
+    def search_token(self, f_id, share, folder_name):
+        share_id = share["id"]
+        self.share_token = str(share["share_token"])
+        self.shareID[folder_name] = {
+            "shareID": int(share_id),
+            "share_token": self.share_token,
+        }
+        # adding into mongodb for future usage
+        if mongodb.add_item_share_id(folder_name, share_id, self.share_token):
+            logging.info("Added into mongodb [ SUCCESS ]")
+        else:
+            logging.error("E: Something is wrong, Not added into mongodb")
 
-                log(f"Found. name={folder_name} | share_id={share_id} | share_token={self.share_token}")
-                config.oc.accept_remote_share(int(share_id))
-                logging.info("share_id is accepted.")
-                self.accept_flag += 1
-                break
+        log(f"Found. name={folder_name} | share_id={share_id} | share_token={self.share_token}")
+        with eudat.session_pool.session() as oc:
+            oc.accept_remote_share(int(share_id))
+
+        eudat.share_cache.accepted(folder_name, f_id)
+        logging.info("share_id is accepted.")
+        self.accept_flag += 1
 
     def cache(self, folder_name, _id) -> bool:
         success = self.is_cached(folder_name, _id)
@@ -91,11 +88,11 @@ class EudatClass(Storage):
                     return True
 
                 self.folder_type_dict[folder_name] = "tar.gz"
-                if not self.eudat_download_folder(cached_folder, folder_name):
+                if not self.eudat_download_folder(cached_folder, folder_name, _id):
                     return False
             else:
                 self.folder_type_dict[folder_name] = "tar.gz"
-                if not self.eudat_download_folder(cached_folder, folder_name):
+                if not self.eudat_download_folder(cached_folder, folder_name, _id):
                     return False
 
             if (
@@ -116,24 +113,27 @@ class EudatClass(Storage):
                 self.folder_type_dict[folder_name] = "tar.gz"
                 return True
 
-            if not self.eudat_download_folder(cached_folder, folder_name):
+            if not self.eudat_download_folder(cached_folder, folder_name, _id):
                 return False
         return True
 
-    def eudat_download_folder(self, results_folder_prev, folder_name) -> bool:
+    def eudat_download_folder(self, results_folder_prev, folder_name, _id=None) -> bool:
         # assumes job is sent as .tar.gz file
         cached_tar_file = f"{results_folder_prev}/{folder_name}.tar.gz"
+        remote_path = f"/{folder_name}/{folder_name}.tar.gz"
         logging.info(f"Downloading output.zip for:\n{folder_name} => {cached_tar_file}")
         for attempt in range(config.RECONNECT_ATTEMPTS):
             try:
-                if config.oc.get_file(f"/{folder_name}/{folder_name}.tar.gz", cached_tar_file):
-                    self.tar_downloaded_path[folder_name] = cached_tar_file
-                    logging.info("Done")
-                else:
-                    logging.error(f"E: Something is wrong; oc could not retrieve the file [attempt:{attempt}]")
-                    return False
+                # partially downloaded file is resumed on the following attempt
+                with eudat.session_pool.session() as oc:
+                    size = eudat.share_cache.get_size(oc, folder_name)
+                    transfer = eudat.download_file(oc, remote_path, cached_tar_file, size)
+
+                self.tar_downloaded_path[folder_name] = cached_tar_file
+                self.transfers[folder_name] = transfer
+                logging.info("Done")
             except Exception:
-                logging.error("Failed to download eudat file")
+                logging.error(f"Failed to download eudat file [attempt={attempt}]")
                 _colorize_traceback()
                 log("Waiting for 5 seconds...")
                 time.sleep(5)
@@ -143,7 +143,20 @@ class EudatClass(Storage):
             self.complete_refund()
             return False
 
-        # TODO: check hash of the downloaded file is correct or not
+        if transfer.md5sum != folder_name:
+            logging.error(f"E: md5sum of the downloaded file={transfer.md5sum} does not match with {folder_name}")
+            silent_remove(cached_tar_file)
+            self.complete_refund()
+            return False
+
+        # md5sum is computed while downloading, the file is not hashed again
+        requester = self.requester_id if results_folder_prev == self.private_dir else None
+        expiry_block = self.get_expiry_block(_id) if _id is not None else None
+        try:
+            self.cache_manager.add(cached_tar_file, folder_name, requester, transfer.md5sum, expiry_block)
+        except Exception as e:
+            logging.warning(f"Failed to index the cached data {cached_tar_file}: {e}")
+
         return True
 
     def eudat_get_share_token(self, f_id):
@@ -168,9 +181,10 @@ class EudatClass(Storage):
                     self.folder_type_dict[folder_name] = "folder"
 
             try:
-                info = config.oc.file_info(f"/{folder_name}/{folder_name}.tar.gz")
+                with eudat.session_pool.session() as oc:
+                    size = eudat.share_cache.get_size(oc, folder_name)
+
                 logging.info("Shared folder is already accepted")
-                size = info.attributes["{DAV:}getcontentlength"]
                 folder_token_flag[folder_name] = True
                 logging.info(f"index=[{idx}]: /{folder_name}/{folder_name}.tar.gz => {size} bytes")
                 # accept_flag += 1  # TODO: delete it seems unneeded
@@ -186,23 +200,11 @@ class EudatClass(Storage):
             pass
 
         logging.info(f"share_id_dict={self.shareID}")
-        for attempt in range(config.RECONNECT_ATTEMPTS):
-            try:
-                share_list = config.oc.list_open_remote_share()
-            except Exception:
-                logging.error(f"E: Failed to list_open_remote_share eudat [attempt={attempt}]")
-                _colorize_traceback()
-                time.sleep(1)
-            else:
-                break
-        else:
-            return False
-
         mongodb_accept_flag = 0
         self.accept_flag = 0
+        folders_to_search = []
         for source_code_hash_text in self.source_code_hashes_to_process:
             folder_name = source_code_hash_text
-
             try:
                 output = mongodb.find_key(self.mc["eBlocBroker"]["shareID"], folder_name)
                 self.shareID[folder_name] = {
@@ -215,16 +217,32 @@ class EudatClass(Storage):
                 if folder_token_flag[folder_name] and bool(self.shareID):
                     self.accept_flag += 1
                 else:
-                    self.search_token(f_id, share_list, folder_name)
+                    folders_to_search.append(folder_name)
 
-            if self.accept_flag is len(self.source_code_hashes):
-                break
-        else:
-            if mongodb_accept_flag is len(self.source_code_hashes):
-                logging.info("Shared token a lready exists on mongodb")
+        if folders_to_search:
+            logging.info("Searching share tokens for the related source code folder")
+            for attempt in range(config.RECONNECT_ATTEMPTS):
+                try:
+                    with eudat.session_pool.session() as oc:
+                        shares = eudat.share_cache.find(oc, folders_to_search, f_id)
+                except Exception:
+                    logging.error(f"E: Failed to list_open_remote_share eudat [attempt={attempt}]")
+                    _colorize_traceback()
+                    time.sleep(1)
+                else:
+                    break
             else:
-                logging.error(f"E: Could not find a shared file. Found ones are: {self.shareID}")
-                raise
+                return False
+
+            for folder_name in folders_to_search:
+                if folder_name in shares:
+                    self.search_token(f_id, shares[folder_name], folder_name)
+
+        if mongodb_accept_flag == len(self.source_code_hashes):
+            logging.info("Shared token a lready exists on mongodb")
+        elif self.accept_flag != len(self.source_code_hashes):
+            logging.error(f"E: Could not find a shared file. Found ones are: {self.shareID}")
+            raise
 
         if bool(self.shareID):
             with open(share_id_file, "w") as f:
@@ -237,8 +255,8 @@ class EudatClass(Storage):
         for source_code_hash_text in self.source_code_hashes_to_process:
             folder_name = source_code_hash_text
             if not self.is_already_cached[folder_name]:
-                info = config.oc.file_info(f"/{folder_name}/{folder_name}.tar.gz")
-                self.data_transfer_in_to_download += int(info.attributes["{DAV:}getcontentlength"])
+                with eudat.session_pool.session() as oc:
+                    self.data_transfer_in_to_download += eudat.share_cache.get_size(oc, folder_name)
         log(f"Total size to download={self.data_transfer_in_to_download} bytes", "blue")
 
     def run(self) -> bool:
@@ -289,7 +307,7 @@ class EudatClass(Storage):
 
         for idx, folder_name in enumerate(self.source_code_hashes_to_process):
             if self.folder_type_dict[folder_name] == "tar.gz":
-                # untar cached tar file into private directory
+                # stage cached tar file into the job's folder
                 tar_to_extract = self.tar_downloaded_path[folder_name]
                 if self.job_key == folder_name:
                     target = self.results_folder
@@ -298,7 +316,7 @@ class EudatClass(Storage):
                     mkdir(target)
 
                 try:
-                    untar(tar_to_extract, target)
+                    staging.stage(tar_to_extract, target)
                 except:
                     return False
 
@@ -3,12 +3,14 @@
 import os
 import subprocess
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import libs.gdrive as gdrive
 import libs.git as git
+import libs.staging as staging
 from config import env, logging
 from drivers.storage_class import Storage
-from lib import calculate_folder_size, echo_grep_awk, log, run, subprocess_call
+from lib import calculate_folder_size, echo_grep_awk, log, run
 from utils import (
     WHERE,
     CacheType,
@@ -23,6 +25,10 @@ from utils import (
 
 
 class GdriveClass(Storage):
+    def __init__(self, logged_job, jobInfo, requester_id, is_already_cached):
+        super().__init__(logged_job, jobInfo, requester_id, is_already_cached)
+        self.is_data_init_done = False
+
     def assign_folder_path_to_download(self, _id, source_code_hash, path):
         if self.cache_type[_id] == CacheType.PUBLIC:
             self.folder_path_to_download[source_code_hash] = path
@@ -130,9 +136,7 @@ class GdriveClass(Storage):
         if self.folder_type_dict[source_code_hash] == "folder":
             try:
                 folder = self.folder_path_to_download[source_code_hash]
-                subprocess_call(
-                    ["gdrive", "download", "--recursive", key, "--force", "--path", folder], 10,
-                )
+                gdrive.download(key, folder, is_recursive=True)
             except:
                 return False
 
@@ -150,8 +154,7 @@ class GdriveClass(Storage):
         else:
             try:
                 folder = self.folder_path_to_download[source_code_hash]
-                cmd = ["gdrive", "download", key, "--force", "--path", folder]
-                subprocess_call(cmd, 10)
+                gdrive.download(key, folder)
             except:
                 return False
 
@@ -178,7 +181,7 @@ class GdriveClass(Storage):
 
     def get_data_init(self, key, _id, is_job_key=False):
         try:
-            gdrive_info = subprocess_call(["gdrive", "info", "--bytes", key, "-c", env.GDRIVE_METADATA], 10)
+            gdrive_info = gdrive.metadata_cache.info(key)
         except Exception as e:
             raise e
 
@@ -186,7 +189,8 @@ class GdriveClass(Storage):
         folder_name = gdrive.get_file_info(gdrive_info, _type="Name")
 
         logging.info(f"mime_type={mime_type}")
-        if is_job_key:
+        if is_job_key and not self.is_data_init_done:
+            self.is_data_init_done = True
             # key for the sourceCode tar.gz file is obtained
             success, self.data_transfer_in_to_download, self.job_key_list, key = gdrive.size(
                 key,
@@ -217,16 +221,6 @@ class GdriveClass(Storage):
                 # TODO: full refund
                 raise
 
-            try:
-                cmd = ["gdrive", "info", "--bytes", key, "-c", env.GDRIVE_METADATA]
-                gdrive_info = subprocess_call(cmd, 1)
-            except:
-                # TODO: gdrive list --query "sharedWithMe"
-                raise
-
-            mime_type = gdrive.get_file_info(gdrive_info, "Mime")
-            name = gdrive.get_file_info(gdrive_info, "Name")
-
         # folder is already stored by its source_code_hash
         source_code_hash = name.replace(".tar.gz", "")
         logging.info(f"name={name}")
@@ -245,8 +239,7 @@ class GdriveClass(Storage):
 
         if "gzip" in mime_type:
             try:
-                cmd = ["gdrive", "info", "--bytes", key, "-c", env.GDRIVE_METADATA]
-                gdrive_info = subprocess_call(cmd, 10)
+                gdrive_info = gdrive.metadata_cache.info(key)
             except Exception as e:
                 _colorize_traceback()
                 raise e
@@ -269,7 +262,7 @@ class GdriveClass(Storage):
 
             try:
                 cache_folder = self.folder_path_to_download[source_code_hash]
-                untar(f"{cache_folder}/{name}", target)
+                staging.stage(f"{cache_folder}/{name}", target)
                 return target
             except Exception as e:
                 _colorize_traceback()
@@ -316,30 +309,34 @@ class GdriveClass(Storage):
             self.thread_log_setup()
 
         log(f"[{get_time()}] job's source code has been sent through Google Drive", color="cyan")
-        if os.path.isdir(self.results_folder):
-            self.get_data_init(key=self.job_key, _id=0, is_job_key=True)
-
         try:
-            # Attempt to download the source code
-            target = self.get_data(key=self.job_key, _id=0, is_job_key=True)
-            if not os.path.isdir(f"{target}/.git"):
-                log(f"Warning: .git folder does not exist within {target}")
-                git.generate_git_repo(target)
+            # key of the source code tar.gz file and the keys of the data files are obtained
+            self.get_data_init(key=self.job_key, _id=0, is_job_key=True)
         except:
-            breakpoint()  # DEBUG
+            _colorize_traceback()
             return False
 
+        keys = [(self.job_key, 0, True)]
+        for idx, (_, value) in enumerate(self.job_key_list.items()):
+            keys.append((value, idx + 1, False))
+
+        # source code and the data files of the job are downloaded concurrently
+        with ThreadPoolExecutor(max_workers=gdrive.WORKERS) as executor:
+            futures = [executor.submit(self.get_data, key, _id, is_job_key) for key, _id, is_job_key in keys]
+            for count, future in enumerate(as_completed(futures), start=1):
+                try:
+                    target = future.result()
+                    if not os.path.isdir(f"{target}/.git"):
+                        log(f"Warning: .git folder does not exist within {target}")
+                        git.generate_git_repo(target)
+                except:
+                    _colorize_traceback()
+                    return False
+
+                log(f"==> [ gdrive ] {count}/{len(keys)} keys of the job are fetched")
+
         if not self.check_run_sh():
             self.complete_refund()
-
-        for idx, (_, value) in enumerate(self.job_key_list.items()):
-            try:
-                target = self.get_data(value, idx + 1)
-                if not os.path.isdir(f"{target}/.git"):
-                    log(f"Warning: .git folder does not exist within {target}")
-                    git.generate_git_repo(target)
-            except:
-                breakpoint()  # DEBUG
-                return False
+            return False
 
         return self.sbatch_call()
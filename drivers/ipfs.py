@@ -8,6 +8,7 @@ import libs.git as git
 import libs.ipfs as ipfs
 from config import ThreadFilter, env, logging, setup_logger  # noqa: F401
 from drivers.storage_class import Storage
+from libs.ipfs_fetch import IpfsFetcher
 from lib import calculate_folder_size, is_ipfs_running
 from utils import CacheType, StorageID, byte_to_mb, bytes32_to_ipfs, get_time, log, mkdir, silent_remove
 
@@ -19,17 +20,21 @@ class IpfsClass(Storage):
         self.cache_type = CacheType.PUBLIC
         self.ipfs_hashes = []
         self.cumulative_sizes = {}
+        self.fetcher = IpfsFetcher()
 
-    def check_ipfs(self, ipfs_hash) -> None:
-        success, ipfs_stat, cumulative_size = ipfs.is_hash_exists_online(ipfs_hash)
-        if not success or "CumulativeSize" not in ipfs_stat:
-            logging.error("E: Markle not found! Timeout for the IPFS object stat retrieve")
+    def check_ipfs(self, ipfs_hashes) -> None:
+        """Stat the hashes concurrently, raises if any of them could not be found."""
+        try:
+            cumulative_sizes = self.fetcher.stat_all(ipfs_hashes)
+        except Exception as e:
+            logging.error(f"E: Markle not found! Timeout for the IPFS object stat retrieve: {e}")
             raise
 
-        self.ipfs_hashes.append(ipfs_hash)
-        self.cumulative_sizes[self.job_key] = cumulative_size
-        data_size_mb = byte_to_mb(cumulative_size)
-        logging.info(f"dataTransferOut={data_size_mb} MB | Rounded={int(data_size_mb)} MB")
+        for ipfs_hash in ipfs_hashes:
+            self.ipfs_hashes.append(ipfs_hash)
+            self.cumulative_sizes[ipfs_hash] = cumulative_sizes[ipfs_hash]
+            data_size_mb = byte_to_mb(cumulative_sizes[ipfs_hash])
+            logging.info(f"{ipfs_hash}: dataTransferOut={data_size_mb} MB | Rounded={int(data_size_mb)} MB")
 
     def run(self) -> bool:
         self.start_time = time.time()
@@ -49,39 +54,54 @@ class IpfsClass(Storage):
             os.makedirs(self.results_folder)
 
         silent_remove(f"{self.results_folder}/{self.job_key}")
-        try:
-            self.check_ipfs(self.job_key)
-        except:
-            return False
-
+        ipfs_hashes = [self.job_key]
         for source_code_hash in self.source_code_hashes:
             ipfs_hash = bytes32_to_ipfs(source_code_hash)
-            if ipfs_hash not in self.ipfs_hashes:
+            if ipfs_hash not in ipfs_hashes:
                 # job_key as data hash already may added to the list
-                try:
-                    self.check_ipfs(ipfs_hash)
-                except:
-                    return False
+                ipfs_hashes.append(ipfs_hash)
+
+        try:
+            self.check_ipfs(ipfs_hashes)
+        except:
+            return False
 
         initial_folder_size = calculate_folder_size(self.results_folder)
+        is_hashed = {}
+        targets = []
+        gpg_sizes = {}
         for idx, ipfs_hash in enumerate(self.ipfs_hashes):
             # here scripts knows that provided IPFS hashes exists
-            is_hashed = False
-            logging.info(f"Attempting to get IPFS file: {ipfs_hash}")
-            if ipfs.is_hash_locally_cached(ipfs_hash):
-                is_hashed = True
+            is_hashed[ipfs_hash] = ipfs.is_hash_locally_cached(ipfs_hash)
+            if is_hashed[ipfs_hash]:
                 log(f"==> IPFS file {ipfs_hash} is already cached.", "blue")
 
-            if idx == 0:
+            if self.cloudStorageID[idx] == StorageID.IPFS_GPG:
+                # encrypted tarball is decrypted and extracted while it is streamed, without intermediate files
+                gpg_sizes[ipfs_hash] = self.cumulative_sizes[ipfs_hash]
+                if idx == 0:
+                    target = self.results_folder
+                else:
+                    target = os.path.join(self.results_data_folder, ipfs_hash)
+                    silent_remove(target)
+            elif idx == 0:
                 target = self.results_folder
             else:
                 #  "_" added before the filename in case $ ipfs get <ipfs_hash>
                 target = f"{self.results_data_folder}/_{ipfs_hash}"
                 mkdir(target)
 
-            is_storage_paid = False  # TODO: should be set before by user input
-            ipfs.get(ipfs_hash, target, is_storage_paid)
-            if idx > 0:
+            targets.append((ipfs_hash, target))
+
+        is_storage_paid = False  # TODO: should be set before by user input
+        try:
+            # all the hashes of the job are fetched concurrently
+            self.fetcher.get_all(targets, is_storage_paid, gpg_sizes)
+        except Exception:
+            return False
+
+        for idx, (ipfs_hash, target) in enumerate(targets):
+            if idx > 0 and ipfs_hash not in gpg_sizes:
                 # https://stackoverflow.com/a/31814223/2402577
                 dst_filename = os.path.join(self.results_data_folder, os.path.basename(ipfs_hash))
                 if os.path.exists(dst_filename):
@@ -89,13 +109,10 @@ class IpfsClass(Storage):
                 shutil.move(target, dst_filename)  # UNIX 'mv' command
                 target = dst_filename
 
-            if self.cloudStorageID[idx] == StorageID.IPFS_GPG:
-                ipfs.decrypt_using_gpg(f"{target}/{ipfs_hash}", target)
-
             if not git.initialize_check(target):
                 return False
 
-            if not is_hashed:
+            if not is_hashed[ipfs_hash]:
                 folder_size = calculate_folder_size(self.results_folder)
                 self.data_transfer_in_to_download += folder_size - initial_folder_size
                 initial_folder_size = folder_size
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Tuple
+
+from config import env, logging
+from libs.ipfs_fetch import fetch_semaphore, get_client
+from utils import StorageID, _colorize_traceback, byte_to_mb, bytes32_to_ipfs, log
+
+REFS_TIMEOUT = 1800  # a prefetch that is not completed in 30 minutes is left to the staging
+
+
+class PrefetchJob:
+    def __init__(self, logged_job) -> None:
+        self.job_key = logged_job.args["jobKey"]
+        self.index = int(logged_job.args["index"])
+        self.ipfs_hashes = []
+        for idx, source_code_hash in enumerate(logged_job.args["sourceCodeHash"]):
+            if logged_job.args["cloudStorageID"][idx] in (StorageID.IPFS, StorageID.IPFS_GPG):
+                ipfs_hash = bytes32_to_ipfs(source_code_hash)
+                if ipfs_hash not in self.ipfs_hashes:
+                    self.ipfs_hashes.append(ipfs_hash)
+
+        self.size = 0
+        self.is_cancelled = threading.Event()
+        self.future = None
+
+    def __str__(self) -> str:
+        return f"{self.job_key}_{self.index}"
+
+
+class Prefetcher:
+    """Speculatively pull the inputs of the jobs as soon as their LogJob events are seen.
+
+    IPFS blocks of the job are fetched into the local IPFS repository, which
+    is the content addressed cache of IPFS, through `ipfs refs -r`, so the
+    following `ipfs get` during staging is served locally. Prefetching is
+    bounded by the `PREFETCH_BUDGET` (GB) of the data in flight and by the
+    free disk space of the IPFS repository. `refs -r` calls are limited by
+    the prefetch workers and `REFS_TIMEOUT` instead of the global fetch
+    semaphore, so a slow prefetch does not hold back the staging. The prefetch
+    of a job that is found invalid or refunded is cancelled. Prefetched blocks
+    are never pinned, the ones that are not pinned by the staging are left to
+    the garbage collection of the IPFS repository, since they could not be
+    told apart from the blocks that were already cached before the prefetch.
+    """
+
+    def __init__(self) -> None:
+        self.executor = ThreadPoolExecutor(max_workers=env.PREFETCH_WORKERS)
+        self.jobs: Dict[Tuple[str, int], PrefetchJob] = {}
+        self.in_flight_size = 0
+        self.lock = threading.Lock()
+
+    def prefetch(self, logged_job) -> None:
+        prefetch_job = PrefetchJob(logged_job)
+        key = (prefetch_job.job_key, prefetch_job.index)
+        if not prefetch_job.ipfs_hashes:
+            return  # EUDAT and GDrive inputs are shared into the provider, they are fetched during staging
+
+        with self.lock:
+            if key in self.jobs:
+                return
+
+            self.jobs[key] = prefetch_job
+
+        prefetch_job.future = self.executor.submit(self._prefetch, prefetch_job)
+
+    def _is_fit(self, size) -> bool:
+        budget = int(env.PREFETCH_BUDGET * (1024 ** 3))
+        with self.lock:
+            if self.in_flight_size + size > budget:
+                return False
+
+            if size > shutil.disk_usage(env.IPFS_REPO).free // 2:
+                return False
+
+            self.in_flight_size += size
+            return True
+
+    def _prefetch(self, prefetch_job) -> None:
+        try:
+            client = get_client()
+            for ipfs_hash in prefetch_job.ipfs_hashes:
+                if prefetch_job.is_cancelled.is_set():
+                    return
+
+                with fetch_semaphore:
+                    size = client.object.stat(ipfs_hash, timeout=300)["CumulativeSize"]
+
+                if not self._is_fit(size):
+                    log(f"==> [ prefetch ] {ipfs_hash} is not prefetched, it exceeds the budget")
+                    continue
+
+                prefetch_job.size += size
+                if prefetch_job.is_cancelled.is_set():
+                    return
+
+                client.refs(ipfs_hash, recursive=True, timeout=REFS_TIMEOUT)
+                log(f"==> [ prefetch ] {ipfs_hash} of {prefetch_job} is prefetched, size={byte_to_mb(size)} MB")
+        except Exception as e:
+            logging.warning(f"Prefetch of {prefetch_job} is failed: {e}")
+        finally:
+            with self.lock:
+                self.in_flight_size -= prefetch_job.size
+
+    def cancel(self, job_key, index) -> None:
+        with self.lock:
+            prefetch_job = self.jobs.pop((job_key, int(index)), None)
+
+        if prefetch_job:
+            prefetch_job.is_cancelled.set()
+            if prefetch_job.future.cancel():
+                log(f"==> [ prefetch ] {prefetch_job} is cancelled")
+
+    def done(self, job_key, index) -> None:
+        """Job is accepted, it is not tracked anymore."""
+        with self.lock:
+            self.jobs.pop((job_key, int(index)), None)
+
+    def cancel_all(self) -> None:
+        """Cancel the prefetches of the jobs that are not accepted."""
+        with self.lock:
+            keys = list(self.jobs)
+
+        for job_key, index in keys:
+            try:
+                self.cancel(job_key, index)
+            except Exception:
+                _colorize_traceback()
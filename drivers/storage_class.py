@@ -1,7 +1,6 @@
 import json
 import os
 import subprocess
-import sys
 import time
 import uuid
 from datetime import datetime, timedelta
@@ -14,6 +13,8 @@ import libs.slurm as slurm
 import utils
 from config import ThreadFilter, env, logging
 from lib import log, run
+from libs.cache_manager import CacheManager
+from libs.journal import journal
 from libs.slurm import remove_user
 from libs.sudo import _run_as_sudo
 from libs.user_setup import add_user_to_slurm, give_RWE_access
@@ -22,7 +23,6 @@ from utils import (
     Link,
     _colorize_traceback,
     bytes32_to_ipfs,
-    cd,
     generate_md5sum,
     mkdir,
     read_json,
@@ -71,6 +71,9 @@ class Storage(BaseClass):
         self.start_time = None
         self.mc = None
         self.coll = None
+        self.thread_handler = None
+        self.scheduler = None
+        self.cache_manager = CacheManager()
         utils.log_files[self.thread_name] = self.drivers_log_path
 
         try:
@@ -86,26 +89,36 @@ class Storage(BaseClass):
         mkdir(self.patch_folder)
 
     def thread_log_setup(self):
-        import threading
+        """Attach a dedicated per-thread handler.
+
+        Handlers of the other threads are kept, since jobs could be processed
+        in parallel, the main handler already ignores the records of the threads.
+        """
         import config
 
-        _log = logging.getLogger()  # root logger
-        for hdlr in _log.handlers[:]:  # remove all old handlers
-            _log.removeHandler(hdlr)
+        self.thread_handler = self.get_thread_handler()
+        config.logging.addHandler(self.thread_handler)
+        time.sleep(0.25)
+
+    def get_thread_handler(self):
+        """Return a handler into the job's log file for the records of the current thread."""
+        import threading
 
-        # A dedicated per-thread handler
-        thread_handler = logging.FileHandler(self.drivers_log_path, "a")
+        handler = logging.FileHandler(self.drivers_log_path, "a")
         formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-        thread_handler.setFormatter(formatter)
+        handler.setFormatter(formatter)
         # The ThreadFilter makes sure this handler only accepts logrecords that originate
         # in *this* thread, only. It needs the current thread id for this:
-        thread_handler.addFilter(ThreadFilter(thread_id=threading.get_ident()))
-        config.logging.addHandler(thread_handler)
-        time.sleep(0.25)
-        # config.logging = logging
-        # _log = logging.getLogger()
-        # _log.addHandler(thread_handler)
-        # config.logging = _log
+        handler.addFilter(ThreadFilter(thread_id=threading.get_ident()))
+        return handler
+
+    def thread_log_teardown(self):
+        import config
+
+        if self.thread_handler:
+            config.logging.removeHandler(self.thread_handler)
+            self.thread_handler.close()
+            self.thread_handler = None
 
     def check_already_cached(self, source_code_hash):
         if os.path.isfile(f"{self.private_dir}/{source_code_hash}.tar.gz"):
@@ -133,8 +146,24 @@ class Storage(BaseClass):
             _colorize_traceback()
             raise
 
+    def get_expiry_block(self, _id):
+        """Return the block number until the storage of the data is paid."""
+        try:
+            job_info = self.job_info[0]
+            return int(job_info["received_block"][_id]) + int(job_info["storageDuration"][_id])
+        except (KeyError, IndexError, TypeError):
+            return None
+
     def is_md5sum_matches(self, path, name, _id, folder_type, cache_type) -> bool:
-        output = generate_md5sum(path)
+        # indexed data that is not modified since it is hashed is not hashed again
+        if self.cache_manager.lookup(path, name):
+            output = name
+        else:
+            output = generate_md5sum(path)
+            if output == name:
+                requester = self.requester_id if cache_type == CacheType.PRIVATE else None
+                self.cache_manager.add(path, name, requester, name, self.get_expiry_block(_id))
+
         if output == name:
             # checking is already downloaded folder's hash matches with the given hash
             if self.whoami() == "EudatClass" and folder_type != "":
@@ -211,12 +240,37 @@ class Storage(BaseClass):
             # file permission for the requester's foders should be reset
             give_RWE_access(self.requester_id, self.requester_home)
             give_RWE_access(env.WHOAMI, self.requester_home)
-            self._sbatch_call()
+            self.register_cached_data()
+            journal.mark(self.logged_job["blockNumber"], self.logged_job["logIndex"], "staged")
+            if self.scheduler:
+                # job is submitted by the scheduler once its cores are available
+                self.scheduler.enqueue(self)
+            else:
+                self.submit()
         except Exception:
             logging.error("E: Failed to call _sbatch_call() function")
             _colorize_traceback()
             raise
 
+    def register_cached_data(self) -> None:
+        """Index the data that is cached for the job along with the block until its storage is paid."""
+        for _id, source_code_hash in enumerate(self.source_code_hashes_str):
+            folder = self.folder_path_to_download.get(source_code_hash)
+            if folder not in (self.public_dir, self.private_dir):
+                continue
+
+            requester = self.requester_id if folder == self.private_dir else None
+            for path in (f"{folder}/{source_code_hash}.tar.gz", f"{folder}/{source_code_hash}"):
+                if os.path.exists(path):
+                    try:
+                        self.cache_manager.add(path, source_code_hash, requester, None, self.get_expiry_block(_id))
+                    except Exception as e:
+                        logging.warning(f"Failed to index the cached data {path}: {e}")
+
+    def submit(self):
+        if self._sbatch_call():
+            journal.mark(self.logged_job["blockNumber"], self.logged_job["logIndex"], "submitted")
+
     def _sbatch_call(self):
         job_key = self.logged_job.args["jobKey"]
         index = self.logged_job.args["index"]
@@ -290,14 +344,13 @@ class Storage(BaseClass):
                        sbatch -c$job_core_num $results_folder/${job_key}*${index}.sh --mail-type=ALL
                 """
                 cmd = f'sbatch -N {job_core_num} "{sbatch_file_path}" --mail-type=ALL'
-                with cd(self.results_folder):
-                    try:
-                        job_id = _run_as_sudo(env.SLURMUSER, cmd, shell=True)
-                    except Exception as e:
-                        if "Invalid account" in str(e):
-                            remove_user(env.SLURMUSER)
-                            add_user_to_slurm(env.SLURMUSER)
-                            job_id = _run_as_sudo(env.SLURMUSER, cmd, shell=True)
+                try:
+                    job_id = _run_as_sudo(env.SLURMUSER, cmd, shell=True, cwd=self.results_folder)
+                except Exception as e:
+                    if "Invalid account" in str(e):
+                        remove_user(env.SLURMUSER)
+                        add_user_to_slurm(env.SLURMUSER)
+                        job_id = _run_as_sudo(env.SLURMUSER, cmd, shell=True, cwd=self.results_folder)
                 time.sleep(1)  # wait 1 second for slurm idle core to be updated
             except Exception:
                 _colorize_traceback()
@@ -306,7 +359,7 @@ class Storage(BaseClass):
             else:
                 break
         else:
-            sys.exit(1)
+            raise Exception(f"E: {self.job_key}_{self.index} could not be submitted into slurm")
 
         slurm_job_id = job_id.split()[3]  # "Submitted batch job N"
         logging.info(f"slurm_job_id={slurm_job_id}")
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Tuple
+
+from config import env, logging
+from utils import StorageID, _colorize_traceback, log
+
+
+class StoragePool:
+    """Bounded worker pools to stage the received jobs in parallel.
+
+    Each storage has its own pool, hence a slow EUDAT download does not block
+    the jobs that are received through IPFS. Jobs that are in process are kept
+    along with their block numbers in order to not to advance the block
+    checkpoint past a job that is not completely processed yet.
+    """
+
+    def __init__(self) -> None:
+        self.executors = {
+            "ipfs": ThreadPoolExecutor(max_workers=env.IPFS_WORKERS),
+            "eudat": ThreadPoolExecutor(max_workers=env.EUDAT_WORKERS),
+            "gdrive": ThreadPoolExecutor(max_workers=env.GDRIVE_WORKERS),
+        }
+        self.in_process: Dict[Tuple[str, int], int] = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def get_pool_name(storage_id) -> str:
+        if storage_id in (StorageID.IPFS, StorageID.IPFS_GPG):
+            return "ipfs"
+        elif storage_id == StorageID.EUDAT:
+            return "eudat"
+        elif storage_id == StorageID.GDRIVE:
+            return "gdrive"
+
+        raise Exception(f"E: There is no pool for the storage_id={storage_id}")
+
+    def is_in_process(self, job_key, index) -> bool:
+        with self.lock:
+            return (job_key, int(index)) in self.in_process
+
+    def submit(self, storage_class, block_number):
+        pool_name = self.get_pool_name(storage_class.cloudStorageID[0])
+        with self.lock:
+            self.in_process[(storage_class.job_key, int(storage_class.index))] = int(block_number)
+
+        log(f"==> thread_log_path={storage_class.drivers_log_path}")
+        return self.executors[pool_name].submit(self._run, storage_class)
+
+    def _run(self, storage_class):
+        # thread is renamed to be able to log into the job's own log file
+        thread = threading.current_thread()
+        thread_name = thread.name
+        thread.name = storage_class.thread_name
+        try:
+            return storage_class.run()
+        except BaseException:
+            _colorize_traceback(f"{storage_class.job_key}_{storage_class.index}")
+            return False
+        finally:
+            storage_class.thread_log_teardown()
+            with self.lock:
+                del self.in_process[(storage_class.job_key, int(storage_class.index))]
+
+            logging.info(f"{storage_class.job_key}_{storage_class.index} is processed")
+            thread.name = thread_name
+
+    def get_checkpoint(self, block_number) -> int:
+        """Return the block number that is safe to continue reading from.
+
+        Processing jobs are not accepted yet, so the checkpoint can not pass
+        the block of the earliest processing job.
+        """
+        with self.lock:
+            if self.in_process:
+                return min(min(self.in_process.values()), int(block_number))
+
+        return int(block_number)
+
+    def shutdown(self, wait=True):
+        for executor in self.executors.values():
+            executor.shutdown(wait=wait)
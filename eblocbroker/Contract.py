@@ -1,8 +1,13 @@
 #!/usr/bin/env python3
 
 import sys
+from typing import Dict
 
 from config import Web3NotConnected, env
+from eblocbroker.event_index import EventIndex
+from eblocbroker.gas import GasOracle
+from eblocbroker.read_cache import ReadCache
+from eblocbroker.tx_manager import TxManager
 from utils import _colorize_traceback, read_json, terminate
 
 
@@ -12,6 +17,10 @@ class Contract:
             from imports import connect
 
             self.eBlocBroker, self.w3 = connect()
+            self.event_indexes: Dict[str, EventIndex] = {}
+            self.read_cache = ReadCache(self.eBlocBroker, self.w3)
+            self.gas_oracle = GasOracle(self.w3)
+            self.tx_manager = TxManager(self.w3, self.gas_oracle)
         except Exception as e:
             if type(e).__name__ != "QuietExit":
                 _colorize_traceback()
@@ -20,12 +29,13 @@ class Contract:
     # Imported methods
     # ================
     from eblocbroker.authenticate_orc_id import authenticate_orc_id
-    from eblocbroker.get_provider_info import get_provider_info
+    from eblocbroker.get_provider_info import get_provider_info, get_provider_info_events
     from eblocbroker.process_payment import process_payment
     from eblocbroker.submit_job import submit_job, check_before_submit, is_provider_valid, is_requester_valid
-    from eblocbroker.get_job_info import get_job_info, update_job_cores, get_job_source_code_hashes
+    from eblocbroker.get_job_info import get_job_info, get_job_infos, update_job_cores, get_job_source_code_hashes
+    from eblocbroker.event_index import get_logged_events
     from eblocbroker.get_requester_info import get_requester_info
-    from eblocbroker.log_job import run_log_cancel_refund, run_log_job
+    from eblocbroker.log_job import run_log_cancel_refund, run_log_job, wait_block_number, wait_job_state
     from eblocbroker.register_provider import register_provider
     from eblocbroker.refund import refund
     from eblocbroker.register_requester import register_requester
@@ -55,11 +65,22 @@ class Contract:
         return self.eBlocBroker.call().getJobSize(provider, key)
 
     def is_orcid_verified(self, address):
-        return self.eBlocBroker.functions.isOrcIDVerified(address).call()
+        # orcid could not be unverified once it is verified
+        return self.read_cache.call(
+            "isOrcIDVerified",
+            (address,),
+            lambda block: self.eBlocBroker.functions.isOrcIDVerified(address).call(block_identifier=block),
+            is_sticky=True,
+        )
 
     def does_requester_exist(self, address):
         address = self.w3.toChecksumAddress(address)
-        return self.eBlocBroker.functions.doesRequesterExist(address).call()
+        return self.read_cache.call(
+            "doesRequesterExist",
+            (address,),
+            lambda block: self.eBlocBroker.functions.doesRequesterExist(address).call(block_identifier=block),
+            events=("LogRequester",),
+        )
 
     def does_provider_exist(self, address):
         address = self.w3.toChecksumAddress(address)
@@ -73,8 +94,13 @@ class Contract:
         return self.eBlocBroker.functions.getOwner().call()
 
     def get_balance(self, address):
+        # balance also decreases by withdraw() that does not emit any event
         address = self.w3.toChecksumAddress(address)
-        return self.eBlocBroker.functions.balanceOf(address).call()
+        return self.read_cache.call(
+            "balanceOf",
+            (address,),
+            lambda block: self.eBlocBroker.functions.balanceOf(address).call(block_identifier=block),
+        )
 
     def get_block_number(self):
         return self.w3.eth.blockNumber
@@ -98,7 +124,15 @@ class Contract:
     def withdraw(self, account):
         try:
             account = self.w3.toChecksumAddress(account)
-            tx = self.eBlocBroker.functions.withdraw().transact({"from": account, "gas": 50000})
+            fn = self.eBlocBroker.functions.withdraw()
+            tx = fn.transact(
+                {
+                    "from": account,
+                    "gas": self.gas_oracle.estimate(fn, account),
+                    "gasPrice": self.gas_oracle.get_gas_price(),
+                }
+            )
+            self.read_cache.invalidate("balanceOf", account)
             return tx.hex()
         except Exception:
             _colorize_traceback()
@@ -106,10 +140,8 @@ class Contract:
 
     def set_job_status_running(self, key, index, job_id, start_time):
         try:
-            tx = self.eBlocBroker.functions.setJobStatusRunning(key, int(index), int(job_id), int(start_time)).transact(
-                {"from": self.w3.toChecksumAddress(env.PROVIDER_ID), "gas": 4500000}
-            )
-            return tx.hex()
+            fn = self.eBlocBroker.functions.setJobStatusRunning(key, int(index), int(job_id), int(start_time))
+            return self.tx_manager.send(fn)
         except Exception:
             _colorize_traceback()
             raise
@@ -123,10 +155,8 @@ class Contract:
 
     def register_data(self, source_code_hash, price, commitmentBlockDuration: int):
         try:
-            tx = self.eBlocBroker.functions.registerData(source_code_hash, price, commitmentBlockDuration).transact(
-                {"from": env.PROVIDER_ID, "gas": 100000}
-            )
-            return tx.hex()
+            fn = self.eBlocBroker.functions.registerData(source_code_hash, price, commitmentBlockDuration)
+            return self.tx_manager.send(fn)
         except Exception:
             _colorize_traceback()
             raise
@@ -139,10 +169,21 @@ class Contract:
             raise Web3NotConnected()
 
     def get_job_storage_time(self, addr, source_code_hash):
-        provider_address = self.w3.toChecksumAddress(addr)
-        ret = self.eBlocBroker.call().getJobStorageTime(provider_address, source_code_hash)
+        ret = self.get_job_storage_info(addr, source_code_hash)
         return ret[0], ret[1]
 
+    def get_job_storage_info(self, addr, source_code_hash):
+        """Return (received_block, storage_duration, is_private, is_verified_used) of the source_code_hash."""
+        provider_address = self.w3.toChecksumAddress(addr)
+        return self.read_cache.call(
+            "getJobStorageTime",
+            (provider_address, source_code_hash),
+            lambda block: self.eBlocBroker.functions.getJobStorageTime(provider_address, source_code_hash).call(
+                {"from": provider_address}, block_identifier=block
+            ),
+            events=("LogJob", "LogDataStorageRequest", "LogProcessPayment", "LogStorageDeposit"),
+        )
+
     def is_contract_exists(self):
         try:
             contract = read_json(f"{env.EBLOCPATH}/eblocbroker/contract.json")
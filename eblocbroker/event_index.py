@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+
+"""Local index of the logged eBlocBroker events.
+
+Events are stored on mongodb keyed by their provider, job_key, index and block
+number, so a job's event is found with an indexed lookup instead of scanning
+all the events since the deployed block. For each (event, provider) pair the
+range of the already indexed blocks is kept, hence only the blocks outside of
+that range are fetched from the blockchain. Blocks within
+`CONFIRMATION_BLOCKS` of the head could still be reorganized, so they are not
+indexed, their events are read from the blockchain on each lookup.
+"""
+
+import pickle
+import sys
+from collections.abc import Mapping
+
+from pymongo import ASCENDING, UpdateOne
+from web3.datastructures import AttributeDict
+
+from config import logging
+from eblocbroker.log_job import scan_events
+from libs.mongodb import mc
+
+CONFIRMATION_BLOCKS = 12
+
+
+def _to_dict(value):
+    """Convert AttributeDict objects into plain types to be pickled."""
+    if isinstance(value, Mapping):
+        return {key: _to_dict(item) for key, item in value.items()}
+
+    if isinstance(value, (list, tuple)):
+        return [_to_dict(item) for item in value]
+
+    return value
+
+
+class EventIndex:
+    is_index_created = False
+
+    def __init__(self, ebb, event_name) -> None:
+        self.ebb = ebb
+        self.event_name = event_name
+        self.events = mc["eBlocBroker"]["events"]
+        self.synced_blocks = mc["eBlocBroker"]["events_synced"]
+        if not EventIndex.is_index_created:
+            self.events.create_index(
+                [
+                    ("contract", ASCENDING),
+                    ("event", ASCENDING),
+                    ("provider", ASCENDING),
+                    ("job_key", ASCENDING),
+                    ("index", ASCENDING),
+                    ("block_number", ASCENDING),
+                ]
+            )
+            self.events.create_index(
+                [
+                    ("contract", ASCENDING),
+                    ("event", ASCENDING),
+                    ("provider", ASCENDING),
+                    ("block_number", ASCENDING),
+                    ("log_index", ASCENDING),
+                ],
+                unique=True,
+            )
+            EventIndex.is_index_created = True
+
+    def _key(self, provider) -> dict:
+        return {"contract": self.ebb.address, "event": self.event_name, "provider": provider}
+
+    def get_synced_range(self, provider):
+        """Return the (from_block, to_block) range that is already indexed, None if nothing is indexed."""
+        document = self.synced_blocks.find_one(self._key(provider))
+        if document:
+            return document["from_block"], document["to_block"]
+
+        return None
+
+    def _fetch(self, provider, from_block, to_block) -> None:
+        self.add(provider, scan_events(self.ebb, self.event_name, from_block, to_block, {"provider": str(provider)}))
+
+    def add(self, provider, entries) -> None:
+        requests = []
+        for entry in entries:
+            document = self._key(provider)
+            document["job_key"] = entry.args.get("jobKey")
+            document["index"] = entry.args.get("index")
+            document["block_number"] = entry["blockNumber"]
+            document["log_index"] = entry["logIndex"]
+            _filter = {key: document[key] for key in ("contract", "event", "provider", "block_number", "log_index")}
+            document["entry"] = pickle.dumps(_to_dict(entry))
+            requests.append(UpdateOne(_filter, {"$setOnInsert": document}, upsert=True))
+
+        if requests:
+            self.events.bulk_write(requests, ordered=False)
+
+    def set_synced_range(self, provider, from_block, to_block) -> None:
+        self.synced_blocks.update_one(
+            self._key(provider), {"$set": {"from_block": int(from_block), "to_block": int(to_block)}}, upsert=True
+        )
+
+    def sync(self, provider, from_block, to_block) -> None:
+        """Fetch the events of the blocks, in between the given range, that are not indexed yet."""
+        from_block = int(from_block)
+        to_block = int(to_block)
+        synced_range = self.get_synced_range(provider)
+        if not synced_range:
+            self._fetch(provider, from_block, to_block)
+            self.set_synced_range(provider, from_block, to_block)
+            return
+
+        synced_from, synced_to = synced_range
+        if from_block < synced_from:
+            self._fetch(provider, from_block, synced_from - 1)
+            synced_from = from_block
+
+        if to_block > synced_to:
+            self._fetch(provider, synced_to + 1, to_block)
+            synced_to = to_block
+
+        self.set_synced_range(provider, synced_from, synced_to)
+
+    def fetch(self, provider, job_key, index, from_block, to_block) -> list:
+        """Return the events of the job in between the given range, read from the blockchain without indexing them."""
+        entries = scan_events(self.ebb, self.event_name, from_block, to_block, {"provider": str(provider)})
+        return [
+            entry for entry in entries if entry.args.get("jobKey") == job_key and entry.args.get("index") == int(index)
+        ]
+
+    def find(self, provider, job_key, index, from_block=0, to_block=None):
+        """Return the indexed events of the job sorted by their block number and log index."""
+        block_range = {"$gte": int(from_block)}
+        if to_block is not None:
+            block_range["$lte"] = int(to_block)
+
+        query = self._key(provider)
+        query.update({"job_key": job_key, "index": int(index), "block_number": block_range})
+        cursor = self.events.find(query).sort([("block_number", ASCENDING), ("log_index", ASCENDING)])
+        return [AttributeDict.recursive(pickle.loads(document["entry"])) for document in cursor]
+
+
+def get_logged_events(self, event_name, provider, job_key, index, from_block=None, to_block="latest"):
+    """Return job's logged events, the blocks that are not indexed yet are fetched first."""
+    provider = self.w3.toChecksumAddress(provider)
+    if from_block is None:
+        from_block = self.get_deployed_block_number()
+
+    block_number = self.get_block_number()
+    from_block = int(from_block)
+    to_block = block_number if to_block == "latest" else int(to_block)
+    confirmed_to = min(to_block, block_number - CONFIRMATION_BLOCKS)
+    if event_name not in self.event_indexes:
+        self.event_indexes[event_name] = EventIndex(self.eBlocBroker, event_name)
+
+    event_index = self.event_indexes[event_name]
+    logged_events = []
+    try:
+        if from_block <= confirmed_to:
+            event_index.sync(provider, from_block, confirmed_to)
+            logged_events = event_index.find(provider, job_key, index, from_block, confirmed_to)
+
+        if to_block > confirmed_to:
+            logged_events += event_index.fetch(provider, job_key, index, max(from_block, confirmed_to + 1), to_block)
+    except Exception as e:
+        logging.error(f"E: Failed to sync the {event_name} events: {e}")
+        raise
+
+    return logged_events
+
+
+if __name__ == "__main__":
+    import eblocbroker.Contract as Contract
+
+    Ebb = Contract.eblocbroker
+    if len(sys.argv) == 4:
+        provider = str(sys.argv[1])
+        job_key = str(sys.argv[2])
+        index = int(sys.argv[3])
+    else:
+        print("Please provide [provider, job_key, and index] as arguments")
+        sys.exit(1)
+
+    for event_name in ("LogJob", "LogSetJob", "LogProcessPayment", "LogRefundRequest"):
+        for logged_event in Ebb.get_logged_events(event_name, provider, job_key, index):
+            print(f"{event_name}: block_number={logged_event['blockNumber']} | log_index={logged_event['logIndex']}")
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+
+"""Gas limit and gas price of the transactions.
+
+Gas limit is estimated through estimateGas with a safety margin. Estimates are
+cached per function signature and the shape of its arguments, such as the
+number of the cores of a job, since the gas usage of a call grows with the
+lengths of its arrays rather than their values; the cache is kept under
+LOG_PATH so the short lived end_code processes share it. Gas usage of the
+calls that depend on the state of the job, such as processPayment and refund,
+differs between the calls of the same shape, hence they are always estimated
+and their cached estimate is only used if estimateGas fails. The gas used by each
+mined transaction is compared against its estimate, where an estimate that
+turns out to be too low is raised for the next calls.
+
+Gas price is the percentile of the lowest gas prices accepted in the recent
+blocks, which are fetched once as new blocks arrive.
+"""
+
+import json
+import os
+import threading
+from typing import Dict, Optional
+
+from config import env, logging
+
+MARGIN = 1.2
+CACHE_BLOCKS = 240  # cached estimate is valid for around an hour
+PRICE_BLOCKS = 20
+PRICE_PERCENTILE = 60
+# used if the call could not be estimated, ex: it depends on a transaction that is not mined yet
+FALLBACK_GAS = {
+    "withdraw": 50000,
+    "setJobStatusRunning": 4500000,
+    "registerData": 100000,
+    "processPayment": 4500000,
+    "refund": 4500000,
+}
+STATE_DEPENDENT = ("processPayment", "refund")
+
+
+def _get_shape(arg) -> str:
+    if isinstance(arg, (list, tuple)):
+        shapes = [_get_shape(item) for item in arg]
+        if shapes and shapes.count(shapes[0]) == len(shapes):
+            return f"[{shapes[0]}*{len(shapes)}]"
+
+        return "[" + ",".join(shapes) + "]"
+
+    if isinstance(arg, (str, bytes)):
+        return f"{type(arg).__name__}{len(arg)}"
+
+    return type(arg).__name__
+
+
+def get_key(contract_function) -> str:
+    """Return the function signature along with the shape of its arguments."""
+    types = ",".join(_input["type"] for _input in contract_function.abi["inputs"])
+    return f"{contract_function.fn_name}({types}){_get_shape(contract_function.args)}"
+
+
+class GasOracle:
+    def __init__(self, w3, path=None) -> None:
+        self.w3 = w3
+        self.path = path or f"{env.LOG_PATH}/transactions/gas_estimates.json"
+        self.lock = threading.Lock()
+        self.estimates: Dict[str, dict] = {}
+        self.is_loaded = False
+        self.block_prices: Dict[int, Optional[int]] = {}
+        self.gas_price = 0
+        self.gas_price_block = -1
+
+    def _load(self) -> None:
+        if self.is_loaded:
+            return
+
+        try:
+            with open(self.path) as f:
+                self.estimates = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+        self.is_loaded = True
+
+    def _save(self) -> None:
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(self.estimates, f)
+
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.warning(f"Gas estimates could not be saved, {e}")
+
+    def estimate(self, contract_function, _from) -> int:
+        """Return the gas limit of the call, with the margin on top of its estimate."""
+        key = get_key(contract_function)
+        block_number = self.w3.eth.blockNumber
+        with self.lock:
+            self._load()
+            cached = self.estimates.get(key)
+
+        is_state_dependent = contract_function.fn_name in STATE_DEPENDENT
+        if cached and not is_state_dependent and block_number - cached["block"] < CACHE_BLOCKS:
+            return cached["gas"]
+
+        try:
+            gas = int(contract_function.estimateGas({"from": _from}) * MARGIN)
+        except Exception as e:
+            if cached:
+                return cached["gas"]
+
+            if contract_function.fn_name not in FALLBACK_GAS:
+                raise
+
+            gas = FALLBACK_GAS[contract_function.fn_name]
+            logging.warning(f"Gas of {key} could not be estimated, gas={gas} is used. {e}")
+            return gas
+
+        gas = min(gas, self.w3.eth.getBlock("latest")["gasLimit"])
+        with self.lock:
+            self.estimates[key] = {"gas": gas, "block": block_number}
+            self._save()
+
+        return gas
+
+    def get_gas_price(self) -> int:
+        block_number = self.w3.eth.blockNumber
+        with self.lock:
+            if self.gas_price_block == block_number:
+                return self.gas_price
+
+            first_block = max(block_number - PRICE_BLOCKS + 1, 0)
+            for number in list(self.block_prices):
+                if number < first_block:
+                    del self.block_prices[number]
+
+            for number in range(first_block, block_number + 1):
+                if number not in self.block_prices:
+                    transactions = self.w3.eth.getBlock(number, full_transactions=True)["transactions"]
+                    self.block_prices[number] = min((tx["gasPrice"] for tx in transactions), default=None)
+
+            prices = sorted(price for price in self.block_prices.values() if price is not None)
+            if prices:
+                self.gas_price = prices[min(len(prices) * PRICE_PERCENTILE // 100, len(prices) - 1)]
+            else:  # no transaction in the recent blocks
+                self.gas_price = self.w3.eth.gasPrice
+
+            self.gas_price_block = block_number
+            return self.gas_price
+
+    def record(self, key, gas, gas_used) -> None:
+        """Compare the estimate of the mined transaction with its gasUsed."""
+        ratio = gas_used / gas
+        logging.info(f"{key} gas={gas} gas_used={gas_used} ({ratio:.0%} of the estimate)")
+        with self.lock:
+            self._load()
+            cached = self.estimates.get(key)
+            if gas_used >= gas:
+                logging.error(f"E: {key} ran out of gas, its cached estimate is dropped")
+                self.estimates.pop(key, None)
+                self._save()
+            elif cached and gas_used * MARGIN > cached["gas"]:
+                cached["gas"] = int(gas_used * MARGIN)
+                self._save()
@@ -8,9 +8,53 @@ import config
 from config import logging
 from lib import inv_state_code
 from libs.mongodb import get_job_block_number
+from libs.rpc import batch_call
 from utils import StorageID, _colorize_traceback, bytes32_to_ipfs, empty_bytes32, log
 
 
+def _job_info(job, received, job_owner, dataTransferIn, dataTransferOut, jobPrices, received_block_number) -> dict:
+    return {
+        "stateCode": job[0],
+        "startTime": job[1],
+        "core": None,
+        "run_time": None,
+        "cloudStorageID": None,
+        "received": received,
+        "job_owner": job_owner.lower(),
+        "dataTransferIn": dataTransferIn,
+        "dataTransferOut": dataTransferOut,
+        "availableCore": jobPrices[0],
+        "commitmentBlockDuration": jobPrices[1],
+        "price_core_min": jobPrices[2],
+        "price_data_transfer": jobPrices[3],
+        "price_storage": jobPrices[4],
+        "price_cache": jobPrices[5],
+        "cacheType": None,
+        "resultIpfsHash": "",
+        "completion_time": None,
+        "refundedWei": None,
+        "received_block": None,
+        "receivedWei": None,
+        "cacheDuration": None,
+        "source_code_hash": None,
+        "received_block_number": received_block_number,
+        "data_transfer_in_to_download": None,
+        "data_transfer_out_used": None,
+    }
+
+
+def _update_payment(job_info, logged_receipts, job_key, index) -> None:
+    for logged_receipt in logged_receipts:
+        if logged_receipt.args["jobKey"] == job_key and logged_receipt.args["index"] == int(index):
+            job_info.update({"resultIpfsHash": logged_receipt.args["resultIpfsHash"]})
+            job_info.update({"completion_time": logged_receipt.args["completionTime"]})
+            job_info.update({"receivedWei": logged_receipt.args["receivedWei"]})
+            job_info.update({"refundedWei": logged_receipt.args["refundedWei"]})
+            job_info.update({"data_transfer_in_to_download": logged_receipt.args["dataTransferIn"]})
+            job_info.update({"data_transfer_out_used": logged_receipt.args["dataTransferOut"]})
+            break
+
+
 def update_job_cores(self, job_info, provider, job_key, index, job_id=0, received_block_number=None):
     if not received_block_number:
         received_block_number = self.get_deployed_block_number()
@@ -18,11 +62,7 @@ def update_job_cores(self, job_info, provider, job_key, index, job_id=0, receive
     else:
         to_block = int(received_block_number)
     try:
-        event_filter = config.ebb.events.LogJob.createFilter(
-            fromBlock=int(received_block_number), toBlock=to_block, argument_filters={"provider": str(provider)},
-        )
-
-        logged_jobs = event_filter.get_all_entries()
+        logged_jobs = self.get_logged_events("LogJob", provider, job_key, index, received_block_number, to_block)
         for logged_job in logged_jobs:
             if logged_job.args["jobKey"] == job_key and logged_job.args["index"] == int(index):
                 job_info.update({"core": logged_job.args["core"]})
@@ -46,10 +86,7 @@ def get_job_source_code_hashes(self, job_info, provider, job_key, index, job_id=
         to_block = int(received_block_number)
 
     try:
-        event_filter = config.ebb.events.LogJob.createFilter(
-            fromBlock=int(received_block_number), toBlock=to_block, argument_filters={"provider": str(provider)},
-        )
-        logged_jobs = event_filter.get_all_entries()
+        logged_jobs = self.get_logged_events("LogJob", provider, job_key, index, received_block_number, to_block)
         for logged_job in logged_jobs:
             if logged_job.args["jobKey"] == job_key and logged_job.args["index"] == int(index):
                 job_info.update({"source_code_hash": logged_job.args["sourceCodeHash"]})
@@ -73,34 +110,9 @@ def get_job_info(self, provider, job_key, index, job_id, received_block_number=N
         ).call()
 
         jobPrices = config.ebb.functions.getProviderPricesForJob(provider, job_key, int(index)).call()
-        self.job_info = {
-            "stateCode": job[0],
-            "startTime": job[1],
-            "core": None,
-            "run_time": None,
-            "cloudStorageID": None,
-            "received": received,
-            "job_owner": job_owner.lower(),
-            "dataTransferIn": dataTransferIn,
-            "dataTransferOut": dataTransferOut,
-            "availableCore": jobPrices[0],
-            "commitmentBlockDuration": jobPrices[1],
-            "price_core_min": jobPrices[2],
-            "price_data_transfer": jobPrices[3],
-            "price_storage": jobPrices[4],
-            "price_cache": jobPrices[5],
-            "cacheType": None,
-            "resultIpfsHash": "",
-            "completion_time": None,
-            "refundedWei": None,
-            "received_block": None,
-            "receivedWei": None,
-            "cacheDuration": None,
-            "source_code_hash": None,
-            "received_block_number": received_block_number,
-            "data_transfer_in_to_download": None,
-            "data_transfer_out_used": None,
-        }
+        self.job_info = _job_info(
+            job, received, job_owner, dataTransferIn, dataTransferOut, jobPrices, received_block_number
+        )
 
         self.job_info = self.update_job_cores(self.job_info, provider, job_key, index, job_id, received_block_number)
         if received_block_number is None:
@@ -112,20 +124,10 @@ def get_job_info(self, provider, job_key, index, job_id, received_block_number=N
         # else:
         #    to_block = int(received_block_number)
 
-        event_filter = self.eBlocBroker.events.LogProcessPayment.createFilter(
-            fromBlock=int(received_block_number), toBlock="latest", argument_filters={"provider": str(provider)},
+        logged_receipts = self.get_logged_events(
+            "LogProcessPayment", provider, job_key, index, received_block_number, to_block="latest"
         )
-
-        logged_receipts = event_filter.get_all_entries()
-        for logged_receipt in logged_receipts:
-            if logged_receipt.args["jobKey"] == job_key and logged_receipt.args["index"] == int(index):
-                self.job_info.update({"resultIpfsHash": logged_receipt.args["resultIpfsHash"]})
-                self.job_info.update({"completion_time": logged_receipt.args["completionTime"]})
-                self.job_info.update({"receivedWei": logged_receipt.args["receivedWei"]})
-                self.job_info.update({"refundedWei": logged_receipt.args["refundedWei"]})
-                self.job_info.update({"data_transfer_in_to_download": logged_receipt.args["dataTransferIn"]})
-                self.job_info.update({"data_transfer_out_used": logged_receipt.args["dataTransferOut"]})
-                break
+        _update_payment(self.job_info, logged_receipts, job_key, index)
     except Exception:
         logging.error(f"E: Failed to getJobInfo: {traceback.format_exc()}")
         raise
@@ -137,6 +139,53 @@ def get_job_info(self, provider, job_key, index, job_id, received_block_number=N
     return self.job_info
 
 
+def get_job_infos(self, provider, job_key, index, job_ids, received_block_number=None) -> list:
+    """Return the job infos of the given job_ids of a workflow.
+
+    All contract reads are sent as a single JSON-RPC batch request that is
+    pinned to the same block, and the logged events, which are shared by the
+    jobs of the workflow, are read only once from the event index.
+    """
+    try:
+        provider = config.w3.toChecksumAddress(provider)
+        block_number = self.get_block_number()
+        contract_functions = [config.ebb.functions.getProviderPricesForJob(provider, job_key, int(index))]
+        for job_id in job_ids:
+            contract_functions.append(config.ebb.functions.getJobInfo(provider, job_key, int(index), int(job_id)))
+
+        outputs = batch_call(config.w3, contract_functions, block_number)
+        jobPrices = outputs[0]
+        job_infos = []
+        for (job, received, job_owner, dataTransferIn, dataTransferOut) in outputs[1:]:
+            job_infos.append(
+                _job_info(job, received, job_owner, dataTransferIn, dataTransferOut, jobPrices, received_block_number)
+            )
+
+        if not job_infos:
+            return job_infos
+
+        job_info = self.update_job_cores(dict(job_infos[0]), provider, job_key, index, 0, received_block_number)
+        if received_block_number is None:
+            received_block_number = get_job_block_number(job_info["job_owner"], job_key, index)
+            if received_block_number == 0:
+                received_block_number = self.get_deployed_block_number()
+
+        logged_receipts = self.get_logged_events(
+            "LogProcessPayment", provider, job_key, index, received_block_number, to_block=block_number
+        )
+        for info in job_infos:
+            info.update({"core": job_info["core"]})
+            info.update({"run_time": job_info["run_time"]})
+            info.update({"cloudStorageID": job_info["cloudStorageID"]})
+            info.update({"received_block_number": received_block_number})
+            _update_payment(info, logged_receipts, job_key, index)
+    except Exception:
+        logging.error(f"E: Failed to get_job_infos: {traceback.format_exc()}")
+        raise
+
+    return job_infos
+
+
 if __name__ == "__main__":
     import eblocbroker.Contract as Contract
 
@@ -1,15 +1,57 @@
 #!/usr/bin/env python3
 
 import sys
+import threading
+from typing import Dict
 
 from config import env, logging  # noqa: F401
 from utils import _colorize_traceback, log
 
+# provider => merged arguments of its LogProviderInfo events and the last block they are read until
+provider_info_cache: Dict[str, dict] = {}
+provider_info_cache_lock = threading.Lock()
+
+
+def get_provider_info_events(self, provider, block_read_from) -> dict:
+    """Return the merged arguments of the provider's LogProviderInfo events.
+
+    Events are fetched once and only the blocks after the last seen block are
+    read on the next calls, where newly emitted events override the cached
+    values. The cache is reset if the provider is registered again.
+    """
+    with provider_info_cache_lock:
+        cache = provider_info_cache.get(provider)
+        if not cache or cache["block_read_from"] != block_read_from:
+            cache = {"block_read_from": block_read_from, "block_number": int(block_read_from) - 1, "args": {}}
+            provider_info_cache[provider] = cache
+
+        current_block_number = self.get_block_number()
+        if current_block_number > cache["block_number"]:
+            event_filter = self.eBlocBroker.events.LogProviderInfo.createFilter(
+                fromBlock=cache["block_number"] + 1,
+                toBlock=current_block_number,
+                argument_filters={"provider": str(provider)},
+            )
+            for logged_event in event_filter.get_all_entries():
+                for key, value in logged_event.args.items():
+                    if value:  # the most recent emitted non-empty value is used
+                        cache["args"][key] = value
+
+            cache["block_number"] = current_block_number
+
+        return cache["args"].copy()
+
 
 def get_provider_info(self, _provider):
+    # prices could be updated by updateProviderPrices() that does not emit any event
+    provider = self.w3.toChecksumAddress(_provider)
+    return self.read_cache.call("get_provider_info", (provider,), lambda block: _get_provider_info(self, _provider, block))
+
+
+def _get_provider_info(self, _provider, block_identifier="latest"):
     provider = self.w3.toChecksumAddress(_provider)
     try:
-        if not self.eBlocBroker.functions.doesProviderExist(provider).call():
+        if not self.eBlocBroker.functions.doesProviderExist(provider).call(block_identifier=block_identifier):
             logging.error(
                 f"\nE: Provider {provider} is not registered."
                 "\nPlease try again with registered Ethereum Address as provider."
@@ -23,19 +65,10 @@ def get_provider_info(self, _provider):
         raise
 
     try:
-        block_read_from, providerPriceInfo = self.eBlocBroker.functions.getProviderInfo(provider, 0).call()
-        event_filter = self.eBlocBroker.events.LogProviderInfo.createFilter(
-            fromBlock=int(block_read_from),
-            # toBlock=int(block_read_from) + 1,
-            argument_filters={"provider": str(provider)},
+        block_read_from, providerPriceInfo = self.eBlocBroker.functions.getProviderInfo(provider, 0).call(
+            block_identifier=block_identifier
         )
-        _event_filter = dict()
-        for idx in range(len(event_filter.get_all_entries()) - 1, -1, -1):
-            for key in event_filter.get_all_entries()[idx].args:
-                if key not in _event_filter:
-                    if event_filter.get_all_entries()[idx].args[key]:
-                        _event_filter[key] = event_filter.get_all_entries()[idx].args[key]
-
+        _event_filter = self.get_provider_info_events(provider, block_read_from)
         # In lists [-1] indicated the most recent emitted event
         provider_info = {
             "address": _provider,
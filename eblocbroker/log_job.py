@@ -6,14 +6,22 @@ http://web3py.readthedocs.io/en/latest/filters.html#examples-listening-for-event
 
 import sys
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 import config
+from config import logging
+from libs.subscription import subscribe_logs, subscribe_new_heads, try_subscribe
+from utils import CacheType, StorageID, bytes32_to_ipfs, log
 
-# from config import logging
-from utils import CacheType, StorageID, bytes32_to_ipfs
+CATCH_UP_BLOCKS = 10000  # block gap where the catch-up mode is used
+CATCH_UP_WINDOW = 2000  # initial number of blocks fetched in a window
+CATCH_UP_MAX_WINDOW = 100000
+CATCH_UP_WINDOW_EVENTS = 1000  # number of events fetched in a window is kept around this number
+CATCH_UP_WORKERS = 4
 
 
-def log_return(event_filter, poll_interval):
+def _poll_log_return(event_filter, poll_interval):
     sleep_duration = 0
     while True:
         block_num = config.Ebb.get_block_number()
@@ -29,16 +37,205 @@ def log_return(event_filter, poll_interval):
         time.sleep(poll_interval)
 
 
-def run_log_job(self, from_block, provider):
+def log_return(event_filter, poll_interval, timeout=60):
+    """Wait for the new entries of the filter.
+
+    Logs are pushed by geth through a subscription over its IPC socket, so the
+    filter is only re-read when a matching log is delivered. Filter is also
+    read on each timeout to keep it alive on geth, since geth removes the
+    filters that are not read for 5 minutes. Polling is used as the fallback.
+    """
+    subscription = try_subscribe(subscribe_logs, event_filter.filter_params)
+    if not subscription:
+        return _poll_log_return(event_filter, poll_interval)
+
+    sleep_duration = 0
+    try:
+        with subscription:
+            while True:
+                # entries that are logged before the subscription is started are also obtained
+                logged_jobs = event_filter.get_new_entries()
+                if len(logged_jobs) > 0:
+                    return logged_jobs
+
+                sys.stdout.write(f"\r## Waiting logs since {sleep_duration} seconds...")
+                sys.stdout.flush()
+                start = time.time()
+                subscription.wait(timeout)
+                sleep_duration += int(time.time() - start)
+    except Exception as e:
+        logging.warning(f"Subscription is failed, falling back into polling: {e}")
+        return _poll_log_return(event_filter, poll_interval)
+
+
+def wait_block_number(self, block_number, poll_interval=0.25, timeout=60) -> int:
+    """Wait until the block number reaches to the given block number and return the current block number."""
+    current_block_number = self.get_block_number()
+    if current_block_number >= int(block_number):
+        return current_block_number
+
+    subscription = try_subscribe(subscribe_new_heads)
+    if subscription:
+        try:
+            with subscription:
+                # block may be mined before the subscription is started
+                current_block_number = self.get_block_number()
+                while current_block_number < int(block_number):
+                    heads = subscription.wait(timeout)
+                    if heads:
+                        current_block_number = max(int(head["number"], 16) for head in heads)
+                    else:
+                        current_block_number = self.get_block_number()
+
+                return current_block_number
+        except Exception as e:
+            logging.warning(f"Subscription is failed, falling back into polling: {e}")
+
+    current_block_number = self.get_block_number()
+    while current_block_number < int(block_number):
+        time.sleep(poll_interval)
+        current_block_number = self.get_block_number()
+
+    return current_block_number
+
+
+def _is_job_state(entry, job_key, index, job_id, state_code) -> bool:
+    return (
+        entry.args["jobKey"] == job_key
+        and int(entry.args["index"]) == int(index)
+        and int(entry.args["jobID"]) == int(job_id)
+        and int(entry.args["stateCodes"]) == int(state_code)
+    )
+
+
+def wait_job_state(self, provider, job_key, index, job_id, state_code, from_block, timeout=150) -> bool:
+    """Wait until the job's LogSetJob event with the given state code is logged.
+
+    Filter is created before the already logged events are looked up in the
+    event index, so the events logged in between are not missed. New events
+    are pushed through a subscription, polling is used as the fallback.
+    Returns False once the timeout is passed.
+    """
+    deadline = time.time() + timeout
+    provider = self.w3.toChecksumAddress(provider)
+    event_filter = self.eBlocBroker.events.LogSetJob.createFilter(
+        fromBlock=int(from_block), argument_filters={"provider": provider}
+    )
+    subscription = try_subscribe(subscribe_logs, event_filter.filter_params)
+    try:
+        try:
+            logged_events = self.get_logged_events("LogSetJob", provider, job_key, index, from_block)
+            if any(_is_job_state(entry, job_key, index, job_id, state_code) for entry in logged_events):
+                return True
+        except Exception as e:
+            logging.warning(f"Event index is not available, waiting only for the new events: {e}")
+
+        while True:
+            logged_events = event_filter.get_new_entries()
+            if any(_is_job_state(entry, job_key, index, job_id, state_code) for entry in logged_events):
+                return True
+
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+
+            if subscription:
+                try:
+                    subscription.wait(min(remaining, 60))
+                    continue
+                except Exception as e:
+                    logging.warning(f"Subscription is failed, falling back into polling: {e}")
+                    subscription.close()
+                    subscription = None
+
+            time.sleep(min(remaining, 1))
+    finally:
+        if subscription:
+            subscription.close()
+
+        self.w3.eth.uninstallFilter(event_filter.filter_id)
+
+
+def _get_logs(contract, event_name, from_block, to_block, argument_filters):
+    """Return logs of the window along with whether the window has been split.
+
+    Window is split into halves if the node rejects it, such as on timeout or
+    when the query returns too many results.
+    """
+    try:
+        entries = getattr(contract.events, event_name).getLogs(
+            argument_filters=argument_filters, fromBlock=from_block, toBlock=to_block
+        )
+        return list(entries), False
+    except Exception as e:
+        if from_block == to_block:
+            raise
+
+        middle = (from_block + to_block) // 2
+        logging.warning(f"Failed to fetch logs in [{from_block}, {to_block}], window is split: {e}")
+        first_entries, _ = _get_logs(contract, event_name, from_block, middle, argument_filters)
+        second_entries, _ = _get_logs(contract, event_name, middle + 1, to_block, argument_filters)
+        return first_entries + second_entries, True
+
+
+def scan_events(contract, event_name, from_block, to_block, argument_filters=None, on_window=None):
+    """Yield the events of the block range in their block number and log index order.
+
+    Range is split into block windows that are fetched concurrently, where the
+    size of the following windows is adapted based on the number of the events
+    fetched in a window. `on_window(block_number)` is called once all the
+    events of a window, ending at that block number, are consumed.
+    """
+    from_block = int(from_block)
+    to_block = int(to_block)
+    window_size = CATCH_UP_WINDOW
+    next_block = from_block
+    futures = deque()  # type: deque
+    with ThreadPoolExecutor(max_workers=CATCH_UP_WORKERS) as executor:
+        while futures or next_block <= to_block:
+            while len(futures) < CATCH_UP_WORKERS and next_block <= to_block:
+                window_to = min(next_block + window_size - 1, to_block)
+                future = executor.submit(_get_logs, contract, event_name, next_block, window_to, argument_filters)
+                futures.append((window_to, window_to - next_block + 1, future))
+                next_block = window_to + 1
+
+            window_to, size, future = futures.popleft()
+            entries, is_split = future.result()
+            if is_split or len(entries) > CATCH_UP_WINDOW_EVENTS:
+                window_size = max(1, size // 2)
+            elif len(entries) < CATCH_UP_WINDOW_EVENTS // 4:
+                window_size = min(CATCH_UP_MAX_WINDOW, size * 2)
+
+            for entry in sorted(entries, key=lambda entry: (entry["blockNumber"], entry["logIndex"])):
+                yield entry
+
+            if on_window:
+                on_window(window_to)
+
+
+def run_log_job(self, from_block, provider, on_window=None):
+    """Return the LogJob events of the provider since the given block number.
+
+    If the driver is behind more than `CATCH_UP_BLOCKS`, events are streamed
+    through `scan_events()` instead of a single filter over the whole range.
+    Read cache is pinned to the block that the events are fetched up to, so
+    the views of the returned jobs are not read at a block before them.
+    """
+    to_block = self.get_block_number()
+    if to_block - int(from_block) > CATCH_UP_BLOCKS:
+        log(f"==> Catching up {to_block - int(from_block)} blocks in between [{from_block}, {to_block}]")
+        self.read_cache.sync(to_block)
+        return scan_events(self.eBlocBroker, "LogJob", from_block, to_block, {"provider": str(provider)}, on_window)
+
     event_filter = self.eBlocBroker.events.LogJob.createFilter(
         fromBlock=int(from_block), toBlock="latest", argument_filters={"provider": str(provider)},
     )
     logged_jobs = event_filter.get_all_entries()
+    if len(logged_jobs) == 0:
+        logged_jobs = log_return(event_filter, poll_interval=2)
 
-    if len(logged_jobs) > 0:
-        return logged_jobs
-    else:
-        return log_return(event_filter, poll_interval=2)
+    self.read_cache.sync(max(logged_job["blockNumber"] for logged_job in logged_jobs))
+    return logged_jobs
 
 
 def run_log_cancel_refund(self, from_block, provider):
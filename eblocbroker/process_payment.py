@@ -60,15 +60,12 @@ def process_payment(
             run_time,
             final_job,
         ]
-        tx = self.eBlocBroker.functions.processPayment(job_key, args, int(elapsed_time), _result_ipfs_hash).transact(
-            {"from": env.PROVIDER_ID, "gas": 4500000}
-        )
+        fn = self.eBlocBroker.functions.processPayment(job_key, args, int(elapsed_time), _result_ipfs_hash)
+        return self.tx_manager.send(fn, job=(job_key, index))
     except Exception:
         _colorize_traceback()
         raise
 
-    return tx.hex()
-
 
 if __name__ == "__main__":
     from eblocbroker.Contract import Contract
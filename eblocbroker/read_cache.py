@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+"""Read-through cache of the contract's view functions.
+
+Each value is read at the pinned block number and is kept as long as none of
+the events that could change it is emitted. When the block number is synced,
+logs of the contract that are emitted in between are fetched with a single
+`eth_getLogs` call and the entries that are related to them are dropped.
+Values of functions that could change without emitting an event are only
+served within the block they are read at.
+"""
+
+import threading
+from typing import Any, Dict, Tuple
+
+from eth_utils import event_abi_to_log_topic
+
+from config import logging
+
+# events that are not indexed by the address of the entries, they invalidate all the related entries
+GLOBAL_EVENTS = {"LogStorageDeposit"}
+
+# blocks to be scanned at most during sync, the whole cache is dropped instead if exceeded
+MAX_SYNC_BLOCKS = 1000
+
+
+class ReadCache:
+    def __init__(self, ebb, w3) -> None:
+        self.ebb = ebb
+        self.w3 = w3
+        # (function_name, args) => (block_number, value, events, is_sticky)
+        self.entries: Dict[Tuple[str, tuple], Tuple[int, Any, tuple, bool]] = {}
+        self.block_number = None
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.RLock()
+        self.topics = {}
+        for abi in self.ebb.abi:
+            if abi["type"] == "event":
+                self.topics[self.w3.toHex(event_abi_to_log_topic(abi))] = abi["name"]
+
+    def stats(self) -> str:
+        total = self.hits + self.misses
+        ratio = self.hits / total if total else 0
+        return f"hits={self.hits} misses={self.misses} ratio={ratio:.2f} entries={len(self.entries)}"
+
+    def call(self, function_name, args, func, events=(), is_sticky=False):
+        """Return the cached value or call `func(block_identifier)` and cache its value.
+
+        :param events: names of the events that change the returned value, if
+            empty the value is only cached within the block it is read at
+        :param is_sticky: set if a truthy value never changes once it is set
+        """
+        with self.lock:
+            block_number = self.block_number
+            if block_number is None:  # not synced, hence calls are not cached
+                self.misses += 1
+                return func("latest")
+
+            key = (function_name, tuple(args))
+            if key in self.entries:  # entries that are not valid anymore are dropped during sync
+                self.hits += 1
+                return self.entries[key][1]
+
+        value = func(block_number)
+        with self.lock:
+            self.misses += 1
+            if block_number == self.block_number:
+                self.entries[key] = (block_number, value, tuple(events), is_sticky)
+
+        return value
+
+    def invalidate(self, function_name, address=None) -> None:
+        """Drop the entries of the function, only the ones with the given address if it is given."""
+        with self.lock:
+            for key in list(self.entries):
+                if key[0] == function_name and (address is None or self._is_related(key[1], {address.lower()})):
+                    del self.entries[key]
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+    @staticmethod
+    def _is_related(args, addresses) -> bool:
+        return any(isinstance(arg, str) and arg.lower() in addresses for arg in args)
+
+    def _get_logs(self, from_block, to_block) -> list:
+        logs = self.w3.eth.getLogs({"address": self.ebb.address, "fromBlock": from_block, "toBlock": to_block})
+        logged_events = []
+        for _log in logs:
+            event_name = self.topics.get(self.w3.toHex(_log["topics"][0]))
+            if event_name:
+                logged_events.append(getattr(self.ebb.events, event_name)().processLog(_log))
+
+        return logged_events
+
+    def sync(self, block_number) -> None:
+        """Pin the cache into the given block number and drop the entries changed since the last pinned block."""
+        block_number = int(block_number)
+        with self.lock:
+            if self.block_number is not None and block_number <= self.block_number:
+                return
+
+            if self.block_number is None or block_number - self.block_number > MAX_SYNC_BLOCKS:
+                self.entries.clear()
+                self.block_number = block_number
+                return
+
+            try:
+                logged_events = self._get_logs(self.block_number + 1, block_number)
+            except Exception as e:
+                logging.warning(f"Failed to read the logs to invalidate the read cache: {e}")
+                self.entries.clear()
+                self.block_number = block_number
+                return
+
+            for logged_event in logged_events:
+                event_name = logged_event["event"]
+                addresses = {
+                    value.lower()
+                    for value in logged_event.args.values()
+                    if isinstance(value, str) and self.w3.isAddress(value)
+                }
+                for key, entry in list(self.entries.items()):
+                    if event_name in entry[2] and (event_name in GLOBAL_EVENTS or self._is_related(key[1], addresses)):
+                        del self.entries[key]
+
+            # values that are cached only for their own block are dropped
+            for key, entry in list(self.entries.items()):
+                if not entry[2] and not (entry[3] and entry[1]):
+                    del self.entries[key]
+
+            self.block_number = block_number
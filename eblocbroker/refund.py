@@ -24,9 +24,13 @@ def refund(self, provider, _from, job_key, index, job_id, cores, elapsed_time):
         raise
 
     try:
-        gas_limit = 4500000
-        tx = self.eBlocBroker.functions.refund(provider, job_key, index, job_id, cores, elapsed_time).transact(
-            {"from": _from, "gas": gas_limit}
+        fn = self.eBlocBroker.functions.refund(provider, job_key, index, job_id, cores, elapsed_time)
+        if _from == self.w3.toChecksumAddress(env.PROVIDER_ID):
+            # provider's own transactions share its nonce with the other provider transactions
+            return self.tx_manager.send(fn)
+
+        tx = fn.transact(
+            {"from": _from, "gas": self.gas_oracle.estimate(fn, _from), "gasPrice": self.gas_oracle.get_gas_price()}
         )
         return tx.hex()
     except Exception:
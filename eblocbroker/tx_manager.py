@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+
+"""Provider side manager of the transactions that are sent from PROVIDER_ID.
+
+end_code, start_code and the driver run as separate processes, hence their
+transactions contend for the nonce of the same account. Nonces are assigned
+from a queue that is shared through a JSON file under LOG_PATH and guarded by
+a lock file, so transactions are submitted one after another without waiting
+for the receipt of the previous one. Each pending transaction is kept in the
+queue with its raw fields until it is mined; a background thread collects
+their receipts, re-sends the ones that are not mined in time with a higher
+gas price and the queue left by an exited process is resumed by the driver,
+whose thread is kept alive for its lifetime. Short lived processes wait for
+the receipts of their own transactions before they exit; since the driver
+could collect such a receipt first and drop its entry from the queue, hashes
+that are waited for are followed by each process and their receipts are read
+from the node once they leave the queue. Payment of a job is journaled as
+paid only once its successful receipt is collected.
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import zc.lockfile
+from web3.exceptions import TransactionNotFound
+
+import config
+from config import env, logging
+from eblocbroker.gas import get_key
+from libs.journal import journal
+from utils import log
+
+SUBMIT_ATTEMPTS = 3
+POLL_INTERVAL = 2
+LOCK_TIMEOUT = 60
+STUCK_BLOCKS = 4  # pending transaction is re-priced if it is not mined in this many blocks
+REPRICE_FACTOR = 1.125  # geth requires at least 10% higher gas price to replace a pending transaction
+REPRICE_LIMIT = 5
+NONCE_ERRORS = ("nonce too low", "replacement transaction underpriced", "already known", "known transaction")
+# stuck transaction is given the time to be re-priced up to its limit
+RECEIPT_TIMEOUT = config.BLOCK_DURATION * STUCK_BLOCKS * (REPRICE_LIMIT + 1)
+
+
+class TxManager:
+    def __init__(self, w3, gas_oracle, path=None) -> None:
+        self.w3 = w3
+        self.gas_oracle = gas_oracle
+        self.path = path or f"{env.LOG_PATH}/transactions/tx_queue.json"
+        self.lock_path = f"{self.path}.lock"
+        self.lock = threading.Lock()
+        self.receipts: Dict[str, Future] = {}
+        # waited tx_hash => (nonce, tx_hashes of its nonce), as it is last seen in the queue
+        self.waited: Dict[str, Tuple[int, List[str]]] = {}
+        self.thread: Optional[threading.Thread] = None
+        self.is_keep_alive = False
+
+    @property
+    def address(self):
+        return self.w3.toChecksumAddress(env.PROVIDER_ID)
+
+    @contextmanager
+    def _queue_lock(self):
+        """Queue is shared by the threads and the processes of the provider."""
+        with self.lock:
+            deadline = time.time() + LOCK_TIMEOUT
+            while True:
+                try:
+                    lock = zc.lockfile.LockFile(self.lock_path)
+                    break
+                except zc.lockfile.LockError:
+                    if time.time() > deadline:
+                        raise Exception(f"E: {self.lock_path} could not be acquired")
+
+                    time.sleep(0.1)
+
+            try:
+                yield
+            finally:
+                lock.close()
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"nonce": 0, "pending": {}}
+
+    def _save(self, queue) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(queue, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(tmp_path, self.path)
+
+    def send(self, contract_function, job=None) -> str:
+        """Submit the transaction with the next nonce of the provider, returns its tx_hash without waiting for it.
+
+        :param job: (job_key, index) whose payment is journaled as paid once the transaction is mined
+        """
+        fn_name = contract_function.fn_name
+        gas = self.gas_oracle.estimate(contract_function, self.address)
+        gas_price = self.gas_oracle.get_gas_price()
+        with self._queue_lock():
+            queue = self._load()
+            nonce = max(queue["nonce"], self.w3.eth.getTransactionCount(self.address, "pending"))
+            tx = contract_function.buildTransaction(
+                {"from": self.address, "gas": gas, "gasPrice": gas_price, "nonce": nonce}
+            )
+            for attempt in range(SUBMIT_ATTEMPTS):
+                try:
+                    tx_hash = self.w3.eth.sendTransaction(tx).hex()
+                    break
+                except ValueError as e:
+                    if attempt == SUBMIT_ATTEMPTS - 1 or not any(error in str(e) for error in NONCE_ERRORS):
+                        raise
+
+                    # nonce is used by a transaction that is not sent through the queue
+                    logging.warning(f"nonce={tx['nonce']} is already used, {e}")
+                    tx["nonce"] = max(tx["nonce"] + 1, self.w3.eth.getTransactionCount(self.address, "pending"))
+
+            queue["nonce"] = tx["nonce"] + 1
+            queue["pending"][str(tx["nonce"])] = {
+                "fn_name": fn_name,
+                "gas_key": get_key(contract_function),
+                "tx": tx,
+                "tx_hashes": [tx_hash],
+                "sent_block": self.w3.eth.blockNumber,
+                "reprice_count": 0,
+                "job": list(job) if job else None,
+            }
+            self._save(queue)
+
+        log(f"==> {fn_name} tx_hash={tx_hash} nonce={tx['nonce']}")
+        self.start()
+        return tx_hash
+
+    def _get_receipt(self, tx_hashes):
+        for tx_hash in tx_hashes:
+            try:
+                return self.w3.eth.getTransactionReceipt(tx_hash)
+            except TransactionNotFound:  # not mined yet
+                pass
+
+        return None
+
+    def _reprice(self, entry, block_number) -> None:
+        tx = entry["tx"]
+        tx["gasPrice"] = max(int(tx["gasPrice"] * REPRICE_FACTOR), self.gas_oracle.get_gas_price())
+        try:
+            tx_hash = self.w3.eth.sendTransaction(tx).hex()
+        except ValueError as e:  # it could be mined meanwhile, which is caught in the next poll
+            logging.warning(f"{entry['fn_name']} nonce={tx['nonce']} could not be re-priced, {e}")
+            return
+
+        entry["tx_hashes"].append(tx_hash)
+        entry["sent_block"] = block_number
+        entry["reprice_count"] += 1
+        log(f"==> {entry['fn_name']} nonce={tx['nonce']} is re-priced as gas_price={tx['gasPrice']} tx_hash={tx_hash}")
+
+    def _complete(self, entry, receipt) -> None:
+        mined_tx_hash = receipt["transactionHash"].hex()
+        if receipt["status"] != 1:
+            logging.error(f"E: {entry['fn_name']} transaction {mined_tx_hash} is reverted")
+        elif entry.get("job"):
+            job_key, index = entry["job"]
+            journal.mark_job(job_key, index, "paid", tx_hash=mined_tx_hash)
+
+        self.gas_oracle.record(entry.get("gas_key", entry["fn_name"]), entry["tx"]["gas"], receipt["gasUsed"])
+
+        self._resolve(entry["tx_hashes"], receipt)
+
+    def _resolve(self, tx_hashes, receipt=None, exception=None) -> None:
+        for tx_hash in tx_hashes:
+            self.waited.pop(tx_hash, None)
+            future = self.receipts.pop(tx_hash, None)
+            if future and exception:
+                future.set_exception(exception)
+            elif future:
+                future.set_result(receipt)
+
+    def _follow_waited(self, queue, mined_nonce) -> None:
+        """Resolve the waited transactions whose entries are collected by another process."""
+        pending = {}
+        for nonce, entry in queue["pending"].items():
+            for tx_hash in entry["tx_hashes"]:
+                pending[tx_hash] = (int(nonce), list(entry["tx_hashes"]))
+
+        for tx_hash in list(self.receipts):
+            if tx_hash in pending:
+                self.waited[tx_hash] = pending[tx_hash]
+                continue
+
+            nonce, tx_hashes = self.waited.get(tx_hash, (None, [tx_hash]))
+            receipt = self._get_receipt(tx_hashes)
+            if receipt:
+                self._resolve([tx_hash], receipt)
+            elif nonce is not None and nonce < mined_nonce:
+                self._resolve([tx_hash], exception=Exception(f"E: {tx_hash} is replaced by another transaction"))
+
+    def poll(self) -> None:
+        """Collect the receipts of the pending transactions and re-price the ones that are stuck."""
+        with self._queue_lock():
+            queue = self._load()
+            if not queue["pending"] and not self.receipts:
+                return
+
+            block_number = self.w3.eth.blockNumber
+            mined_nonce = self.w3.eth.getTransactionCount(self.address)
+            for nonce, entry in list(queue["pending"].items()):
+                receipt = self._get_receipt(entry["tx_hashes"])
+                if receipt:
+                    del queue["pending"][nonce]
+                    self._complete(entry, receipt)
+                elif int(nonce) < mined_nonce:
+                    del queue["pending"][nonce]
+                    logging.error(f"E: nonce={nonce} of {entry['fn_name']} is used by another transaction")
+                    exception = Exception(f"E: transaction of nonce={nonce} is replaced by another transaction")
+                    self._resolve(entry["tx_hashes"], exception=exception)
+                elif block_number - entry["sent_block"] >= STUCK_BLOCKS and entry["reprice_count"] < REPRICE_LIMIT:
+                    self._reprice(entry, block_number)
+
+            self._follow_waited(queue, mined_nonce)
+            self._save(queue)
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.poll()
+            except Exception as e:
+                logging.error(f"E: Transaction queue could not be polled, {e}")
+
+            with self.lock:  # send() saves its transaction under the lock, so it is not missed while exiting
+                if not self.is_keep_alive and not self.receipts and not self._load()["pending"]:
+                    self.thread = None
+                    return
+
+            time.sleep(POLL_INTERVAL)
+
+    def start(self, is_keep_alive=False) -> None:
+        """Start tracking the receipts of the pending transactions, including the ones left by the other processes.
+
+        Thread exits once the queue is drained unless it is kept alive, as the
+        driver does for its lifetime.
+        """
+        with self.lock:
+            self.is_keep_alive |= is_keep_alive
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="tx_manager", daemon=True)
+                self.thread.start()
+
+    def watch(self, tx_hash) -> Optional[Future]:
+        """Return the future of the receipt of the pending transaction, None if it is not in the queue."""
+        with self._queue_lock():
+            for nonce, entry in self._load()["pending"].items():
+                if tx_hash in entry["tx_hashes"]:
+                    self.waited[tx_hash] = (int(nonce), list(entry["tx_hashes"]))
+                    return self.receipts.setdefault(tx_hash, Future())
+
+        return None
+
+    def wait_receipt(self, tx_hash, timeout=RECEIPT_TIMEOUT):
+        """Return the receipt of the transaction, following its re-priced replacements."""
+        future = self.watch(tx_hash)
+        if future is None:  # already collected
+            return self.w3.eth.waitForTransactionReceipt(tx_hash, timeout=timeout or RECEIPT_TIMEOUT)
+
+        self.start()
+        return future.result(timeout=timeout)
@@ -5,7 +5,8 @@ import getpass
 import os
 import pprint
 import sys
-import time
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError, as_completed
 from typing import Dict, List
 
 from pymongo import MongoClient
@@ -29,6 +30,7 @@ from lib import (
     state_code,
     subprocess_call,
 )
+from libs.journal import journal
 from utils import (
     WHERE,
     StorageID,
@@ -48,6 +50,10 @@ from utils import (
 eBlocBroker, w3 = connect()
 Ebb = Contract.eblocbroker
 mc = MongoClient()
+RUNNING_STATE_TIMEOUT = 150  # seconds to wait for the start_code's tx to be mined
+PAYMENT_ATTEMPTS = 3
+DIFF_WORKERS = 4
+UPLOAD_WORKERS = 4
 
 
 class Common:
@@ -55,23 +61,27 @@ class Common:
 
     def __init__(self) -> None:
         self.results_folder_prev = ""
-        self.patch_file = ""
         self.requester_gpg_fingerprint = ""
-        self.patch_upload_name = ""
         self.results_folder = ""
         self.data_transfer_out = 0.0
+        self.upload_lock = threading.Lock()
+
+    def add_data_transfer_out(self, data_transfer_out) -> None:
+        """Patches are uploaded concurrently, hence the total is updated under the lock."""
+        with self.upload_lock:
+            self.data_transfer_out += data_transfer_out
 
 
 class IpfsGPG(Common):
     def initialize(self):
         pass
 
-    def upload(self, *_) -> bool:
+    def upload(self, source_code_hash, patch_file, *_) -> bool:
         """Upload files right after all the patchings are completed."""
         try:
-            ipfs.gpg_encrypt(self.requester_gpg_fingerprint, self.patch_file)
+            ipfs.gpg_encrypt(self.requester_gpg_fingerprint, patch_file)
         except:
-            silent_remove(self.patch_file)
+            silent_remove(patch_file)
             sys.exit(1)
         return True
 
@@ -91,7 +101,9 @@ class Eudat(Common):
 
     def initialize(self):
         try:
-            eudat.login(env.OC_USER, f"{env.LOG_PATH}/.eudat_provider.txt", env.OC_CLIENT)
+            # results are uploaded by the share tokens, the session is only used to probe the uploaded sizes
+            if not eudat.load_session(env.OC_CLIENT):
+                eudat.login(env.OC_USER, f"{env.LOG_PATH}/.eudat_provider.txt", env.OC_CLIENT)
         except:
             pass
 
@@ -100,21 +112,21 @@ class Eudat(Common):
         except:
             sys.exit(1)
 
-    def upload(self, source_code_hash, *_) -> bool:
+    def upload(self, source_code_hash, patch_file, patch_upload_name, *_) -> bool:
         try:
-            uploaded_file_size = eudat.get_size(f_name=f"{source_code_hash}/{self.patch_upload_name}")
-            size_in_bytes = calculate_folder_size(self.patch_file, _type="bytes")
+            uploaded_file_size = eudat.get_size(f_name=f"{source_code_hash}/{patch_upload_name}")
+            size_in_bytes = calculate_folder_size(patch_file, _type="bytes")
             if uploaded_file_size == float(size_in_bytes):
-                log(f"==> {self.patch_file} is already uploaded")
+                log(f"==> {patch_file} is already uploaded")
                 return True
         except Exception:  # First time uploading
             pass
 
-        _data_transfer_out = calculate_folder_size(self.patch_file)
+        _data_transfer_out = calculate_folder_size(patch_file)
         logging.info(f"[{source_code_hash}]'s data_transfer_out => {_data_transfer_out} MB")
-        self.data_transfer_out += _data_transfer_out
+        self.add_data_transfer_out(_data_transfer_out)
         success = eudat.upload_results(
-            self.encoded_share_tokens[source_code_hash], self.patch_upload_name, self.patch_folder, 5,
+            self.encoded_share_tokens[source_code_hash], patch_upload_name, os.path.dirname(patch_file), 5,
         )
         return success
 
@@ -123,7 +135,7 @@ class Gdrive(Common):
     def initialize(self):
         pass
 
-    def upload(self, key, is_job_key) -> bool:
+    def upload(self, key, patch_file, _, is_job_key) -> bool:
         try:
             if not is_job_key:
                 success, meta_data = gdrive.get_data_key_ids(self.results_folder_prev)
@@ -144,12 +156,13 @@ class Gdrive(Common):
 
         mime_type = gdrive.get_file_info(gdrive_info, "Mime")
         logging.info(f"mime_type={mime_type}")
-        self.data_transfer_out += calculate_folder_size(self.patch_file)
-        logging.info(f"data_transfer_out={self.data_transfer_out} MB => rounded={int(self.data_transfer_out)} MB")
+        _data_transfer_out = calculate_folder_size(patch_file)
+        logging.info(f"[{key}]'s data_transfer_out => {_data_transfer_out} MB")
+        self.add_data_transfer_out(_data_transfer_out)
         if "folder" in mime_type:
-            cmd = [env.GDRIVE, "upload", "--parent", key, self.patch_file, "-c", env.GDRIVE_METADATA]
+            cmd = [env.GDRIVE, "upload", "--parent", key, patch_file, "-c", env.GDRIVE_METADATA]
         elif "gzip" in mime_type or "/zip" in mime_type:
-            cmd = [env.GDRIVE, "update", key, self.patch_file, "-c", env.GDRIVE_METADATA]
+            cmd = [env.GDRIVE, "update", key, patch_file, "-c", env.GDRIVE_METADATA]
         else:
             logging.error("E: Files could not be uploaded")
             return False
@@ -182,6 +195,7 @@ class ENDCODE(IpfsGPG, Ipfs, Eudat, Gdrive):
         self.end_time_stamp = ""
         self.modified_date = None
         self.encoded_share_tokens = {}  # type: Dict[str, str]
+        self.upload_lock = threading.Lock()
 
         # [https://stackoverflow.com/a/4453495/2402577, https://stackoverflow.com/a/5971326/2402577]
         # my_env = os.environ.copy();
@@ -300,33 +314,55 @@ class ENDCODE(IpfsGPG, Ipfs, Eudat, Gdrive):
             raise
 
         data_transfer_out = byte_to_mb(data_transfer_out)
-        self.data_transfer_out += data_transfer_out
+        self.add_data_transfer_out(data_transfer_out)
 
     def process_payment_tx(self):
-        try:
-            tx_hash = eblocbroker_function_call(
-                lambda: Ebb.process_payment(
-                    self.job_key,
-                    self.index,
-                    self.job_id,
-                    self.elapsed_time,
-                    self.result_ipfs_hash,
-                    self.cloud_storage_ids,
-                    self.end_time_stamp,
-                    self.data_transfer_in,
-                    self.data_transfer_out,
-                    self.job_info["core"],
-                    self.job_info["run_time"],
-                ),
-                10,
-            )
-            logging.info(f"tx_hash={tx_hash}")
-        except:
-            _colorize_traceback()
-            sys.exit(1)
+        """Send the payment and wait for its receipt, the job is journaled as paid once the receipt is collected."""
+        for _ in range(PAYMENT_ATTEMPTS):
+            try:
+                tx_hash = eblocbroker_function_call(
+                    lambda: Ebb.process_payment(
+                        self.job_key,
+                        self.index,
+                        self.job_id,
+                        self.elapsed_time,
+                        self.result_ipfs_hash,
+                        self.cloud_storage_ids,
+                        self.end_time_stamp,
+                        self.data_transfer_in,
+                        self.data_transfer_out,
+                        self.job_info["core"],
+                        self.job_info["run_time"],
+                    ),
+                    10,
+                )
+                logging.info(f"tx_hash={tx_hash}")
+            except:
+                _colorize_traceback()
+                sys.exit(1)
+
+            with open(f"{env.LOG_PATH}/transactions/{env.PROVIDER_ID}.txt", "a") as f:
+                f.write(f"processPayment {self.job_key} {self.index} {tx_hash}")
 
-        with open(f"{env.LOG_PATH}/transactions/{env.PROVIDER_ID}.txt", "a") as f:
-            f.write(f"processPayment {self.job_key} {self.index} {tx_hash}")
+            journal.mark_job(self.job_key, self.index, "payment_sent", tx_hash=tx_hash)
+            try:
+                receipt = Ebb.tx_manager.wait_receipt(tx_hash)
+            except TimeoutError:
+                # it is still re-priced and its receipt is collected by the driver
+                logging.error(f"E: processPayment tx_hash={tx_hash} is not mined in time")
+                sys.exit(1)
+            except Exception as e:  # dropped since its nonce is used by another transaction
+                logging.error(f"E: {e}, sending the payment again")
+                continue
+
+            if receipt["status"] != 1:
+                logging.error(f"E: processPayment tx_hash={tx_hash} is reverted")
+                sys.exit(1)
+
+            log(f"==> processPayment tx_hash={tx_hash} is mined")
+            return
+
+        sys.exit(1)
 
     def clean_before_upload(self):
         remove_files(f"{self.results_folder}/.node-xmlhttprequest*")
@@ -345,44 +381,65 @@ class ENDCODE(IpfsGPG, Ipfs, Eudat, Gdrive):
 
         run(["find", self.results_folder, "-type", "f", "!", "-newer", timestamp_file, "-delete"])
 
-    def git_diff_patch_and_upload(self, source, name, storage_class, is_job_key):
+    def upload_patch(self, name, patch_file, patch_upload_name, storage_class, is_job_key):
         if is_job_key:
-            log(f"==> patch_base={self.patch_folder}")
-            log(f"==> Patch for the source code {name}")
+            log(f"==> Uploading the patch of the source code {name}")
         else:
-            log(f"==> Patch for the data file {name}")
+            log(f"==> Uploading the patch of the data file {name}")
 
-        try:
-            if storage_class is Ipfs or storage_class is IpfsGPG:
-                target_path = self.patch_folder_ipfs
-            else:
-                target_path = self.patch_folder
-
-            self.patch_upload_name, self.patch_file, is_file_empty = git.diff_patch(
-                source, name, self.index, target_path
-            )
-            if not is_file_empty:
-                if not storage_class.upload(self, name, is_job_key):
-                    raise
-        except Exception as e:
-            raise Exception("E: Problem on git_diff_patch_and_upload()") from e
+        if not storage_class.upload(self, name, patch_file, patch_upload_name, is_job_key):
+            raise Exception(f"E: {patch_file} could not be uploaded")
 
     def upload_driver(self):
+        """Create the patches of the folders and upload each patch as soon as it is created.
+
+        `git diff` enters into the folder, the working directory is shared by
+        the threads of a process, hence the diffs are done in worker processes
+        while the patches that are already created are uploaded in threads.
+        """
         self.clean_before_upload()
-        try:
-            storage_class = self.get_cloud_storage_class(0)
-            self.git_diff_patch_and_upload(self.results_folder, self.job_key, storage_class, is_job_key=True)
-        except Exception as e:
-            raise Exception("E: Problem on git_diff_patch_and_upload()") from e
-
-        for idx, name in enumerate(self.source_code_hashes_to_process[1:], 1):
-            # starting from 1st index for data files
-            source = f"{self.results_data_folder}/{name}"
-            storage_class = self.get_cloud_storage_class(idx)
-            try:
-                self.git_diff_patch_and_upload(source, name, storage_class, is_job_key=False)
-            except Exception as e:
-                raise Exception("E: Problem on git_diff_patch_and_upload()") from e
+        log(f"==> patch_base={self.patch_folder}")
+        # starting from 1st index for data files
+        folders = [(self.results_folder, self.job_key, True)]
+        for name in self.source_code_hashes_to_process[1:]:
+            folders.append((f"{self.results_data_folder}/{name}", name, False))
+
+        diffs = {}  # type: Dict
+        uploads = []  # type: List
+        with ProcessPoolExecutor(max_workers=DIFF_WORKERS) as diff_executor:
+            with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as upload_executor:
+                try:
+                    for idx, (source, name, is_job_key) in enumerate(folders):
+                        storage_class = self.get_cloud_storage_class(idx)
+                        if storage_class is Ipfs or storage_class is IpfsGPG:
+                            target_path = self.patch_folder_ipfs
+                        else:
+                            target_path = self.patch_folder
+
+                        future = diff_executor.submit(git.diff_patch, source, name, self.index, target_path)
+                        diffs[future] = (name, storage_class, is_job_key)
+
+                    for future in as_completed(diffs):
+                        name, storage_class, is_job_key = diffs[future]
+                        output = future.result()
+                        if not output:
+                            raise Exception(f"E: Patch of {name} could not be created")
+
+                        patch_upload_name, patch_file, is_file_empty = output
+                        if not is_file_empty:
+                            uploads.append(
+                                upload_executor.submit(
+                                    self.upload_patch, name, patch_file, patch_upload_name, storage_class, is_job_key
+                                )
+                            )
+
+                    for future in as_completed(uploads):
+                        future.result()
+                except Exception as e:
+                    for future in [*diffs, *uploads]:
+                        future.cancel()
+
+                    raise Exception("E: Problem on upload_driver()") from e
 
         if not is_dir_empty(self.patch_folder_ipfs):
             # it will upload files after all the patchings are completed
@@ -436,36 +493,43 @@ class ENDCODE(IpfsGPG, Ipfs, Eudat, Gdrive):
 
         run_time = self.job_info["run_time"]
         log(f"==> requested_run_time={run_time[self.job_id]} minutes")
-        is_print = True
-        for attempt in range(10):
-            if self.job_info["stateCode"] == state_code["RUNNING"]:
-                # it will come here eventually, when setJob() is deployed
-                log("==> Job has been started")
-                break  # wait until does values updated on the blockchain
+        if self.job_info["stateCode"] != state_code["RUNNING"]:
+            log("==> start_code tx of the job is not obtained yet, waiting for its state to be set as running")
+            try:
+                # returns the moment setJobStatusRunning is logged, instead of polling the job info
+                is_running = Ebb.wait_job_state(
+                    env.PROVIDER_ID,
+                    self.job_key,
+                    self.index,
+                    self.job_id,
+                    state_code["RUNNING"],
+                    self.received_block_number,
+                    timeout=RUNNING_STATE_TIMEOUT,
+                )
+            except:
+                _colorize_traceback()
+                sys.exit(1)
 
-            if self.job_info["stateCode"] == state_code["COMPLETED"]:
-                # detects an error on the slurm side
-                log("==> Job is already completed job and its money is received")
-                raise QuietExit
+            if not is_running:  # abort
+                logging.error(f"E: Job's state is not set as running in {RUNNING_STATE_TIMEOUT} seconds")
+                sys.exit(1)
 
             try:
                 self.job_info = eblocbroker_function_call(
                     lambda: Ebb.get_job_info(
-                        env.PROVIDER_ID, self.job_key, self.index, self.job_id, self.received_block_number, is_print
+                        env.PROVIDER_ID, self.job_key, self.index, self.job_id, self.received_block_number, False
                     ),
                     10,
                 )
-                is_print = False
             except:
                 sys.exit(1)
 
-            log(f"==> start_code tx of the job is not obtained yet. Waiting for {attempt * 15} seconds to pass")
-            # short sleep here so this loop is not keeping CPU busy due to
-            # setJobSuccess may deploy late
-            time.sleep(15)
-        else:  # failed all the attempts, abort
-            sys.exit(1)
+            if self.job_info["stateCode"] == state_code["COMPLETED"]:
+                # detects an error on the slurm side
+                log("==> Job is already completed job and its money is received")
+                raise QuietExit
 
+        log("==> Job has been started")
         try:
             self.job_info = eblocbroker_function_call(
                 lambda: Ebb.get_job_source_code_hashes(
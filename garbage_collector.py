@@ -1,46 +1,25 @@
-import json
-import os
+#!/usr/bin/env python3
 
-from dotenv import load_dotenv
+"""Index the cached data and evict the least recently used ones that are not paid anymore.
 
-from config import env
-from utils import read_json
-
-# load .env from the given path
-load_dotenv(os.path.join(f"{env.HOME}/.eBlocBroker/", ".env"))
-
-
-def addElement(data, key, elementToAdd):
-    data[key] = elementToAdd
-
-
-def removeElement(data, elementToRemove):
-    for element in list(data):
-        if elementToRemove in element:
-            del data[elementToRemove]
+If the CACHE_QUOTA (in GB) is not set in ~/.eBlocBroker/.env, nothing is evicted.
+"""
 
+import sys
 
-f = os.getenv("LOG_PATH") + "/" + "cachingRecord.json"
-print(f)
+import eblocbroker.Contract as Contract
+from config import env
+from libs.cache_manager import CacheManager
+from utils import _colorize_traceback, log
 
-if not os.path.isfile(f):
-    data = {}
-else:
+if __name__ == "__main__":
+    Ebb = Contract.eblocbroker
     try:
-        data = read_json(f)
-    except:
-        pass
-
-addElement(data, "jobKey", ["local", "userName", "timestamp", "keepTime"])
-addElement(data, "ipfsHash", "timestamp")
-
-with open("data.json", "w") as outfile:
-    json.dump(data, outfile)
-
-if "jobKey" in data:
-    print(data["jobKey"][0])
-    print(data["jobKey"])
-
-removeElement(data, "ipfsHash")
-with open(f, "w") as data_file:
-    data = json.dump(data, data_file)
+        cache_manager = CacheManager()
+        cache_manager.scan()
+        log(f"==> cache_size={cache_manager.get_total_size()} bytes | cache_quota={env.CACHE_QUOTA} GB")
+        evicted_size = cache_manager.evict(Ebb.get_block_number())
+        log(f"==> evicted_size={evicted_size} bytes")
+    except Exception:
+        _colorize_traceback()
+        sys.exit(1)
@@ -70,13 +70,13 @@ if __name__ == "__main__":
         log("E: Please provide IPFS or IPFS_GPG storage type")
         sys.exit(1)
 
+    try:
+        provider_info = Ebb.get_provider_info(provider)
+    except:
+        sys.exit()
+
     targets = []
     for idx, folder in enumerate(folders):
-        try:
-            provider_info = Ebb.get_provider_info(provider)
-        except:
-            sys.exit()
-
         target = folder
         if job.storage_ids[idx] == StorageID.IPFS_GPG:
             provider_gpg_finderprint = provider_info["gpg_fingerprint"]
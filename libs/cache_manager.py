@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+
+"""Index of the cached data under the public and private cache directories.
+
+Each cached `*.tar.gz` file or folder is kept on mongodb along with its size,
+last access time, owning requester and the block number until its storage is
+paid (received_block + storage_duration). Size of a tarball includes its
+extracted copy, which is shared by the jobs. If the total size exceeds the disk
+quota, least recently used entries are evicted, where entries that are still
+paid, or whose expiry block is not known, are never evicted.
+"""
+
+import hashlib
+import os
+import shutil
+import threading
+import time
+from typing import Optional
+
+from pymongo import ASCENDING
+
+from config import env, logging
+from libs.md5sum import find_files
+from libs.mongodb import mc
+from libs.staging import get_extracted_path
+from utils import ipfs_to_bytes32, log
+
+# extracted copies, their temporary folders and partial downloads are not indexed as cached data
+SKIPPED_PREFIXES = (".staging_",)
+SKIPPED_SUFFIXES = (".json", ".extracted", ".part")
+
+
+def get_size(path) -> int:
+    """Return size of the file or the total size of the files under the folder, in bytes."""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+
+    size = 0
+    for root, _, files in os.walk(path):
+        for filename in files:
+            try:
+                size += os.lstat(os.path.join(root, filename)).st_size
+            except OSError:
+                pass
+
+    return size
+
+
+class CacheManager:
+    is_index_created = False
+
+    def __init__(self) -> None:
+        self.entries = mc["eBlocBroker"]["cache_entries"]
+        self.lock = threading.Lock()
+        if not CacheManager.is_index_created:
+            self.entries.create_index([("path", ASCENDING)], unique=True)
+            self.entries.create_index([("last_access", ASCENDING)])
+            CacheManager.is_index_created = True
+
+    @staticmethod
+    def _stat(path) -> list:
+        """Return the signature of the data to detect its modification.
+
+        Files of a folder are stat'ed recursively as they are read by its md5sum.
+        """
+        if not os.path.isdir(path):
+            st = os.stat(path)
+            return [st.st_size, st.st_mtime_ns]
+
+        files = sorted(find_files(os.path.realpath(path)))
+        digest = hashlib.md5()
+        for filename in files:
+            try:
+                st = os.stat(filename)
+            except OSError:  # removed meanwhile
+                continue
+
+            digest.update(f"{filename}\0{st.st_ino}\0{st.st_size}\0{st.st_mtime_ns}\n".encode("utf-8"))
+
+        return [len(files), digest.hexdigest()]
+
+    @staticmethod
+    def get_expiry_block(name) -> Optional[int]:
+        """Return the block number until the storage of the cached data is paid, None if it could not be read."""
+        import config
+        import eblocbroker.Contract as Contract
+
+        try:
+            if name.startswith("Qm"):
+                source_code_hash = ipfs_to_bytes32(name)
+            else:  # md5sum of the EUDAT and gdrive folders
+                source_code_hash = config.w3.toBytes(text=name)
+
+            received_block, storage_duration = Contract.eblocbroker.get_job_storage_time(
+                env.PROVIDER_ID, source_code_hash
+            )
+            return int(received_block) + int(storage_duration)
+        except Exception as e:
+            logging.warning(f"Storage time of {name} could not be read: {e}")
+            return None
+
+    @staticmethod
+    def get_entry_size(path) -> int:
+        """Return size of the cached data along with its extracted copy."""
+        size = get_size(path)
+        extracted = get_extracted_path(path)
+        if path.endswith(".tar.gz") and os.path.isdir(extracted):
+            size += get_size(extracted)
+
+        return size
+
+    def add(self, path, name, requester=None, md5sum=None, expiry_block=None) -> None:
+        """Index the cached file or folder, it is also marked as accessed."""
+        path = path.rstrip("/")
+        document = {
+            "path": path,
+            "name": name,
+            "size": self.get_entry_size(path),
+            "stat": self._stat(path),
+            "last_access": time.time(),
+        }
+        if md5sum:
+            document["md5sum"] = md5sum
+
+        if requester:
+            document["requester"] = requester
+
+        update = {"$set": document}
+        if not md5sum:
+            existing = self.entries.find_one({"path": path}, {"stat": 1})
+            if existing and existing.get("stat") != document["stat"]:
+                update["$unset"] = {"md5sum": ""}  # data is modified since it is hashed
+
+        if expiry_block is not None:
+            # the largest expiry block is kept, since the same data could be paid by the following jobs as well
+            update["$max"] = {"expiry_block": int(expiry_block)}
+
+        self.entries.update_one({"path": path}, update, upsert=True)
+
+    def touch(self, path) -> None:
+        self.entries.update_one({"path": path.rstrip("/")}, {"$set": {"last_access": time.time()}})
+
+    def lookup(self, path, md5sum) -> bool:
+        """Return True if the path is indexed with the md5sum and it is not modified since then."""
+        path = path.rstrip("/")
+        document = self.entries.find_one({"path": path, "md5sum": md5sum})
+        if not document:
+            return False
+
+        try:
+            if self._stat(path) != document["stat"]:
+                return False
+        except OSError:
+            self.entries.delete_one({"path": path})
+            return False
+
+        self.touch(path)
+        return True
+
+    def get_cache_folders(self) -> list:
+        """Return the public cache folder along with the private cache folders of the requesters."""
+        folders = [f"{env.PROGRAM_PATH}/cache"]
+        for entry in os.scandir(env.PROGRAM_PATH):
+            if entry.is_dir() and entry.name != "cache" and os.path.isdir(f"{entry.path}/cache"):
+                folders.append(f"{entry.path}/cache")
+
+        return folders
+
+    @staticmethod
+    def is_cached_data(name) -> bool:
+        return not name.startswith(SKIPPED_PREFIXES) and not name.endswith(SKIPPED_SUFFIXES)
+
+    def scan(self, folders=None) -> None:
+        """Index the cached data under the folders that are not indexed yet, and drop the removed ones.
+
+        Expiry block of the entries, that are not indexed by a job, is read from getJobStorageTime.
+        """
+        if folders is None:
+            folders = self.get_cache_folders()
+
+        for document in self.entries.find({}, {"path": 1}):
+            if not os.path.exists(document["path"]):
+                self.entries.delete_one({"path": document["path"]})
+
+        for folder in folders:
+            if not os.path.isdir(folder):
+                continue
+
+            for entry in os.scandir(folder):
+                if not self.is_cached_data(entry.name):
+                    continue
+
+                document = self.entries.find_one({"path": entry.path}, {"expiry_block": 1, "size": 1})
+                if document:  # tarball could be extracted after it is indexed
+                    size = self.get_entry_size(entry.path)
+                    if document.get("size") != size:
+                        self.entries.update_one({"path": entry.path}, {"$set": {"size": size}})
+
+                if document and document.get("expiry_block") is not None:
+                    continue
+
+                name = entry.name.replace(".tar.gz", "")
+                expiry_block = self.get_expiry_block(name)
+                if document:
+                    if expiry_block is not None:
+                        self.entries.update_one({"path": entry.path}, {"$max": {"expiry_block": expiry_block}})
+                else:
+                    requester = None
+                    if folder != f"{env.PROGRAM_PATH}/cache":
+                        requester = os.path.basename(os.path.dirname(folder))
+
+                    try:
+                        self.add(entry.path, name, requester, None, expiry_block)
+                    except OSError:
+                        pass
+
+    def get_total_size(self) -> int:
+        result = list(self.entries.aggregate([{"$group": {"_id": None, "size": {"$sum": "$size"}}}]))
+        return result[0]["size"] if result else 0
+
+    def _remove(self, path) -> None:
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path) or os.path.islink(path):
+            os.remove(path)
+            extracted = get_extracted_path(path)
+            if os.path.isdir(extracted):
+                shutil.rmtree(extracted)
+
+        self.entries.delete_one({"path": path})
+
+    def evict(self, block_number, quota=None) -> int:
+        """Evict least recently used entries until the total size fits into the quota, returns evicted bytes."""
+        if quota is None:
+            quota = int(env.CACHE_QUOTA * (1024 ** 3))
+
+        if not quota:
+            return 0
+
+        with self.lock:
+            total_size = self.get_total_size()
+            evicted_size = 0
+            if total_size <= quota:
+                return evicted_size
+
+            # entries without an expiry block are kept, since they could still be paid
+            _filter = {"expiry_block": {"$lt": int(block_number)}}
+            for document in self.entries.find(_filter).sort("last_access", ASCENDING):
+                if total_size - evicted_size <= quota:
+                    break
+
+                try:
+                    self._remove(document["path"])
+                    evicted_size += document["size"]
+                    log(f"==> [ cache ] {document['path']} is evicted, size={document['size']} bytes")
+                except Exception as e:
+                    logging.error(f"E: Failed to evict {document['path']}: {e}")
+
+            if total_size - evicted_size > quota:
+                logging.warning("Cache quota is exceeded by the data that is still paid for")
+
+            return evicted_size
+
@@ -3,12 +3,17 @@
 import os
 import os.path
 import pickle
+import queue
 import shutil
 import subprocess
 import sys
+import threading
 import time
 import traceback
+from contextlib import contextmanager
 from pprint import pprint
+from typing import Dict, Tuple
+from urllib.parse import quote
 
 import owncloud
 from web3.logs import DISCARD
@@ -16,13 +21,13 @@ from web3.logs import DISCARD
 import config
 import libs.git as git
 from config import env, logging
+from libs.http_download import RangeDownloader, Transfer
 from contract.scripts.lib import Job, cost
 from lib import get_tx_status, run
 from utils import (
     CacheType,
     StorageID,
     _colorize_traceback,
-    cd,
     compress_folder,
     log,
     popen_communicate,
@@ -32,7 +37,7 @@ from utils import (
 )
 
 
-def _upload_results(encoded_share_token, output_file_name):
+def _upload_results(encoded_share_token, output_file_name, path):
     """Uploads results into Eudat using curl
     doc:
     - (How to upload files into shared b2drop.eudat(owncloud) repository using curl?)[https://stackoverflow.com/a/44556541/2402577]
@@ -55,7 +60,7 @@ def _upload_results(encoded_share_token, output_file_name):
         "-H",
         f"Authorization: Basic {encoded_share_token}",
         "--data-binary",
-        f"@{output_file_name}",
+        f"@{path}/{output_file_name}",
         f"https://b2drop.eudat.eu/public.php/webdav/{output_file_name}",
         "-w",
         "%{http_code}\n"
@@ -74,24 +79,27 @@ def _upload_results(encoded_share_token, output_file_name):
 
 
 def upload_results(encoded_share_token, output_file_name, path, attempt_count=1):
-    """Wrapper for the _upload_results() function."""
-    with cd(path):
-        for _ in range(attempt_count):
-            p, output, error = _upload_results(encoded_share_token, output_file_name)
-            if error:
-                log(error)
-
-            if "Warning: Couldn't read data from file" in error:
-                logging.error("E: EUDAT repository did not successfully uploaded")
-                return False
-
-            if p.returncode != 0 or "<d:error" in output:
-                logging.error("E: EUDAT repository did not successfully uploaded")
-                logging.error(f"E: curl is failed. {p.returncode} => [{error}] {output}")
-                time.sleep(1)  # wait 1 second for next step retry to upload
-            else:  # success on upload
-                return True
-        return False
+    """Wrapper for the _upload_results() function.
+
+    File is given to curl by its full path instead of entering into its
+    folder, so the patches could be uploaded concurrently.
+    """
+    for _ in range(attempt_count):
+        p, output, error = _upload_results(encoded_share_token, output_file_name, path)
+        if error:
+            log(error)
+
+        if "Warning: Couldn't read data from file" in error:
+            logging.error("E: EUDAT repository did not successfully uploaded")
+            return False
+
+        if p.returncode != 0 or "<d:error" in output:
+            logging.error("E: EUDAT repository did not successfully uploaded")
+            logging.error(f"E: curl is failed. {p.returncode} => [{error}] {output}")
+            time.sleep(1)  # wait 1 second for next step retry to upload
+        else:  # success on upload
+            return True
+    return False
 
 
 def _login(fname, user, password_path):
@@ -108,6 +116,7 @@ def _login(fname, user, password_path):
             f = open(fname, "wb")
             pickle.dump(config.oc, f)
             f.close()
+            session_pool.reset()
             log(text="[ ok ]", is_bold=False)
         except Exception:
             _traceback = traceback.format_exc()
@@ -124,6 +133,18 @@ def _login(fname, user, password_path):
     terminate()
 
 
+def load_session(fname) -> bool:
+    """Load the dumped owncloud session without verifying it, saves a round trip for the short lived processes."""
+    if not os.path.isfile(fname):
+        return False
+
+    with open(fname, "rb") as f:
+        config.oc = pickle.load(f)
+
+    session_pool.reset()
+    return True
+
+
 def login(user, password_path, fname: str) -> None:
     if not user:
         logging.error("E: User is empty")
@@ -135,6 +156,7 @@ def login(user, password_path, fname: str) -> None:
         try:
             log(f"Login into owncloud user reading from the dumped object={fname} ", color="blue", end="")
             config.oc.get_config()
+            session_pool.reset()
             print_ok()
         except subprocess.CalledProcessError as e:
             logging.error(f"FAILED. {e.output.decode('utf-8').strip()}")
@@ -143,6 +165,113 @@ def login(user, password_path, fname: str) -> None:
         _login(fname, user, password_path)
 
 
+class SessionPool:
+    """Long-lived owncloud sessions shared by the jobs that are staged in parallel.
+
+    Sessions are cloned from the logged in `config.oc`, hence each thread
+    uses its own HTTP connection while the login is done only once.
+    """
+
+    def __init__(self, size=None) -> None:
+        self.size = size or env.EUDAT_WORKERS
+        self.sessions: queue.Queue = queue.Queue()
+        self.created = 0
+        self.lock = threading.Lock()
+
+    def reset(self) -> None:
+        """Drop the sessions of the previous login."""
+        with self.lock:
+            self.sessions = queue.Queue()
+            self.created = 0
+
+    @contextmanager
+    def session(self):
+        with self.lock:
+            sessions = self.sessions
+            oc = None
+            try:
+                oc = sessions.get_nowait()
+            except queue.Empty:
+                if self.created < self.size:
+                    oc = pickle.loads(pickle.dumps(config.oc))
+                    self.created += 1
+
+        if oc is None:
+            oc = sessions.get()
+
+        try:
+            yield oc
+        finally:
+            sessions.put(oc)
+
+
+class ShareCache:
+    """Open remote shares and the sizes of the shared tarballs.
+
+    Open shares are keyed by (folder_name, f_id), where the latest share of
+    the folder is kept. The share list is fetched again only if a folder of
+    the job is missing, so a job costs a single round trip at most. Sizes are
+    kept for good since the tarballs are named after their md5sum.
+    """
+
+    def __init__(self) -> None:
+        self.shares: Dict[Tuple[str, str], dict] = {}
+        self.sizes: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def refresh(self, oc) -> None:
+        share_list = oc.list_open_remote_share()
+        shares = {}
+        for share in share_list:
+            # removes '/' on the beginning of the name
+            shares[(share["name"][1:], f"{share['user']}@b2drop.eudat.eu")] = share
+
+        with self.lock:
+            self.shares = shares
+
+    def find(self, oc, folder_names, f_id) -> Dict[str, dict]:
+        """Return folder_name => open share of the folders that are shared by the f_id."""
+        with self.lock:
+            is_missing = any((folder_name, f_id) not in self.shares for folder_name in folder_names)
+
+        if is_missing:
+            self.refresh(oc)
+
+        with self.lock:
+            return {
+                folder_name: self.shares[(folder_name, f_id)]
+                for folder_name in folder_names
+                if (folder_name, f_id) in self.shares
+            }
+
+    def accepted(self, folder_name, f_id) -> None:
+        """Accepted share is not open anymore."""
+        with self.lock:
+            self.shares.pop((folder_name, f_id), None)
+
+    def get_size(self, oc, folder_name) -> int:
+        """Return the size of the shared tarball, raises if the share is not accepted yet."""
+        with self.lock:
+            if folder_name in self.sizes:
+                return self.sizes[folder_name]
+
+        size = get_size(f"/{folder_name}/{folder_name}.tar.gz", oc)
+        with self.lock:
+            self.sizes[folder_name] = size
+
+        return size
+
+
+session_pool = SessionPool()
+share_cache = ShareCache()
+
+
+def download_file(oc, remote_path, local_path, size) -> Transfer:
+    """Download the file through range requests over the authenticated WebDAV session of the client."""
+    url = oc._webdav_url + quote("/" + remote_path.lstrip("/"))
+    return RangeDownloader(oc._session, url, local_path, size).download()
+
+
 def share_single_folder(folder_name, f_id) -> bool:
     try:
         # folder_names = os.listdir('/oc')
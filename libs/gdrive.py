@@ -2,8 +2,13 @@
 
 import json
 import os
+import random
 import shutil
 import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Tuple
 
 # import gshell
 from pprint import pprint
@@ -23,6 +28,85 @@ from utils import (
 
 # TODO: gdrive list --query "sharedWithMe"
 
+METADATA_TTL = 600  # seconds
+WORKERS = 4
+ATTEMPTS = 5
+
+
+def _run_with_backoff(cmd, attempts=ATTEMPTS) -> str:
+    for attempt in range(attempts):
+        try:
+            return run(cmd, is_print_trace=False)
+        except Exception as e:
+            if attempt + 1 == attempts:
+                logging.error(f"E: {' '.join(cmd[:3])} is failed: {e}")
+                raise
+
+            delay = 2 ** attempt + random.uniform(0, 1)
+            logging.warning(f"{' '.join(cmd[:3])} is failed [attempt={attempt}], retrying in {delay:.1f} seconds")
+            time.sleep(delay)
+
+
+def parse_info(gdrive_info) -> Dict[str, str]:
+    """Parse the output of `gdrive info`, which is formed of `<field>: <value>` lines."""
+    info = {}
+    for line in gdrive_info.splitlines():
+        field, _, value = line.partition(":")
+        info[field.strip()] = value.strip()
+
+    return info
+
+
+class MetadataCache:
+    """Metadata (name, mime, md5sum, size) of the files on gdrive keyed by their keys."""
+
+    def __init__(self, ttl=METADATA_TTL) -> None:
+        self.ttl = ttl
+        self.entries: Dict[str, Tuple[float, Dict[str, str]]] = {}
+        self.lock = threading.Lock()
+
+    def info(self, key) -> Dict[str, str]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and time.time() - entry[0] < self.ttl:
+                return entry[1]
+
+        info = parse_info(_run_with_backoff(["gdrive", "info", "--bytes", key, "-c", env.GDRIVE_METADATA]))
+        with self.lock:
+            self.entries[key] = (time.time(), info)
+
+        return info
+
+    def info_all(self, keys) -> Dict[str, Dict[str, str]]:
+        """Fetch the metadata of the keys concurrently."""
+        keys = list(keys)
+        with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+            return dict(zip(keys, executor.map(self.info, keys)))
+
+
+metadata_cache = MetadataCache()
+
+
+def download(key, path, is_recursive=False, size=None) -> float:
+    """Download the key into the path with retries, returns its throughput in MB/s."""
+    cmd = ["gdrive", "download", key, "--force", "--path", path]
+    if is_recursive:
+        cmd.insert(2, "--recursive")
+
+    if size is None:
+        try:
+            size = int(get_file_info(metadata_cache.info(key), "Size"))
+        except Exception:
+            size = 0
+
+    log(f"==> [ gdrive ] downloading {key} into {path}, size={byte_to_mb(size)} MB")
+    start_time = time.time()
+    _run_with_backoff(cmd)
+    elapsed_time = max(time.time() - start_time, 1e-6)
+    throughput = byte_to_mb(size) / elapsed_time
+    log(f"==> [ gdrive ] {key} is downloaded in {elapsed_time:.2f} seconds | throughput={throughput:.2f} MB/s")
+    return throughput
+
 
 def check_user(_user):
     output = run(["gdrive", "about"])
@@ -159,7 +243,12 @@ def _upload(dir_path, tar_hash, is_folder=False):
 
 
 def get_file_info(gdrive_info, _type):
-    return echo_grep_awk(gdrive_info, _type, "2")
+    """Return the first word of the field as `echo gdrive_info | grep _type | awk '{print $2}'` does."""
+    if not isinstance(gdrive_info, dict):
+        gdrive_info = parse_info(gdrive_info)
+
+    value = gdrive_info.get(_type, "").split()
+    return value[0] if value else ""
 
 
 def get_file_id(key):
@@ -206,15 +295,7 @@ def size(key, mime_type, folder_name, gdrive_info, results_folder_prev, source_c
             ]
             output = subprocess_call(cmd, 10)
             print(output)
-            cmd = [
-                "gdrive",
-                "info",
-                "--bytes",
-                source_code_key,
-                "-c",
-                env.GDRIVE_METADATA,
-            ]
-            gdrive_info = subprocess_call(cmd, 10)
+            gdrive_info = metadata_cache.info(source_code_key)
         except:
             # TODO: gdrive list --query "sharedWithMe"
             return False
@@ -238,17 +319,21 @@ def size(key, mime_type, folder_name, gdrive_info, results_folder_prev, source_c
         if not success:
             return False
 
-        data_key_dict = {}
-        for idx, (k, v) in enumerate(meta_data.items(), start=1):
-            _key = str(v)
-            try:
-                output = get_file_id(_key)
-                data_key = echo_grep_awk(output, f"{k}.tar.gz", "1")
-                cmd = ["gdrive", "info", "--bytes", data_key, "-c", env.GDRIVE_METADATA]
-                gdrive_info = subprocess_call(cmd, 10)
-            except:
-                return False
+        def get_data_key(item):
+            k, v = item
+            return echo_grep_awk(get_file_id(str(v)), f"{k}.tar.gz", "1")
+
+        try:  # keys and metadata of the data files are queried concurrently
+            with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+                data_keys = list(executor.map(get_data_key, meta_data.items()))
 
+            gdrive_infos = metadata_cache.info_all(data_keys)
+        except:
+            return False
+
+        data_key_dict = {}
+        for idx, data_key in enumerate(data_keys, start=1):
+            gdrive_info = gdrive_infos[data_key]
             md5sum = get_file_info(gdrive_info, _type="Md5sum")
             log(gdrive_info, color="yellow")
             given_source_code_hash = source_code_hashes[idx].decode("utf-8")
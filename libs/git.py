@@ -3,48 +3,85 @@
 import gzip
 import io
 import os
-import time
+from subprocess import PIPE, Popen
 
 import git
 
 from config import env, logging
 from libs.ipfs import decrypt_using_gpg
-from utils import cd, is_gzip_file_empty, log, path_leaf, run
+from utils import is_gzip_file_empty, log, path_leaf, run
 
 # from subprocess import CalledProcessError
 
+CHUNK_SIZE = 1024 * 1024
+
 
 def initialize_check(path):
     """.git/ folder should exist within the target folder"""
-    with cd(path):
-        if not is_initialized(path):
-            try:
-                run(["git", "init"])
-                add_all()
-            except Exception as error:
-                logging.error(f"E: {error}")
-                return False
-        return True
+    if not is_initialized(path):
+        try:
+            run(["git", "init"], cwd=path)
+            add_all(path=path)
+        except Exception as error:
+            logging.error(f"E: {error}")
+            return False
+    return True
 
 
 def is_initialized(path) -> bool:
-    with cd(path):
-        try:
-            repo = git.Repo(".", search_parent_directories=True)
-            working_tree_dir = repo.working_tree_dir
-        except:
-            return False
+    try:
+        repo = git.Repo(path, search_parent_directories=True)
+        working_tree_dir = repo.working_tree_dir
+    except:
+        return False
+
+    return path == working_tree_dir
 
-        return path == working_tree_dir
 
+def _write_stream(stream, f) -> int:
+    """Write the stream into the file object in chunks, returns the number of the written bytes."""
+    size = 0
+    for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+        f.write(chunk)
+        size += len(chunk)
 
-def diff_and_gzip(filename):
-    repo = git.Repo(".", search_parent_directories=True)
-    with gzip.open(filename, "wb") as output:
-        # We cannot directly write Python objects like strings!
-        # We must first convert them into a bytes format using io.BytesIO() and then write it
-        with io.TextIOWrapper(output, encoding="utf-8") as encode:
-            encode.write(repo.git.diff("--binary", "HEAD", "--minimal", "--ignore-submodules=dirty"))
+    return size
+
+
+def diff_and_gzip(filename, is_pigz=False, path=".") -> int:
+    """Stream the output of `git diff` into the compressed patch file.
+
+    The diff is never kept in the memory as a whole, it is compressed chunk by
+    chunk either by the gzip module or by the multi-threaded pigz.
+
+    :returns: size of the uncompressed diff in bytes
+    """
+    repo = git.Repo(path, search_parent_directories=True)
+    cmd = ["git", "diff", "--binary", "HEAD", "--minimal", "--ignore-submodules=dirty"]
+    p_diff = Popen(cmd, stdout=PIPE, cwd=repo.working_tree_dir)
+    try:
+        if is_pigz:
+            with open(filename, "wb") as output:
+                p_pigz = Popen(["pigz", "-n", "-c"], stdin=PIPE, stdout=output)
+                try:
+                    size = _write_stream(p_diff.stdout, p_pigz.stdin)
+                finally:
+                    p_pigz.stdin.close()
+                    p_pigz.wait()
+
+            if p_pigz.returncode != 0:
+                raise Exception(f"E: pigz is failed with the exit code {p_pigz.returncode}")
+        else:
+            with gzip.open(filename, "wb") as output:
+                size = _write_stream(p_diff.stdout, output)
+    finally:
+        p_diff.stdout.close()
+        p_diff.wait()
+
+    if p_diff.returncode != 0:
+        raise Exception(f"E: git diff is failed with the exit code {p_diff.returncode}")
+
+    return size
 
 
 def decompress_gzip(filename):
@@ -65,34 +102,32 @@ def diff_patch(path, source_code_hash, index, target_path):
     """
     sep = "*"  # separator in between the string infos
     is_file_empty = False
-    with cd(path):
-        log(f"==> Navigate to {path}")
-        """TODO
-        if not is_initialized(path):
-            upload everything, changed files!
-        """
-        repo = git.Repo(".", search_parent_directories=True)
-        try:
-            repo.git.config("core.fileMode", "false")  # git config core.fileMode false
-            # first ignore deleted files not to be added into git
-            run(["bash", f"{env.EBLOCPATH}/bash_scripts/git_ignore_deleted.sh"])
-            head_commit_id = repo.rev_parse("HEAD")
-            patch_name = f"patch{sep}{head_commit_id}{sep}{source_code_hash}{sep}{index}.diff"
-        except:
-            return False
+    log(f"==> Navigate to {path}")
+    """TODO
+    if not is_initialized(path):
+        upload everything, changed files!
+    """
+    repo = git.Repo(path, search_parent_directories=True)
+    try:
+        repo.git.config("core.fileMode", "false")  # git config core.fileMode false
+        # first ignore deleted files not to be added into git
+        run(["bash", f"{env.EBLOCPATH}/bash_scripts/git_ignore_deleted.sh"], cwd=path)
+        head_commit_id = repo.rev_parse("HEAD")
+        patch_name = f"patch{sep}{head_commit_id}{sep}{source_code_hash}{sep}{index}.diff"
+    except:
+        return False
 
-        patch_upload_name = f"{patch_name}.gz"  # file to be uploaded as zip
-        patch_file = f"{target_path}/{patch_upload_name}"
-        logging.info(f"patch_path={patch_upload_name}")
+    patch_upload_name = f"{patch_name}.gz"  # file to be uploaded as zip
+    patch_file = f"{target_path}/{patch_upload_name}"
+    logging.info(f"patch_path={patch_upload_name}")
 
-        try:
-            repo.git.add(A=True)
-            diff_and_gzip(patch_file)
-        except:
-            return False
+    try:
+        repo.git.add(A=True)
+        diff_size = diff_and_gzip(patch_file, is_pigz=env.IS_PIGZ_ENABLED, path=path)
+    except:
+        return False
 
-    time.sleep(0.25)
-    if is_gzip_file_empty(patch_file):
+    if not diff_size:
         log("==> Created patch file is empty, nothing to upload")
         os.remove(patch_file)
         is_file_empty = True
@@ -100,15 +135,15 @@ def diff_patch(path, source_code_hash, index, target_path):
     return patch_upload_name, patch_file, is_file_empty
 
 
-def add_all(repo=None):
+def add_all(repo=None, path="."):
     if not repo:
-        repo = git.Repo(".", search_parent_directories=True)
+        repo = git.Repo(path, search_parent_directories=True)
 
     try:
         # subprocess.run(["chmod", "-R", "755", "."])
         # subprocess.run(["chmod", "-R", "775", ".git"])  # https://stackoverflow.com/a/28159309/2402577
         # required for files to be access on the cluster side due to permission issues
-        run(["sudo", "chmod", "-R", "775", "."])  # changes folder's hash
+        run(["sudo", "chmod", "-R", "775", path])  # changes folder's hash
     except:
         pass
 
@@ -128,31 +163,30 @@ def add_all(repo=None):
 
 
 def commit_changes(path) -> bool:
-    with cd(path):
-        repo = git.Repo(".", search_parent_directories=True)
-        try:
-            output = run(["ls", "-l", ".git/refs/heads"])
-        except Exception as e:
-            raise Exception("E: Problem on git.commit_changes()") from e
-
-        if output == "total 0":
-            logging.warning("There is no first commit")
-        else:
-            changed_files = [item.a_path for item in repo.index.diff(None)]
-            if len(changed_files) > 0:
-                logging.info(f"Adding changed files:\{changed_files}")
-                repo.git.add(A=True)
+    repo = git.Repo(path, search_parent_directories=True)
+    try:
+        output = run(["ls", "-l", ".git/refs/heads"], cwd=path)
+    except Exception as e:
+        raise Exception("E: Problem on git.commit_changes()") from e
+
+    if output == "total 0":
+        logging.warning("There is no first commit")
+    else:
+        changed_files = [item.a_path for item in repo.index.diff(None)]
+        if len(changed_files) > 0:
+            logging.info(f"Adding changed files:\{changed_files}")
+            repo.git.add(A=True)
 
-            if len(repo.index.diff("HEAD")) == 0:
-                log(f"==> {path} is committed with the given changes using git")
-                return True
+        if len(repo.index.diff("HEAD")) == 0:
+            log(f"==> {path} is committed with the given changes using git")
+            return True
 
-        try:
-            add_all(repo)
-        except Exception as e:
-            logging.error(f"E: {e}")
-            return False
-        return True
+    try:
+        add_all(repo, path)
+    except Exception as e:
+        logging.error(f"E: {e}")
+        return False
+    return True
 
 
 def apply_patch(git_folder, patch_file, is_gpg=False):
@@ -160,34 +194,33 @@ def apply_patch(git_folder, patch_file, is_gpg=False):
     if is_gpg:
         decrypt_using_gpg(patch_file)
 
-    with cd(git_folder):
-        base_name = path_leaf(patch_file)
-        log(f"==> {base_name}")
-        # folder_name = base_name_split[2]
-        try:
-            # base_name_split = base_name.split("_")
-            # git_hash = base_name_split[1]
-            # run(["git", "checkout", git_hash])
-            # run(["git", "reset", "--hard"])
-            # run(["git", "clean", "-f"])
-
-            # echo "\n" >> patch_file.txt seems like fixing it
-            with open(patch_file, "a") as myfile:
-                myfile.write("\n")
-
-            # output = repo.git.apply("--reject", "--whitespace=fix", patch_file)
-            run(["git", "apply", "--reject", "--whitespace=fix", "--verbose", patch_file])
-            return True
-        except Exception:
-            return False
+    patch_file = os.path.join(git_folder, patch_file)  # relative path is relative to the git folder
+    base_name = path_leaf(patch_file)
+    log(f"==> {base_name}")
+    # folder_name = base_name_split[2]
+    try:
+        # base_name_split = base_name.split("_")
+        # git_hash = base_name_split[1]
+        # run(["git", "checkout", git_hash])
+        # run(["git", "reset", "--hard"])
+        # run(["git", "clean", "-f"])
+
+        # echo "\n" >> patch_file.txt seems like fixing it
+        with open(patch_file, "a") as myfile:
+            myfile.write("\n")
+
+        # output = repo.git.apply("--reject", "--whitespace=fix", patch_file)
+        run(["git", "apply", "--reject", "--whitespace=fix", "--verbose", patch_file], cwd=git_folder)
+        return True
+    except Exception:
+        return False
 
 
 def is_repo(folders):
     for folder in folders:
-        with cd(folder):
-            if not is_initialized(folder):
-                logging.warning(f".git does not exits in {folder}. Applying: `git init`")
-                run(["git", "init"])
+        if not is_initialized(folder):
+            logging.warning(f".git does not exits in {folder}. Applying: `git init`")
+            run(["git", "init"], cwd=folder)
 
 
 def _generate_git_repo(folder):
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+
+"""Resumable download of a file through HTTP range requests over several connections.
+
+The file is written into `<path>.part` in fixed-size chunks, where the
+completed chunks are kept in `<path>.part.json`, so a failed download is
+resumed from where it is left. md5sum of the file is computed in order while
+the chunks are written, hence the downloaded file is not read again.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Set
+
+from config import logging
+from utils import byte_to_mb, log
+
+CHUNK_SIZE = 8 * 1024 * 1024
+CONNECTIONS = 4
+ATTEMPTS = 5
+TIMEOUT = 60
+STATE_SAVE_INTERVAL = 16  # completed chunks
+
+
+class RangeNotSupported(Exception):
+    pass
+
+
+class Transfer:
+    def __init__(self, path, size, downloaded_size, elapsed_time, md5sum) -> None:
+        self.path = path
+        self.size = size
+        self.downloaded_size = downloaded_size  # excluding the resumed part
+        self.elapsed_time = elapsed_time
+        self.md5sum = md5sum
+
+    @property
+    def throughput(self) -> float:
+        """Throughput of the transfer in MB/s."""
+        return byte_to_mb(self.downloaded_size) / max(self.elapsed_time, 1e-6)
+
+    def __str__(self) -> str:
+        return (
+            f"{self.path}: size={byte_to_mb(self.size)} MB | downloaded={byte_to_mb(self.downloaded_size)} MB | "
+            f"throughput={self.throughput:.2f} MB/s"
+        )
+
+
+class InOrderHasher:
+    """md5sum of the chunks that are completed out of order, chunks are buffered until their turn comes."""
+
+    def __init__(self, fd, chunks, resumed: Set[int], max_buffered) -> None:
+        self.fd = fd
+        self.chunks = chunks
+        self.resumed = resumed
+        self.max_buffered = max_buffered
+        self.md5 = hashlib.md5()
+        self.next_index = 0
+        self.buffers: Dict[int, bytes] = {}
+        self.is_aborted = False
+        self.condition = threading.Condition()
+        with self.condition:
+            self._advance()
+
+    def _advance(self) -> None:
+        while self.next_index < len(self.chunks):
+            if self.next_index in self.buffers:
+                self.md5.update(self.buffers.pop(self.next_index))
+            elif self.next_index in self.resumed:
+                start, end = self.chunks[self.next_index]
+                self.md5.update(os.pread(self.fd, end - start, start))
+            else:
+                break
+
+            self.next_index += 1
+
+        self.condition.notify_all()
+
+    def feed(self, index, data) -> None:
+        with self.condition:
+            self.buffers[index] = data
+            self._advance()
+            # bounds the memory, the chunk that is waited for is always being fetched by another worker
+            self.condition.wait_for(lambda: len(self.buffers) < self.max_buffered or self.is_aborted)
+
+    def abort(self) -> None:
+        """Release the workers that wait for a chunk which will never arrive."""
+        with self.condition:
+            self.is_aborted = True
+            self.condition.notify_all()
+
+    def hexdigest(self) -> str:
+        assert self.next_index == len(self.chunks), "all the chunks should be hashed"
+        return self.md5.hexdigest()
+
+
+class RangeDownloader:
+    def __init__(self, session, url, path, size, connections=CONNECTIONS) -> None:
+        self.session = session
+        self.url = url
+        self.path = path
+        self.size = int(size)
+        self.connections = connections
+        self.part_path = f"{path}.part"
+        self.state_path = f"{path}.part.json"
+        self.chunks = [(start, min(start + CHUNK_SIZE, self.size)) for start in range(0, self.size, CHUNK_SIZE)]
+        self.completed: Set[int] = set()
+        self.downloaded_size = 0
+        self.lock = threading.Lock()
+        self.fd = None
+
+    def _load_state(self) -> Set[int]:
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+
+            if state["size"] == self.size and state["chunk_size"] == CHUNK_SIZE and os.path.isfile(self.part_path):
+                return set(state["completed"])
+        except (OSError, ValueError, KeyError):
+            pass
+
+        return set()
+
+    def _save_state(self) -> None:
+        os.fsync(self.fd)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"size": self.size, "chunk_size": CHUNK_SIZE, "completed": sorted(self.completed)}, f)
+
+        os.replace(tmp_path, self.state_path)
+
+    def _fetch(self, index, hasher) -> None:
+        start, end = self.chunks[index]
+        for attempt in range(ATTEMPTS):
+            if hasher.is_aborted:
+                return
+
+            try:
+                headers = {"Range": f"bytes={start}-{end - 1}"}
+                with self.session.get(self.url, headers=headers, stream=True, timeout=TIMEOUT) as response:
+                    if response.status_code == 200:  # whole file is returned
+                        raise RangeNotSupported(self.url)
+
+                    response.raise_for_status()
+                    data = response.content
+
+                if len(data) != end - start:
+                    raise Exception(f"E: Received {len(data)} bytes instead of {end - start}")
+
+                os.pwrite(self.fd, data, start)
+                break
+            except RangeNotSupported:
+                raise
+            except Exception as e:
+                logging.warning(f"Chunk {index} of {self.path} is failed [attempt={attempt}]: {e}")
+                time.sleep(2 ** attempt)
+        else:
+            raise Exception(f"E: Failed to download the chunk {index} of {self.path}")
+
+        hasher.feed(index, data)
+        with self.lock:
+            self.completed.add(index)
+            self.downloaded_size += len(data)
+            if len(self.completed) % STATE_SAVE_INTERVAL == 0:
+                self._save_state()
+
+    def _download_stream(self) -> str:
+        """Download the file through a single connection, used if the server does not accept range requests."""
+        md5 = hashlib.md5()
+        self.downloaded_size = 0
+        with self.session.get(self.url, stream=True, timeout=TIMEOUT) as response:
+            response.raise_for_status()
+            with open(self.part_path, "wb") as f:
+                for data in response.iter_content(chunk_size=1024 * 1024):
+                    f.write(data)
+                    md5.update(data)
+                    self.downloaded_size += len(data)
+
+        return md5.hexdigest()
+
+    def download(self) -> Transfer:
+        start_time = time.time()
+        self.completed = self._load_state()
+        if self.completed:
+            log(f"==> Resuming {self.path}, {len(self.completed)}/{len(self.chunks)} chunks are already downloaded")
+
+        self.fd = os.open(self.part_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(self.fd, self.size)
+            hasher = InOrderHasher(self.fd, self.chunks, set(self.completed), 2 * self.connections)
+            remaining = [index for index in range(len(self.chunks)) if index not in self.completed]
+            try:
+                with ThreadPoolExecutor(max_workers=self.connections) as executor:
+                    futures = [executor.submit(self._fetch, index, hasher) for index in remaining]
+                    try:
+                        for future in futures:
+                            future.result()
+                    except Exception:
+                        hasher.abort()
+                        raise
+
+                md5sum = hasher.hexdigest()
+            except RangeNotSupported:
+                logging.warning(f"Range requests are not supported for {self.url}, downloading in a single stream")
+                os.close(self.fd)
+                self.fd = None
+                md5sum = self._download_stream()
+            except Exception:
+                with self.lock:
+                    self._save_state()
+
+                raise
+        finally:
+            if self.fd is not None:
+                os.close(self.fd)
+
+        os.replace(self.part_path, self.path)
+        if os.path.isfile(self.state_path):
+            os.remove(self.state_path)
+
+        transfer = Transfer(self.path, self.size, self.downloaded_size, time.time() - start_time, md5sum)
+        log(f"==> {transfer}")
+        return transfer
@@ -7,7 +7,7 @@ import sys
 import time
 
 # from io import StringIO
-from subprocess import DEVNULL, check_output
+from subprocess import DEVNULL, PIPE, Popen, check_output
 
 import ipfshttpclient
 from cid import make_cid
@@ -116,7 +116,7 @@ def decrypt_using_gpg(gpg_file, extract_target=None):
     finally:
         os.unlink(gpg_file_link)
 
-    if not extract_target:
+    if extract_target:
         try:
             untar(tar_file, extract_target)
         except:
@@ -128,6 +128,43 @@ def decrypt_using_gpg(gpg_file, extract_target=None):
             silent_remove(tar_file)
 
 
+def decrypt_stream(ipfs_hash, extract_target) -> None:
+    """Stream `ipfs cat | gpg --decrypt | tar -x` into the extract target.
+
+    Encrypted "tar.gz" file is decrypted and extracted on the fly, hence
+    neither the encrypted nor the decrypted tarball is written on the disk.
+    """
+    if not os.path.isdir(extract_target):
+        os.makedirs(extract_target)
+
+    gpg_cmd = [
+        "gpg",
+        "--batch",
+        "--yes",
+        "--pinentry-mode",
+        "loopback",
+        f"--passphrase-file={env.LOG_PATH}/.gpg_pass.txt",
+        "--decrypt",
+    ]
+    tar_cmd = ["tar", "--warning=no-timestamp", "-xpzf", "-", "-C", extract_target, "--no-overwrite-dir", "--strip", "1"]
+    p_cat = Popen(["ipfs", "cat", ipfs_hash], stdout=PIPE, stderr=PIPE)
+    p_gpg = Popen(gpg_cmd, stdin=p_cat.stdout, stdout=PIPE, stderr=PIPE)
+    p_cat.stdout.close()  # allows ipfs to receive SIGPIPE if gpg exits
+    p_tar = Popen(tar_cmd, stdin=p_gpg.stdout, stderr=PIPE)
+    p_gpg.stdout.close()
+    _, tar_err = p_tar.communicate()
+    gpg_err = p_gpg.stderr.read()
+    p_gpg.wait()
+    cat_err = p_cat.stderr.read()
+    p_cat.wait()
+    for name, p, err in (("ipfs cat", p_cat, cat_err), ("gpg", p_gpg, gpg_err), ("tar", p_tar, tar_err)):
+        if p.returncode != 0:
+            raise Exception(f"E: {name} failed for {ipfs_hash}, returncode={p.returncode}: {err.decode('utf-8')}")
+
+    silent_remove(f"{extract_target}/.git")
+    log(f"==> {ipfs_hash} is decrypted into {extract_target}", color="green")
+
+
 def gpg_encrypt(user_gpg_finderprint, target) -> bool:
     is_delete = False
     if os.path.isdir(target):
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+"""Concurrent IPFS fetch engine through the HTTP API of the IPFS daemon.
+
+A single client with a persistent HTTP session is shared by all the jobs, and
+a global semaphore limits the number of the hashes that are fetched at the
+same time across the jobs.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import ipfshttpclient
+
+from config import env, logging
+from libs.ipfs import decrypt_stream
+from utils import byte_to_mb, log
+
+STAT_TIMEOUT = 300  # wait max 5 minutes
+IPFS_API = "/ip4/127.0.0.1/tcp/5001/http"
+
+_client = None
+_client_lock = threading.Lock()
+fetch_semaphore = threading.BoundedSemaphore(env.IPFS_FETCH_CONCURRENCY)
+
+
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ipfshttpclient.connect(IPFS_API, session=True)
+
+        return _client
+
+
+def _move_into(source, path) -> None:
+    """Place the fetched object as `ipfs get --output=path` does."""
+    if os.path.isdir(source):
+        os.makedirs(path, exist_ok=True)
+        for name in os.listdir(source):
+            destination = os.path.join(path, name)
+            if os.path.isdir(destination) and not os.path.islink(destination):
+                shutil.rmtree(destination)
+            elif os.path.lexists(destination):
+                os.remove(destination)
+
+            shutil.move(os.path.join(source, name), destination)
+    elif os.path.isdir(path):
+        shutil.move(source, os.path.join(path, os.path.basename(source)))
+    else:
+        shutil.move(source, path)
+
+
+class IpfsFetcher:
+    def __init__(self, workers=None) -> None:
+        self.workers = workers or env.IPFS_FETCH_CONCURRENCY
+
+    def stat(self, ipfs_hash) -> dict:
+        with fetch_semaphore:
+            return get_client().object.stat(ipfs_hash, timeout=STAT_TIMEOUT)
+
+    def stat_all(self, ipfs_hashes) -> dict:
+        """Return ipfs_hash => CumulativeSize of the hashes, raises if any of them could not be found."""
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            stats = dict(zip(ipfs_hashes, executor.map(self.stat, ipfs_hashes)))
+
+        return {ipfs_hash: output["CumulativeSize"] for ipfs_hash, output in stats.items()}
+
+    def get(self, ipfs_hash, path, is_storage_paid=False) -> float:
+        """Fetch the hash into the path and return its throughput in MB/s."""
+        parent = os.path.dirname(path.rstrip("/")) or "."
+        with fetch_semaphore:
+            start_time = time.time()
+            tmp_dir = tempfile.mkdtemp(dir=parent, prefix=".ipfs_")
+            try:
+                get_client().get(ipfs_hash, target=tmp_dir)
+                fetched = os.path.join(tmp_dir, ipfs_hash)
+                if os.path.isdir(fetched):
+                    size = sum(
+                        os.lstat(os.path.join(root, name)).st_size
+                        for root, _, files in os.walk(fetched)
+                        for name in files
+                    )
+                else:
+                    size = os.lstat(fetched).st_size
+
+                _move_into(fetched, path)
+            finally:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+
+            elapsed_time = max(time.time() - start_time, 1e-6)
+
+        if is_storage_paid:
+            # pin downloaded ipfs hash if storage is paid
+            get_client().pin.add(ipfs_hash)
+
+        throughput = byte_to_mb(size) / elapsed_time
+        log(f"==> [ ipfs ] {ipfs_hash} is fetched, size={byte_to_mb(size)} MB | throughput={throughput:.2f} MB/s")
+        return throughput
+
+    def get_decrypted(self, ipfs_hash, path, size) -> float:
+        """Stream the encrypted tarball of the hash into the path and return its throughput in MB/s."""
+        with fetch_semaphore:
+            start_time = time.time()
+            decrypt_stream(ipfs_hash, path)
+            elapsed_time = max(time.time() - start_time, 1e-6)
+
+        throughput = byte_to_mb(size) / elapsed_time
+        log(f"==> [ ipfs ] {ipfs_hash} is streamed, size={byte_to_mb(size)} MB | throughput={throughput:.2f} MB/s")
+        return throughput
+
+    def get_all(self, targets, is_storage_paid=False, gpg_sizes=None) -> dict:
+        """Fetch the (ipfs_hash, path) pairs concurrently, returns ipfs_hash => throughput.
+
+        Hashes in `gpg_sizes` (ipfs_hash => size) are decrypted and extracted into their path while they are fetched.
+        """
+        gpg_sizes = gpg_sizes or {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {}
+            for ipfs_hash, path in targets:
+                if ipfs_hash in gpg_sizes:
+                    futures[ipfs_hash] = executor.submit(self.get_decrypted, ipfs_hash, path, gpg_sizes[ipfs_hash])
+                else:
+                    futures[ipfs_hash] = executor.submit(self.get, ipfs_hash, path, is_storage_paid)
+
+            throughputs = {}
+            for ipfs_hash, future in futures.items():
+                try:
+                    throughputs[ipfs_hash] = future.result()
+                except Exception as e:
+                    logging.error(f"E: Failed to fetch IPFS hash {ipfs_hash}: {e}")
+                    raise
+
+        return throughputs
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+
+"""Write-ahead journal of the received jobs.
+
+Each LogJob event is keyed by its (block_number, log_index) and its state is
+moved forward as: seen -> staged -> submitted -> payment_sent -> paid, where
+the job is paid only once the receipt of its payment transaction is mined.
+Records are appended into a JSON lines file, where the last record of an event
+defines its state. Records are fsync'd in batches, except the submitted and
+payment records that are fsync'd right away since the job should not be
+submitted or paid twice.
+"""
+
+import fcntl
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+from config import env, logging
+
+STATES = ("seen", "staged", "submitted", "payment_sent", "paid")
+SYNC_STATES = ("submitted", "payment_sent", "paid")
+BATCH_SIZE = 32
+
+
+class Journal:
+    def __init__(self, path=None) -> None:
+        self.path = path or f"{env.LOG_PATH}/journal.jsonl"
+        self.lock_path = f"{self.path}.lock"
+        self.entries: Dict[Tuple[int, int], dict] = {}
+        self.jobs: Dict[Tuple[str, int], Tuple[int, int]] = {}
+        self.buffer: List[str] = []
+        self.is_loaded = False
+        self.lock = threading.RLock()
+
+    @contextmanager
+    def _file_lock(self, operation):
+        """Appends share the lock, where the compaction requires it exclusively."""
+        with open(self.lock_path, "a") as f:
+            fcntl.flock(f, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _apply(self, record) -> None:
+        key = (record["block_number"], record["log_index"])
+        entry = self.entries.get(key)
+        if entry and STATES.index(record["state"]) < STATES.index(entry["state"]):
+            return  # state does not go backward
+
+        if entry:
+            entry.update(record)
+        else:
+            self.entries[key] = dict(record)
+
+        if record.get("job_key") is not None:
+            self.jobs[(record["job_key"], int(record["index"]))] = key
+
+    def load(self) -> None:
+        with self.lock:
+            if self.is_loaded:
+                return
+
+            if os.path.isfile(self.path):
+                with open(self.path) as f:
+                    for line in f:
+                        if not line.strip():
+                            continue
+
+                        try:
+                            self._apply(json.loads(line))
+                        except ValueError:  # last line could be partially written before a crash
+                            logging.warning(f"Ignoring corrupted journal record: {line.strip()}")
+
+            self.is_loaded = True
+
+    def compact(self) -> None:
+        """Rewrite the journal keeping only the last state of each event."""
+        self.load()
+        with self.lock, self._file_lock(fcntl.LOCK_EX):
+            self._flush(is_sync=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                for key in sorted(self.entries):
+                    f.write(json.dumps(self.entries[key]) + "\n")
+
+                f.flush()
+                os.fsync(f.fileno())
+
+            os.replace(tmp_path, self.path)
+
+    def _flush(self, is_sync=True) -> None:
+        if not self.buffer:
+            return
+
+        fd = os.open(self.path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            data = "".join(self.buffer)
+            size = os.fstat(fd).st_size
+            if size and os.pread(fd, 1, size - 1) != b"\n":
+                data = "\n" + data  # last record is torn by a crash, it should not swallow the next one
+
+            os.write(fd, data.encode("utf-8"))
+            if is_sync:
+                os.fsync(fd)
+        finally:
+            os.close(fd)
+
+        self.buffer = []
+
+    def flush(self) -> None:
+        with self.lock, self._file_lock(fcntl.LOCK_SH):
+            self._flush()
+
+    def mark(self, block_number, log_index, state, **kwargs) -> None:
+        """Move the event into the given state, the record is fsync'd when the batch is full."""
+        if state not in STATES:
+            raise Exception(f"E: Journal state={state} is not valid")
+
+        self.load()
+        record = {"block_number": int(block_number), "log_index": int(log_index), "state": state, "time": time.time()}
+        record.update(kwargs)
+        with self.lock:
+            self._apply(record)
+            self.buffer.append(json.dumps(record) + "\n")
+            if state in SYNC_STATES or len(self.buffer) >= BATCH_SIZE:
+                with self._file_lock(fcntl.LOCK_SH):
+                    self._flush()
+
+    def mark_job(self, job_key, index, state, **kwargs) -> bool:
+        """Move the event of the job into the given state, returns False if the job is not journaled."""
+        self.load()
+        key = self.jobs.get((job_key, int(index)))
+        if not key:
+            return False
+
+        self.mark(key[0], key[1], state, **kwargs)
+        return True
+
+    def get_state(self, block_number, log_index):
+        self.load()
+        with self.lock:
+            entry = self.entries.get((int(block_number), int(log_index)))
+            return entry["state"] if entry else None
+
+    def is_accepted(self, block_number, log_index) -> bool:
+        """Return True if the job is already submitted, hence it should not be validated again.
+
+        Jobs that are only seen or staged are processed again, since they are
+        not submitted into slurm yet.
+        """
+        state = self.get_state(block_number, log_index)
+        return state is not None and STATES.index(state) >= STATES.index("submitted")
+
+
+journal = Journal()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+
+"""In-process md5sum of folders.
+
+Generates the identical digest of `bash_scripts/generate_md5sum_for_folder.sh`:
+files are found by following the symbolic links, where `venv`, `__pycache__`,
+`.git*` and `node_modules` are pruned; md5sum of each file is sorted and md5sum
+of their lines is returned. Files are hashed in parallel and their md5sums are
+kept in a persistent cache keyed by their (device, inode) along with their size,
+modification time and path, so unchanged files are not read again. Entries of
+the files that do not exist anymore are pruned once the cache is loaded, and
+the cache is only written back, atomically, if it is changed.
+"""
+
+import fnmatch
+import hashlib
+import os
+import pickle
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from config import env, logging
+
+PRUNE_PATTERNS = ("venv", "__pycache__", ".git*", "node_modules")
+BUFFER_SIZE = 1024 * 1024
+WORKERS = min(32, (os.cpu_count() or 1) * 2)
+
+
+def _is_pruned(name) -> bool:
+    return any(fnmatch.fnmatchcase(name, pattern) for pattern in PRUNE_PATTERNS)
+
+
+def find_files(target) -> List[str]:
+    """Return the regular files under the target as `find -L target ( -name .. ) -prune -o -type f` does."""
+    if _is_pruned(os.path.basename(target)):
+        return []
+
+    files = []
+    stack = [(target, frozenset())]
+    while stack:
+        folder, ancestors = stack.pop()
+        try:
+            st = os.stat(folder)
+            ancestors = ancestors | {(st.st_dev, st.st_ino)}
+            entries = list(os.scandir(folder))
+        except OSError as e:
+            logging.warning(f"Skipping {folder}: {e}")
+            continue
+
+        for entry in entries:
+            if _is_pruned(entry.name):
+                continue
+
+            try:
+                if entry.is_dir():  # symbolic links are followed
+                    st = entry.stat()
+                    if (st.st_dev, st.st_ino) in ancestors:  # file system loop
+                        logging.warning(f"File system loop detected at {entry.path}")
+                        continue
+
+                    stack.append((entry.path, ancestors))
+                elif entry.is_file():
+                    files.append(entry.path)
+            except OSError:  # broken symbolic link
+                continue
+
+    return files
+
+
+def md5sum_file(path) -> str:
+    md5 = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(BUFFER_SIZE), b""):
+            md5.update(chunk)
+
+    return md5.hexdigest()
+
+
+class HashCache:
+    """Persistent cache of the files' md5sums keyed by (st_dev, st_ino) => (st_size, st_mtime_ns, md5sum, path)."""
+
+    def __init__(self, path=None) -> None:
+        self.path = path or f"{env.LOG_PATH}/md5sum_cache.pckl"
+        self.hashes: Optional[Dict[Tuple[int, int], Tuple[int, int, str, str]]] = None
+        self.is_updated = False
+        self.lock = threading.Lock()
+
+    def prune(self) -> None:
+        """Drop the entries whose file is removed or replaced by another inode."""
+        for key, cached in list(self.hashes.items()):
+            try:
+                st = os.stat(cached[3])
+                if (st.st_dev, st.st_ino) == key:
+                    continue
+            except (OSError, IndexError):  # IndexError: entry is written without its path
+                pass
+
+            del self.hashes[key]
+            self.is_updated = True
+
+    def load(self) -> None:
+        with self.lock:
+            if self.hashes is not None:
+                return
+
+            self.hashes = {}
+            if os.path.isfile(self.path):
+                try:
+                    with open(self.path, "rb") as f:
+                        self.hashes = pickle.load(f)
+                except Exception as e:
+                    logging.warning(f"Failed to load the md5sum cache, it is reset: {e}")
+
+            self.prune()
+
+    def save(self) -> None:
+        with self.lock:
+            if not self.is_updated:
+                return
+
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, "wb") as f:
+                    pickle.dump(self.hashes, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logging.warning(f"Failed to save the md5sum cache: {e}")
+                return
+
+            self.is_updated = False
+
+    def md5sum(self, path) -> str:
+        st = os.stat(path)
+        key = (st.st_dev, st.st_ino)
+        cached = self.hashes.get(key)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            return cached[2]
+
+        md5sum = md5sum_file(path)
+        with self.lock:
+            self.hashes[key] = (st.st_size, st.st_mtime_ns, md5sum, path)
+            self.is_updated = True
+
+        return md5sum
+
+
+hash_cache = HashCache()
+
+
+def _md5sum_line(path) -> str:
+    try:
+        md5sum = hash_cache.md5sum(path)
+    except OSError as e:  # md5sum only prints error for the files that could not be read
+        logging.warning(f"md5sum: {path}: {e}")
+        return None
+
+    if "\\" in path or "\n" in path:
+        # md5sum escapes such file names by prefixing its output line with a backslash
+        return f"\\{md5sum}"
+
+    return md5sum
+
+
+def md5sum_folder(path) -> str:
+    target = os.path.realpath(path.rstrip("/") or "/")
+    hash_cache.load()
+    files = find_files(target)
+    with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+        lines = [line for line in executor.map(_md5sum_line, files) if line is not None]
+
+    hash_cache.save()
+    output = "".join(f"{line}\n" for line in sorted(lines))
+    return hashlib.md5(output.encode("utf-8")).hexdigest()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+"""Batched JSON-RPC requests.
+
+Several contract reads are sent into geth within a single JSON-RPC batch
+request, where all of them are evaluated at the same pinned block. Calls are
+encoded and decoded through the private helpers of web3, which is pinned in
+requirements.txt; if they are not available, contract functions are called
+one by one.
+"""
+
+import json
+import socket
+
+import requests
+from web3 import IPCProvider
+
+from config import logging
+
+
+def _send_ipc(ipc_path, payload, timeout=60):
+    decoder = json.JSONDecoder()
+    buffer = ""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(ipc_path)
+        sock.sendall(json.dumps(payload).encode("utf-8"))
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                raise ConnectionError("E: IPC connection is closed by geth")
+
+            buffer += data.decode("utf-8")
+            try:
+                response, _ = decoder.raw_decode(buffer.lstrip())
+                return response
+            except ValueError:  # response is not completely received yet
+                pass
+
+
+def send_batch(w3, requests_list) -> list:
+    """Send the (method, params) pairs as a single batch and return their results in the same order."""
+    payload = [
+        {"jsonrpc": "2.0", "id": idx, "method": method, "params": params}
+        for idx, (method, params) in enumerate(requests_list)
+    ]
+    if not payload:
+        return []
+
+    provider = w3.provider
+    if isinstance(provider, IPCProvider):
+        responses = _send_ipc(str(provider.ipc_path), payload)
+    else:
+        responses = requests.post(provider.endpoint_uri, json=payload, timeout=60).json()
+
+    if isinstance(responses, dict):  # whole batch is rejected
+        raise Exception(f"E: Batch request is failed: {responses.get('error')}")
+
+    results = [None] * len(payload)
+    for response in responses:
+        if "error" in response:
+            method = payload[response["id"]]["method"]
+            raise Exception(f"E: {method} is failed in the batch request: {response['error']}")
+
+        results[response["id"]] = response["result"]
+
+    return results
+
+
+def _get_codec(w3):
+    """Return the (encode, decode) functions of the contract calls, None if web3 does not provide them."""
+    try:
+        from web3._utils.abi import get_abi_output_types
+
+        decode_abi = w3.codec.decode_abi
+    except (ImportError, AttributeError):
+        return None
+
+    def encode(func) -> dict:
+        return {"to": func.address, "data": func._encode_transaction_data()}
+
+    def decode(func, result):
+        return decode_abi(get_abi_output_types(func.abi), bytes.fromhex(result[2:]))
+
+    return encode, decode
+
+
+def batch_call(w3, contract_functions, block_identifier="latest") -> list:
+    """Call the contract functions, at the same block, within a single batch request.
+
+    Outputs are decoded as `ContractFunction.call()` does, where a function
+    with a single output returns that output itself.
+    """
+    codec = _get_codec(w3)
+    try:
+        encode, decode = codec
+        txs = [encode(func) for func in contract_functions]
+    except (TypeError, AttributeError):  # private helpers are changed in the installed web3
+        logging.warning("Contract calls could not be batched, they are called one by one")
+        return [func.call(block_identifier=block_identifier) for func in contract_functions]
+
+    if isinstance(block_identifier, int):
+        block_identifier = hex(block_identifier)
+
+    try:
+        results = send_batch(w3, [("eth_call", [tx, block_identifier]) for tx in txs])
+    except Exception as e:
+        logging.error(f"E: Failed to send the batch request: {e}")
+        raise
+
+    outputs = []
+    for func, result in zip(contract_functions, results):
+        output = decode(func, result)
+        if len(output) == 1:
+            outputs.append(output[0])
+        else:
+            outputs.append(output)
+
+    return outputs
@@ -1,12 +1,21 @@
 #!/usr/bin/env python3
 
+import json
+import threading
 import time
+from typing import List, NamedTuple, Optional
 
 import config
 from config import QuietExit, env, logging
 from lib import run
 from utils import BashCommandsException, _colorize_traceback, is_process_on, log, popen_communicate, print_ok
 
+SNAPSHOT_MAX_AGE = 5  # seconds
+# cpus of the nodes in these states are counted as other, as `sinfo -o%C` does
+UNAVAILABLE_STATES = {"DOWN", "DRAIN", "DRAINED", "DRAINING", "FAIL", "FAILING", "NOT_RESPONDING", "FUTURE"}
+# stderr of sinfo/squeue when the installed slurm does not support the --json option
+JSON_UNSUPPORTED_ERRORS = ("unrecognized option", "invalid option", "unknown option", "no serializer")
+
 
 def add_user_to_slurm(user):
     # remove__user(user)
@@ -33,26 +42,185 @@ def remove_user(user):
         raise BashCommandsException(p.returncode, output, error_msg, str(cmd))
 
 
-def get_idle_cores(is_print_flag=True):
-    # https://stackoverflow.com/a/50095154/2402577
-    core_info = run(["sinfo", "-h", "-o%C"]).split("/")
-    if len(core_info) != 0:
-        allocated_cores = core_info[0]
-        idle_cores = core_info[1]
-        other_cores = core_info[2]
-        total_cores = core_info[3]
-        if is_print_flag:
-            log(
-                f"AllocatedCores={allocated_cores} |"
-                f"IdleCores={idle_cores} |"
-                f"OtherCores={other_cores} |"
-                f"TotalNumberOfCores={total_cores}",
-                "green",
+class CoreInfo(NamedTuple):
+    allocated: int
+    idle: int
+    other: int
+    total: int
+
+
+class NodeInfo(NamedTuple):
+    name: str
+    state: str
+    cpus: int
+    allocated_cpus: int
+    idle_cpus: int
+
+
+class QueueJob(NamedTuple):
+    job_id: str
+    state: str
+    cpus: int
+    user: str
+    name: str
+
+
+def _number(value) -> int:
+    """Newer versions of slurm's json output keeps numbers as {"set": bool, "number": int}."""
+    if isinstance(value, dict):
+        value = value.get("number", 0) if value.get("set", True) else 0
+
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _state(value) -> str:
+    if isinstance(value, list):
+        return "+".join(value)
+
+    return str(value)
+
+
+def is_available(state) -> bool:
+    return not UNAVAILABLE_STATES.intersection(state.upper().split("+"))
+
+
+class JsonNotSupported(Exception):
+    pass
+
+
+def _run_json(cmd) -> dict:
+    p, output, error_msg = popen_communicate(cmd)
+    if p.returncode != 0:
+        if any(error in error_msg.lower() for error in JSON_UNSUPPORTED_ERRORS):
+            raise JsonNotSupported(error_msg)
+
+        raise BashCommandsException(p.returncode, output, error_msg)
+
+    try:
+        return json.loads(output)
+    except ValueError as e:
+        raise JsonNotSupported(f"{cmd[0]} --json output could not be parsed") from e
+
+
+class SlurmSnapshot:
+    """Node and queue state of slurm that is refreshed once per tick.
+
+    `sinfo --json` and `squeue --json` are used if the installed slurm
+    supports them, otherwise their formatted outputs are parsed. If a json call
+    fails for another reason, such as an unreachable controller, formatted
+    output is used only for that refresh.
+    """
+
+    def __init__(self, max_age=SNAPSHOT_MAX_AGE) -> None:
+        self.max_age = max_age
+        self.timestamp = 0.0
+        self.cores: Optional[CoreInfo] = None
+        self.nodes: List[NodeInfo] = []
+        self.queue: List[QueueJob] = []
+        self.is_json_supported = True
+        self.lock = threading.Lock()
+
+    def _refresh_json(self) -> None:
+        nodes = []
+        for node in _run_json(["sinfo", "--json"]).get("nodes", []):
+            state = _state(node.get("state"))
+            cpus = _number(node.get("cpus"))
+            allocated_cpus = _number(node.get("alloc_cpus", node.get("alloc_cores")))
+            idle_cpus = 0
+            if is_available(state):
+                idle_cpus = _number(node.get("idle_cpus", cpus - allocated_cpus))
+
+            nodes.append(NodeInfo(node.get("name"), state, cpus, allocated_cpus, idle_cpus))
+
+        queue = []
+        for job in _run_json(["squeue", "--json"]).get("jobs", []):
+            queue.append(
+                QueueJob(
+                    str(_number(job.get("job_id"))),
+                    _state(job.get("job_state")),
+                    _number(job.get("cpus")),
+                    str(job.get("user_name")),
+                    str(job.get("name")),
+                )
             )
-    else:
+
+        allocated = sum(node.allocated_cpus for node in nodes)
+        idle = sum(node.idle_cpus for node in nodes)
+        total = sum(node.cpus for node in nodes)
+        self.cores = CoreInfo(allocated, idle, total - allocated - idle, total)
+        self.nodes = nodes
+        self.queue = queue
+
+    def _refresh_formatted(self) -> None:
+        # https://stackoverflow.com/a/50095154/2402577
+        core_info = run(["sinfo", "-h", "-o%C"]).split("/")
+        if len(core_info) == 4:
+            self.cores = CoreInfo(*[int(core) for core in core_info])
+        else:
+            self.cores = None
+
+        self.nodes = []
+        for line in run(["sinfo", "-h", "-N", "-o%N|%T|%C"]).splitlines():
+            name, state, cpus = line.split("|")
+            allocated_cpus, idle_cpus, _, total_cpus = [int(cpu) for cpu in cpus.split("/")]
+            self.nodes.append(NodeInfo(name, state, total_cpus, allocated_cpus, idle_cpus))
+
+        self.queue = []
+        for line in run(["squeue", "-h", "-o%i|%T|%C|%u|%j"]).splitlines():
+            job_id, state, cpus, user, name = line.split("|", 4)
+            self.queue.append(QueueJob(job_id, state, int(cpus), user, name))
+
+    def refresh(self) -> None:
+        with self.lock:
+            if self.is_json_supported:
+                try:
+                    self._refresh_json()
+                    self.timestamp = time.time()
+                    return
+                except JsonNotSupported:
+                    self.is_json_supported = False
+                except Exception as e:
+                    logging.warning(f"sinfo/squeue --json failed, formatted output is used for now: {e}")
+
+            self._refresh_formatted()
+            self.timestamp = time.time()
+
+    def get(self, is_refresh=False):
+        """Return the snapshot, it is refreshed only if it gets older than its max_age."""
+        if is_refresh or time.time() - self.timestamp > self.max_age:
+            self.refresh()
+
+        return self
+
+    def queue_str(self) -> str:
+        lines = ["{0: <10} {1: <12} {2: <6} {3: <20} {4}".format("JOBID", "STATE", "CPUS", "USER", "NAME")]
+        for job in self.queue:
+            lines.append(f"{job.job_id: <10} {job.state: <12} {job.cpus: <6} {job.user: <20} {job.name}")
+
+        return "\n".join(lines)
+
+
+snapshot = SlurmSnapshot()
+
+
+def get_idle_cores(is_print_flag=True, is_refresh=False):
+    cores = snapshot.get(is_refresh).cores
+    if cores is None:
         logging.error("E: sinfo is emptry string")
         return None
-    return idle_cores
+
+    if is_print_flag:
+        log(
+            f"AllocatedCores={cores.allocated} |"
+            f"IdleCores={cores.idle} |"
+            f"OtherCores={cores.other} |"
+            f"TotalNumberOfCores={cores.total}",
+            "green",
+        )
+    return cores.idle
 
 
 def pending_jobs_check():
@@ -63,8 +231,8 @@ def pending_jobs_check():
         if not is_print_flag:
             logging.info("Waiting running jobs to be completed...")
             is_print_flag = 1
-        idle_cores = get_idle_cores(is_print_flag=False)
         time.sleep(10)
+        idle_cores = get_idle_cores(is_print_flag=False, is_refresh=True)
 
 
 def is_on() -> bool:
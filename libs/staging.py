@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+"""Materialise the cached inputs into the job folders without extracting them for each job.
+
+Cached tarball is extracted once next to itself into `.<name>.extracted`,
+whose modification time is set to the tarball's one to detect a re-downloaded
+tarball. Each job receives the extracted copy through reflinks where the file
+system supports them, which are copy-on-write. Otherwise the job receives its
+own private copy, since jobs could modify their inputs in place; the shared
+extracted copy is never linked into a job's folder.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+from subprocess import DEVNULL, CalledProcessError, check_call
+from typing import Dict
+
+from config import logging
+from utils import log, run
+
+_is_reflink_supported: Dict[int, bool] = {}
+_extract_locks: Dict[str, threading.Lock] = {}
+_lock = threading.Lock()
+
+
+def get_extracted_path(tar_file) -> str:
+    folder, name = os.path.split(tar_file)
+    if name.endswith(".tar.gz"):
+        name = name[: -len(".tar.gz")]
+
+    return os.path.join(folder, f".{name}.extracted")
+
+
+def _is_stale(extracted, tar_file) -> bool:
+    try:
+        return os.stat(extracted).st_mtime_ns != os.stat(tar_file).st_mtime_ns
+    except FileNotFoundError:
+        return True
+
+
+def extract_once(tar_file) -> str:
+    """Return the extracted copy of the cached tarball, it is extracted if it does not exist or it is outdated."""
+    extracted = get_extracted_path(tar_file)
+    with _lock:
+        extract_lock = _extract_locks.setdefault(extracted, threading.Lock())
+
+    with extract_lock:
+        if not _is_stale(extracted, tar_file):
+            return extracted
+
+        tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(extracted), prefix=".staging_")
+        try:
+            cmd = ["tar", "--warning=no-timestamp", "-xpf", tar_file, "-C", tmp_dir, "--strip", "1"]
+            run(cmd)
+            # shared copy is only read through reflinks or copies, it should never be modified in place
+            run(["find", tmp_dir, "-type", "f", "-exec", "chmod", "a-w", "{}", "+"])
+            mtime_ns = os.stat(tar_file).st_mtime_ns
+            os.utime(tmp_dir, ns=(mtime_ns, mtime_ns))
+            if os.path.isdir(extracted):
+                shutil.rmtree(extracted)
+
+            os.rename(tmp_dir, extracted)
+        except:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+    log(f"==> {tar_file} is extracted into {extracted}")
+    return extracted
+
+
+def _cp(options, source, target) -> bool:
+    try:
+        check_call(["cp", *options, f"{source}/.", target], stderr=DEVNULL)
+        return True
+    except CalledProcessError:
+        return False
+
+
+def _clear(target) -> None:
+    """Remove the partially materialised files, `.git` of the target is kept."""
+    for entry in os.scandir(target):
+        if entry.name == ".git":
+            continue
+
+        if entry.is_dir(follow_symlinks=False):
+            shutil.rmtree(entry.path)
+        else:
+            os.remove(entry.path)
+
+
+def materialise(source, target) -> str:
+    """Materialise the folder into the target, returns the method that is used."""
+    device = os.stat(source).st_dev
+    if _is_reflink_supported.get(device, True):
+        if _cp(["-R", "--reflink=always", "--preserve=timestamps"], source, target):
+            _is_reflink_supported[device] = True
+            run(["chmod", "-R", "u+w", target])
+            return "reflink"
+
+        _is_reflink_supported[device] = False
+        _clear(target)
+
+    run(["cp", "-R", "--preserve=timestamps", f"{source}/.", target])
+    run(["chmod", "-R", "u+w", target])
+    return "copy"
+
+
+def stage(tar_file, target) -> None:
+    """Stage the cached tarball into the job's folder, as `untar` does but without copying its data."""
+    if not os.path.isdir(target):
+        os.makedirs(target)
+
+    for name in os.listdir(target):
+        if name not in (".git", os.path.basename(tar_file)):
+            log(f"==> {tar_file} is already staged into\n{target}", color="green")
+            return
+
+    try:
+        extracted = extract_once(tar_file)
+        method = materialise(extracted, target)
+    except Exception as e:
+        logging.error(f"E: Failed to stage {tar_file} into {target}: {e}")
+        raise
+
+    log(f"==> {tar_file} is staged into {target} using {method}")
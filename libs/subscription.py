@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+
+"""Push based notifications from geth using `eth_subscribe` over its IPC socket.
+
+doc: https://geth.ethereum.org/docs/rpc/pubsub
+"""
+
+import json
+import os
+import socket
+from collections import deque
+
+from config import env, logging
+
+
+class Subscription:
+    """Subscription into geth's `newHeads` or `logs` notifications.
+
+    Each subscription opens its own connection to the IPC socket, since
+    notifications are only delivered into the connection that created them.
+    """
+
+    def __init__(self, ipc_path=None) -> None:
+        self.ipc_path = ipc_path or f"{env.DATADIR}/geth.ipc"
+        if not os.path.exists(self.ipc_path):
+            raise Exception(f"E: IPC socket {self.ipc_path} does not exist")
+
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.ipc_path)
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.request_id = 0
+        self.subscription_id = None
+        self.notifications = deque()  # type: deque
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, etype, value, traceback):
+        self.close()
+
+    def _receive(self, timeout=None):
+        """Return the next JSON message read from the socket, None on timeout."""
+        while True:
+            self.buffer = self.buffer.lstrip()
+            if self.buffer:
+                try:
+                    message, idx = self.decoder.raw_decode(self.buffer)
+                    self.buffer = self.buffer[idx:]
+                    return message
+                except ValueError:  # message is not completely received yet
+                    pass
+
+            self.sock.settimeout(timeout)
+            try:
+                data = self.sock.recv(65536)
+            except socket.timeout:
+                return None
+
+            if not data:
+                raise ConnectionError("E: IPC connection is closed by geth")
+
+            self.buffer += data.decode("utf-8")
+
+    def _queue(self, message) -> None:
+        if message.get("method") == "eth_subscription":
+            params = message["params"]
+            if params["subscription"] == self.subscription_id:
+                self.notifications.append(params["result"])
+
+    def request(self, method, params):
+        self.request_id += 1
+        request_id = self.request_id
+        payload = {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}
+        self.sock.sendall(json.dumps(payload).encode("utf-8"))
+        while True:
+            message = self._receive()
+            if message.get("id") == request_id:
+                if "error" in message:
+                    raise Exception(f"E: {method} is failed: {message['error']}")
+
+                return message["result"]
+
+            # notifications received in the meantime are kept
+            self._queue(message)
+
+    def subscribe(self, *params) -> str:
+        self.subscription_id = self.request("eth_subscribe", list(params))
+        return self.subscription_id
+
+    def wait(self, timeout=None) -> list:
+        """Block until notifications are received, returns empty list on timeout."""
+        if not self.notifications:
+            message = self._receive(timeout)
+            if message:
+                self._queue(message)
+
+        notifications = list(self.notifications)
+        self.notifications.clear()
+        return notifications
+
+    def close(self) -> None:
+        try:
+            if self.subscription_id:
+                self.request("eth_unsubscribe", [self.subscription_id])
+        except Exception:
+            pass
+        finally:
+            self.sock.close()
+
+
+def subscribe_logs(filter_params):
+    """Subscribe into logs that match the address and topics of the given filter parameters."""
+    subscription = Subscription()
+    _filter = {key: filter_params[key] for key in ("address", "topics") if filter_params.get(key)}
+    subscription.subscribe("logs", _filter)
+    return subscription
+
+
+def subscribe_new_heads():
+    subscription = Subscription()
+    subscription.subscribe("newHeads")
+    return subscription
+
+
+def try_subscribe(func, *args):
+    """Return the subscription, None if subscriptions are not available where polling should be used."""
+    try:
+        return func(*args)
+    except Exception as e:
+        logging.warning(f"Subscription is not available, falling back into polling: {e}")
+        return None
@@ -3,18 +3,18 @@
 from subprocess import PIPE, Popen
 
 
-def _run_as_sudo(sudo_user, cmd_str, shell=False):
+def _run_as_sudo(sudo_user, cmd_str, shell=False, cwd=None):
     sudo_args = ["sudo", "-u", sudo_user]
     cmd_array = sudo_args + cmd_str.split()
-    p, output, error = _popen_communicate(" ".join(cmd_array), shell=shell)
+    p, output, error = _popen_communicate(" ".join(cmd_array), shell=shell, cwd=cwd)
 
     if p.returncode != 0 or "error" in error:
         raise Exception(error)
     return output
 
 
-def _popen_communicate(cmd_array, shell=False):
-    p = Popen(cmd_array, stdout=PIPE, stderr=PIPE, shell=shell)
+def _popen_communicate(cmd_array, shell=False, cwd=None):
+    p = Popen(cmd_array, stdout=PIPE, stderr=PIPE, shell=shell, cwd=cwd)
     output, error = p.communicate()
     output = output.strip().decode("utf-8")
     error = error.decode("utf-8")
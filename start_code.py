@@ -2,7 +2,6 @@
 
 import subprocess
 import sys
-import time
 from datetime import datetime
 
 import eblocbroker.Contract as Contract
@@ -24,17 +23,15 @@ def start_call(job_key, index, slurm_job_id):
     env.log_filename = f"{env.LOG_PATH}/transactions/{env.PROVIDER_ID}.txt"
     f = open(env.log_filename, "a")
     f.write(f"{env.EBLOCPATH}/eblocbroker/set_job_status_running.py {job_key} {index} {job_id} {start_time}\n\n")
-    time.sleep(0.5)
-    for attempt in range(3):
-        if attempt > 0:
-            time.sleep(env.BLOCK_DURATION)
-        try:
-            tx_hash = Ebb.set_job_status_running(job_key, index, job_id, start_time)
-            break
-        except:
-            f.write(f"try={attempt}")
-    else:  # we failed all the attempts - abort
-        f.write("\n")
+    try:
+        # nonce is assigned by the transaction manager, so it is not retried after waiting for a block
+        tx_hash = Ebb.set_job_status_running(job_key, index, job_id, start_time)
+        # process should not exit before its transaction is mined, otherwise it is not re-priced if it is stuck
+        receipt = Ebb.tx_manager.wait_receipt(tx_hash)
+        if receipt["status"] != 1:
+            raise Exception(f"setJobStatusRunning tx_hash={tx_hash} is reverted")
+    except Exception as e:
+        f.write(f"E: {e}\n")
         f.close()
         sys.exit(1)
 
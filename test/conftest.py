@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+
+"""config reads ~/.eBlocBroker/.env while it is imported, hence the unit tests run under a temporary home."""
+
+import os
+import tempfile
+
+_home = tempfile.mkdtemp(prefix="ebloc_test_")
+os.makedirs(f"{_home}/.eBlocBroker")
+os.makedirs(f"{_home}/log/transactions")
+with open(f"{_home}/.eBlocBroker/.env", "w") as f:
+    f.write(
+        "\n".join(
+            [
+                "WHOAMI=test",
+                "SLURMUSER=test",
+                f"LOG_PATH={_home}/log",
+                "GDRIVE=gdrive",
+                "OC_USER=test",
+                f"DATADIR={_home}/data",
+                "IS_IPFS_USE=0",
+                "IS_EUDAT_USE=0",
+                "IS_GDRIVE_USE=0",
+                "POA_CHAIN=0",
+                "RPC_PORT=8545",
+                f"EBLOCPATH={os.path.dirname(os.path.dirname(os.path.abspath(__file__)))}",
+                "PROVIDER_ID=0x0000000000000000000000000000000000000001",
+            ]
+        )
+        + "\n"
+    )
+
+os.environ["HOME"] = _home
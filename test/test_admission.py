@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+import logging
+
+import pytest
+
+import drivers.admission as admission
+from drivers.admission import AdmissionScheduler
+
+
+class StorageClass:
+    def __init__(self, job_key, cores, run_time, block_number, is_failing=False) -> None:
+        self.job_key = job_key
+        self.index = 0
+        self.cores = [cores]
+        self.run_time = [run_time]
+        self.logged_job = {"blockNumber": block_number}
+        self.thread_name = f"{job_key}_0"
+        self.is_failing = is_failing
+        self.is_submitted = False
+        self.is_refunded = False
+
+    def get_thread_handler(self):
+        return logging.NullHandler()
+
+    def submit(self):
+        if self.is_failing:
+            raise SystemExit(1)  # slurm could not accept the job
+
+        self.is_submitted = True
+
+    def complete_refund(self):
+        self.is_refunded = True
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    _scheduler = AdmissionScheduler()
+    _scheduler.shutdown()  # jobs are scheduled by the tests
+    monkeypatch.setattr(admission.slurm, "get_idle_cores", lambda **kwargs: 4)
+    monkeypatch.setattr(admission.config, "logging", logging.getLogger())  # as the driver sets up its logger
+    return _scheduler
+
+
+def test_smaller_jobs_are_backfilled_ahead_of_the_head(scheduler):
+    head = StorageClass("head", cores=8, run_time=10, block_number=100)
+    long_job = StorageClass("long", cores=2, run_time=60, block_number=101)
+    short_job = StorageClass("short", cores=2, run_time=5, block_number=102)
+    for storage_class in (head, long_job, short_job):
+        scheduler.enqueue(storage_class)
+
+    assert [str(queued_job) for queued_job in scheduler.select(idle_cores=2)] == ["short_0"]
+    assert len(scheduler) == 2
+
+
+def test_head_is_not_bypassed_after_waiting_too_long(scheduler):
+    scheduler.enqueue(StorageClass("head", cores=8, run_time=10, block_number=100))
+    scheduler.enqueue(StorageClass("small", cores=1, run_time=5, block_number=101))
+    scheduler.queue[0].enqueued_at -= admission.BACKFILL_MAX_WAIT + 1
+    assert scheduler.select(idle_cores=4) == []
+    assert len(scheduler) == 2
+
+
+def test_checkpoint_does_not_advance_past_a_queued_job(scheduler):
+    scheduler.enqueue(StorageClass("waiting", cores=8, run_time=10, block_number=100))
+    scheduler.enqueue(StorageClass("fits", cores=2, run_time=10, block_number=105))
+    assert scheduler.get_checkpoint(110) == 100
+
+    scheduler.schedule()
+    assert scheduler.is_queued("waiting", 0) and not scheduler.is_queued("fits", 0)
+    assert scheduler.get_checkpoint(110) == 100  # head is still not submitted
+
+
+def test_failed_submission_is_refunded_and_scheduling_continues(scheduler):
+    failing = StorageClass("failing", cores=1, run_time=5, block_number=100, is_failing=True)
+    next_job = StorageClass("next", cores=1, run_time=10, block_number=101)
+    scheduler.enqueue(failing)
+    scheduler.enqueue(next_job)
+    scheduler.schedule()
+    assert failing.is_refunded and not failing.is_submitted
+    assert next_job.is_submitted
+    assert len(scheduler) == 0
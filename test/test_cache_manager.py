@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+import os
+import time
+
+import pytest
+
+from libs.cache_manager import CacheManager
+
+mongomock = pytest.importorskip("mongomock")
+
+
+@pytest.fixture
+def cache_manager(tmp_path, monkeypatch):
+    monkeypatch.setattr(CacheManager, "is_index_created", True)
+    monkeypatch.setattr(CacheManager, "get_expiry_block", staticmethod(lambda name: None))
+    _cache_manager = CacheManager()
+    _cache_manager.entries = mongomock.MongoClient()["eBlocBroker"]["cache_entries"]
+    return _cache_manager
+
+
+def add_cached_file(cache_manager, folder, name, size, expiry_block=None, last_access=None):
+    path = os.path.join(folder, f"{name}.tar.gz")
+    with open(path, "wb") as f:
+        f.write(b"0" * size)
+
+    cache_manager.add(path, name, None, None, expiry_block)
+    if last_access is not None:
+        cache_manager.entries.update_one({"path": path}, {"$set": {"last_access": last_access}})
+
+    return path
+
+
+def test_unexpired_entries_are_never_evicted(cache_manager, tmp_path):
+    now = time.time()
+    expired = add_cached_file(cache_manager, tmp_path, "expired", 100, expiry_block=50, last_access=now)
+    paid = add_cached_file(cache_manager, tmp_path, "paid", 100, expiry_block=200, last_access=now - 100)
+    unknown = add_cached_file(cache_manager, tmp_path, "unknown", 100, last_access=now - 200)
+    # least recently used entries are still paid, or their expiry is not known
+    assert cache_manager.evict(block_number=100, quota=1) == 100
+    assert not os.path.exists(expired)
+    assert os.path.exists(paid) and os.path.exists(unknown)
+    assert cache_manager.get_total_size() == 200
+
+
+def test_least_recently_used_entries_are_evicted_first(cache_manager, tmp_path):
+    now = time.time()
+    old = add_cached_file(cache_manager, tmp_path, "old", 100, expiry_block=10, last_access=now - 100)
+    recent = add_cached_file(cache_manager, tmp_path, "recent", 100, expiry_block=10, last_access=now)
+    extracted = tmp_path / ".old.extracted"
+    extracted.mkdir()
+    assert cache_manager.evict(block_number=100, quota=150) == 100
+    assert not os.path.exists(old) and not extracted.exists()
+    assert os.path.exists(recent)
+
+
+def test_scan_skips_the_extracted_copies_and_partial_downloads(cache_manager, tmp_path, monkeypatch):
+    monkeypatch.setattr(CacheManager, "get_expiry_block", staticmethod(lambda name: 500))
+    for name in ("data.tar.gz", "data.tar.gz.part", "shareID.json"):
+        (tmp_path / name).write_bytes(b"0")
+
+    for name in (".data.extracted", ".staging_abc", "folder_hash"):
+        (tmp_path / name).mkdir()
+
+    cache_manager.scan([str(tmp_path)])
+    documents = {document["name"]: document for document in cache_manager.entries.find()}
+    assert sorted(documents) == ["data", "folder_hash"]
+    assert documents["data"]["expiry_block"] == 500
+
+
+def test_lookup_detects_a_modified_file_under_the_folder(cache_manager, tmp_path):
+    folder = tmp_path / "folder_hash"
+    (folder / "sub").mkdir(parents=True)
+    (folder / "sub" / "input.txt").write_text("data")
+    cache_manager.add(str(folder), "folder_hash", None, "md5sum")
+    assert cache_manager.lookup(str(folder), "md5sum")
+
+    (folder / "sub" / "input.txt").write_text("modified")
+    assert not cache_manager.lookup(str(folder), "md5sum")
+
+
+def test_extracted_copy_is_counted_against_the_quota(cache_manager, tmp_path):
+    path = add_cached_file(cache_manager, tmp_path, "data", 100, expiry_block=10)
+    extracted = tmp_path / ".data.extracted"
+    extracted.mkdir()
+    (extracted / "input.txt").write_bytes(b"0" * 50)
+    cache_manager.scan([str(tmp_path)])
+    assert cache_manager.get_total_size() == 150
+    assert cache_manager.evict(block_number=100, quota=120) == 150
+    assert not os.path.exists(path) and not extracted.exists()
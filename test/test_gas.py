@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+
+from types import SimpleNamespace
+
+from eblocbroker.gas import GasOracle
+
+
+class ContractFunction:
+    def __init__(self, fn_name, gas) -> None:
+        self.fn_name = fn_name
+        self.abi = {"inputs": [{"type": "bytes32"}]}
+        self.args = ["0" * 32]
+        self.gas = gas
+        self.calls = 0
+
+    def estimateGas(self, transaction):
+        self.calls += 1
+        return self.gas
+
+
+def test_state_dependent_calls_are_always_estimated(tmp_path):
+    eth = SimpleNamespace(blockNumber=100, getBlock=lambda block: {"gasLimit": 10000000})
+    oracle = GasOracle(SimpleNamespace(eth=eth), path=str(tmp_path / "gas_estimates.json"))
+    register_data = ContractFunction("registerData", 1000)
+    process_payment = ContractFunction("processPayment", 1000)
+    assert oracle.estimate(register_data, "0x01") == 1200
+    assert oracle.estimate(process_payment, "0x01") == 1200
+
+    register_data.gas = process_payment.gas = 2000  # job's state changed since the last estimate
+    assert oracle.estimate(register_data, "0x01") == 1200  # cached
+    assert oracle.estimate(process_payment, "0x01") == 2400
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+import json
+
+import pytest
+
+from libs.journal import Journal
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "journal.jsonl")
+
+
+def test_torn_last_record_is_ignored_on_replay(path):
+    journal = Journal(path)
+    journal.mark(100, 0, "seen", job_key="job_key", index=0)
+    journal.mark(100, 0, "submitted")
+    journal.mark(101, 0, "seen", job_key="job_key", index=1)
+    journal.flush()
+    with open(path, "a") as f:  # crashed while the record is being written
+        f.write(json.dumps({"block_number": 101, "log_index": 0, "state": "submitted"})[:20])
+
+    replayed = Journal(path)
+    assert replayed.get_state(100, 0) == "submitted"
+    assert replayed.get_state(101, 0) == "seen"
+
+    # record that is appended after the torn one is kept
+    replayed.mark(101, 0, "staged")
+    replayed.flush()
+    assert Journal(path).get_state(101, 0) == "staged"
+
+
+def test_state_does_not_go_backward(path):
+    journal = Journal(path)
+    journal.mark(100, 0, "seen", job_key="job_key", index=0)
+    assert journal.mark_job("job_key", 0, "payment_sent", tx_hash="0x01")
+    journal.mark(100, 0, "staged")  # staging of a job that is processed again
+    assert journal.get_state(100, 0) == "payment_sent"
+    assert Journal(path).get_state(100, 0) == "payment_sent"
+    assert not journal.mark_job("job_key", 1, "paid")  # not journaled
+
+
+def test_unfinished_job_is_not_accepted_after_restart(path):
+    journal = Journal(path)
+    journal.mark(100, 0, "seen", job_key="job_key", index=0)
+    journal.mark(100, 0, "staged")
+    journal.mark(101, 0, "seen", job_key="job_key", index=1)
+    journal.mark(101, 0, "submitted")
+    journal.flush()
+
+    replayed = Journal(path)
+    assert not replayed.is_accepted(100, 0)  # staged job is processed again
+    assert replayed.is_accepted(101, 0)
+
+
+def test_compaction_keeps_the_last_state_of_each_event(path):
+    journal = Journal(path)
+    journal.mark(100, 0, "seen", job_key="job_key", index=0)
+    journal.mark(100, 0, "submitted")
+    journal.mark(100, 0, "paid", tx_hash="0x01")
+    journal.compact()
+    with open(path) as f:
+        records = [json.loads(line) for line in f]
+
+    assert len(records) == 1
+    assert records[0]["state"] == "paid" and records[0]["job_key"] == "job_key"
+    assert Journal(path).get_state(100, 0) == "paid"
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import libs.slurm as slurm
+from libs.slurm import SlurmSnapshot
+
+SINFO = {
+    "nodes": [
+        {"name": "node1", "state": ["MIXED"], "cpus": 8, "alloc_cpus": 2, "idle_cpus": 6},
+        {"name": "node2", "state": ["IDLE", "DRAIN"], "cpus": 4, "alloc_cpus": 0, "idle_cpus": 4},
+        {"name": "node3", "state": "DOWN", "cpus": 4, "alloc_cpus": 0},
+    ]
+}
+
+
+def communicate(returncodes):
+    def popen_communicate(cmd):
+        returncode, output, error_msg = returncodes.pop(0)
+        return SimpleNamespace(returncode=returncode), output, error_msg
+
+    return popen_communicate
+
+
+@pytest.fixture
+def formatted(monkeypatch):
+    calls = []
+
+    def run(cmd):
+        calls.append(cmd)
+        return "2/6/8/16" if cmd == ["sinfo", "-h", "-o%C"] else ""
+
+    monkeypatch.setattr(slurm, "run", run)
+    return calls
+
+
+def test_cpus_of_unavailable_nodes_are_not_idle(monkeypatch, formatted):
+    monkeypatch.setattr(slurm, "popen_communicate", communicate([(0, json.dumps(SINFO), ""), (0, "{}", "")]))
+    snapshot = SlurmSnapshot()
+    snapshot.refresh()
+    assert snapshot.cores == slurm.CoreInfo(allocated=2, idle=6, other=8, total=16)
+    assert not formatted
+
+
+def test_json_is_disabled_only_if_it_is_not_supported(monkeypatch, formatted):
+    unreachable = (1, "", "slurm_load_node error: Unable to contact slurm controller")
+    unsupported = (1, "", "sinfo: unrecognized option '--json'")
+    monkeypatch.setattr(slurm, "popen_communicate", communicate([unreachable, unsupported]))
+    snapshot = SlurmSnapshot()
+    snapshot.refresh()
+    assert snapshot.is_json_supported and snapshot.cores.idle == 6
+
+    snapshot.refresh()
+    assert not snapshot.is_json_supported
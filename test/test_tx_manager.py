@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+
+from concurrent.futures import Future
+
+import pytest
+from web3.exceptions import TransactionNotFound
+
+import eblocbroker.tx_manager as tx_manager
+from eblocbroker.tx_manager import REPRICE_FACTOR, STUCK_BLOCKS, TxManager
+
+
+class Eth:
+    def __init__(self) -> None:
+        self.blockNumber = 100
+        self.gasPrice = 1000
+        self.mined_nonce = 0
+        self.pending_nonce = 0
+        self.errors = []
+        self.sent = []
+        self.receipts = {}
+
+    def getTransactionCount(self, address, block="latest"):
+        return self.pending_nonce if block == "pending" else self.mined_nonce
+
+    def sendTransaction(self, tx):
+        if self.errors:
+            raise ValueError(self.errors.pop(0))
+
+        self.sent.append(dict(tx))
+        return bytes([len(self.sent)]) * 32
+
+    def getTransactionReceipt(self, tx_hash):
+        try:
+            return self.receipts[tx_hash]
+        except KeyError:
+            raise TransactionNotFound(tx_hash)
+
+    def waitForTransactionReceipt(self, tx_hash, timeout):
+        return self.receipts[tx_hash]
+
+    def mine(self, tx_hash, status=1):
+        self.receipts[tx_hash] = {"transactionHash": bytes.fromhex(tx_hash), "status": status, "gasUsed": 21000}
+        self.mined_nonce += 1
+
+
+class W3:
+    def __init__(self) -> None:
+        self.eth = Eth()
+
+    def toChecksumAddress(self, address):
+        return address
+
+
+class GasOracle:
+    def __init__(self, eth) -> None:
+        self.eth = eth
+
+    def estimate(self, contract_function, _from):
+        return 100000
+
+    def get_gas_price(self):
+        return self.eth.gasPrice
+
+    def record(self, key, gas, gas_used):
+        pass
+
+
+class ContractFunction:
+    fn_name = "processPayment"
+    abi = {"inputs": []}
+    args = ()
+
+    def buildTransaction(self, tx):
+        return dict(tx, to="0xcontract", data="0x00", value=0)
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    w3 = W3()
+    _manager = TxManager(w3, GasOracle(w3.eth), path=str(tmp_path / "tx_queue.json"))
+    monkeypatch.setattr(_manager, "start", lambda *args, **kwargs: None)  # receipts are polled by the tests
+    return _manager
+
+
+def test_nonces_are_assigned_without_waiting_for_receipts(manager):
+    # node does not report the pending transactions yet, nonce is taken from the queue
+    manager.send(ContractFunction())
+    manager.send(ContractFunction())
+    assert [tx["nonce"] for tx in manager.w3.eth.sent] == [0, 1]
+    assert sorted(manager._load()["pending"]) == ["0", "1"]
+
+
+def test_nonce_used_outside_the_queue_is_skipped(manager):
+    eth = manager.w3.eth
+    eth.pending_nonce = 3  # nonce=3 is also used by a transaction that is not in the node's pool yet
+    eth.errors = ["{'code': -32000, 'message': 'nonce too low'}"]
+    manager.send(ContractFunction())
+    assert [tx["nonce"] for tx in eth.sent] == [4]
+    assert manager._load()["nonce"] == 5
+
+
+def test_stuck_transaction_is_replaced_with_the_same_nonce(manager, monkeypatch):
+    marked = []
+    monkeypatch.setattr(tx_manager.journal, "mark_job", lambda *args, **kwargs: marked.append(args))
+    eth = manager.w3.eth
+    tx_hash = manager.send(ContractFunction(), job=("job_key", 0))
+    future = manager.receipts.setdefault(tx_hash, Future())
+    manager.poll()
+    assert len(eth.sent) == 1  # not stuck yet
+
+    eth.blockNumber += STUCK_BLOCKS
+    manager.poll()
+    original, replacement = eth.sent
+    assert replacement["nonce"] == original["nonce"]
+    assert replacement["gasPrice"] >= original["gasPrice"] * REPRICE_FACTOR
+    entry = manager._load()["pending"]["0"]
+    assert entry["tx_hashes"][0] == tx_hash and len(entry["tx_hashes"]) == 2
+    assert not marked
+
+    # receipt of the replacement is returned to the waiter of the original tx_hash
+    eth.mine(entry["tx_hashes"][1])
+    manager.poll()
+    assert future.result(timeout=0)["transactionHash"].hex() == entry["tx_hashes"][1]
+    assert manager._load()["pending"] == {}
+    assert marked == [("job_key", 0, "paid")]
+
+
+def test_reverted_payment_is_not_marked_as_paid(manager, monkeypatch):
+    marked = []
+    monkeypatch.setattr(tx_manager.journal, "mark_job", lambda *args, **kwargs: marked.append(args))
+    tx_hash = manager.send(ContractFunction(), job=("job_key", 0))
+    manager.w3.eth.mine(tx_hash, status=0)
+    manager.poll()
+    assert manager._load()["pending"] == {}
+    assert not marked
+
+
+def test_transaction_whose_nonce_is_used_by_another_one_fails(manager):
+    eth = manager.w3.eth
+    tx_hash = manager.send(ContractFunction())
+    future = manager.receipts.setdefault(tx_hash, Future())
+    eth.mined_nonce = 1  # mined without any of the sent hashes
+    manager.poll()
+    with pytest.raises(Exception, match="replaced"):
+        future.result(timeout=0)
+
+    assert manager._load()["pending"] == {}
+
+
+def test_thread_is_kept_alive_for_the_driver(tmp_path, monkeypatch):
+    monkeypatch.setattr(tx_manager, "POLL_INTERVAL", 0.01)
+    w3 = W3()
+    manager = TxManager(w3, GasOracle(w3.eth), path=str(tmp_path / "tx_queue.json"))
+    manager.start()
+    thread = manager.thread
+    if thread:
+        thread.join(timeout=5)
+
+    assert manager.thread is None  # exits once the queue is drained
+
+    manager.start(is_keep_alive=True)
+    thread = manager.thread
+    thread.join(timeout=0.1)
+    assert thread.is_alive() and manager.thread is thread
+
+    tx_hash = manager.send(ContractFunction())
+    w3.eth.mine(tx_hash)
+    assert manager.wait_receipt(tx_hash, timeout=5)["status"] == 1
+
+
+def test_receipt_collected_by_another_process_is_followed(tmp_path, monkeypatch):
+    monkeypatch.setattr(tx_manager.journal, "mark_job", lambda *args, **kwargs: None)
+    w3 = W3()
+    path = str(tmp_path / "tx_queue.json")
+    driver = TxManager(w3, GasOracle(w3.eth), path=path)
+    end_code = TxManager(w3, GasOracle(w3.eth), path=path)
+    monkeypatch.setattr(end_code, "start", lambda *args, **kwargs: None)
+    tx_hash = end_code.send(ContractFunction(), job=("job_key", 0))
+    future = end_code.watch(tx_hash)
+
+    # re-priced and collected by the driver, which drops the entry from the shared queue
+    w3.eth.blockNumber += STUCK_BLOCKS
+    driver.poll()
+    end_code.poll()  # replacement is seen while the entry is still pending
+    replacement = driver._load()["pending"]["0"]["tx_hashes"][1]
+    w3.eth.mine(replacement)
+    driver.poll()
+    assert driver._load()["pending"] == {} and not future.done()
+
+    end_code.poll()
+    assert future.result(timeout=0)["transactionHash"].hex() == replacement
+    assert end_code.receipts == {} and end_code.waited == {}
+
+
+def test_waited_transaction_that_is_dropped_from_the_queue_fails_once_its_nonce_is_used(tmp_path):
+    w3 = W3()
+    path = str(tmp_path / "tx_queue.json")
+    driver = TxManager(w3, GasOracle(w3.eth), path=path)
+    end_code = TxManager(w3, GasOracle(w3.eth), path=path)
+    end_code.start = driver.start = lambda *args, **kwargs: None
+    tx_hash = end_code.send(ContractFunction())
+    future = end_code.watch(tx_hash)
+    w3.eth.mined_nonce = 1  # mined without any of the sent hashes
+    driver.poll()
+    end_code.poll()
+    with pytest.raises(Exception, match="replaced"):
+        future.result(timeout=0)
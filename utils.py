@@ -2,6 +2,7 @@
 
 import binascii
 import errno
+import gzip
 import hashlib
 import json
 import ntpath
@@ -29,6 +30,7 @@ from termcolor import colored
 import config
 from _utils._getch import _Getch
 from config import env, logging
+from libs.md5sum import hash_cache, md5sum_folder
 
 Qm = b"\x12 "
 empty_bytes32 = b"\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00"
@@ -180,7 +182,7 @@ def _try(func):
         raise
 
 
-def run(cmd, my_env=None, is_print_trace=True) -> str:
+def run(cmd, my_env=None, is_print_trace=True, cwd=None) -> str:
     if not isinstance(cmd, str):
         cmd = list(map(str, cmd))  # all items should be str
     else:
@@ -188,9 +190,9 @@ def run(cmd, my_env=None, is_print_trace=True) -> str:
 
     try:
         if my_env is None:
-            return check_output(cmd).decode("utf-8").strip()
+            return check_output(cmd, cwd=cwd).decode("utf-8").strip()
         else:
-            return check_output(cmd, env=my_env).decode("utf-8").strip()
+            return check_output(cmd, env=my_env, cwd=cwd).decode("utf-8").strip()
     except CalledProcessError as e:
         if is_print_trace:
             print_trace(cmd, back=2, exc=e.output.decode("utf-8"))
@@ -312,13 +314,19 @@ def byte_to_mb(size_in_bytes: float) -> int:
 
 
 def generate_md5sum(path: str) -> str:
+    """Return md5sum of the file or the folder.
+
+    Folder's md5sum is identical with the output of the
+    bash_scripts/generate_md5sum_for_folder.sh script.
+    """
     if os.path.isdir(path):
-        script = f"{env.EBLOCPATH}/bash_scripts/generate_md5sum_for_folder.sh"
-        return run(["bash", script, path])
+        return md5sum_folder(path)
 
     if os.path.isfile(path):
-        tar_hash = check_output(["md5sum", path]).decode("utf-8").strip()
-        return tar_hash.split(" ", 1)[0]
+        hash_cache.load()
+        tar_hash = hash_cache.md5sum(path)
+        hash_cache.save()
+        return tar_hash
     else:
         logging.error(f"{path} does not exist")
         raise
@@ -383,23 +391,23 @@ def read_json(path, is_dict=True):
         raise
 
 
-def is_gzip_file_empty(filename):
+def is_gzip_file_empty(filename) -> bool:
     """Checks whether the given gzip file is empty or not.
-    *  cmd: gzip -l foo.gz | awk 'NR==2 {print $2}
+
+    Only the first byte is decompressed, the size stored in the gzip trailer
+    (`gzip -l`) is not used since it wraps around for the files over 4 GB.
     """
-    p1 = Popen(["gzip", "-l", filename], stdout=PIPE, env={"LC_ALL": "C"})
-    p2 = Popen(["awk", "NR==2 {print $2}"], stdin=p1.stdout, stdout=PIPE)
-    p1.stdout.close()
-    size = p2.communicate()[0].decode("utf-8").strip()
     try:
-        if not bool(int(size)):
-            log(f"==> Created gzip file ({filename}) is empty.")
-            return True
-        else:
-            return False
-    except Exception:
+        with gzip.open(filename, "rb") as f:
+            is_empty = not f.read(1)
+    except (OSError, EOFError):
         return False
 
+    if is_empty:
+        log(f"==> Created gzip file ({filename}) is empty.")
+
+    return is_empty
+
 
 def getsize(filename):
     """Return the size of a file, reported by os.stat()."""
@@ -482,7 +490,7 @@ def log(text="", color=None, filename=None, end=None, is_bold=True):
         elif text == "FAILED":
             color = "red"
 
-    if threading.current_thread().name != "MainThread" and env.IS_THREADING_ENABLED:
+    if threading.current_thread().name in log_files and env.IS_THREADING_ENABLED:
         filename = log_files[threading.current_thread().name]
     elif not filename:
         try:
@@ -756,6 +764,39 @@ def is_program_valid(cmd):
         terminate(f"E: Please install {cmd[0]} or check its path", is_traceback=False)
 
 
+def _sorted_tree(base_name, cwd) -> bytes:
+    """Return NUL separated paths under the folder as `cd cwd && find base_name -print0 | LC_ALL=C sort -z` does."""
+    paths = [os.fsencode(base_name)]
+    for root, dirs, files in os.walk(os.path.join(cwd, base_name)):
+        root = os.path.relpath(root, cwd)
+        for name in dirs + files:
+            paths.append(os.fsencode(os.path.join(root, name)))
+
+    return b"".join(path + b"\0" for path in sorted(paths))
+
+
+def _write_archive(cmd, base_name, f, cwd) -> str:
+    """Write the tar stream of the command, that runs under cwd, into the file object and return its md5sum."""
+    md5 = hashlib.md5()
+    p = Popen(cmd, stdin=PIPE, stdout=PIPE, env={"PIGZ": "-n"}, cwd=cwd)  # alternative: "GZIP"
+
+    def write_paths():
+        with p.stdin:
+            p.stdin.write(_sorted_tree(base_name, cwd))
+
+    writer = threading.Thread(target=write_paths)
+    writer.start()
+    for chunk in iter(lambda: p.stdout.read(1024 * 1024), b""):
+        f.write(chunk)
+        md5.update(chunk)
+
+    writer.join()
+    if p.wait() != 0:
+        raise CalledProcessError(p.returncode, cmd)
+
+    return md5.hexdigest()
+
+
 def compress_folder(folder_path, is_exclude_git=False):
     """Compress folder using tar
     - Note that to get fully reproducible tarballs, you should also impose the sort order used by tar
@@ -765,50 +806,47 @@ def compress_folder(folder_path, is_exclude_git=False):
     - https://unix.stackexchange.com/a/438330/198423  == (tar produces different files each time)
     - https://unix.stackexchange.com/questions/580685/why-does-the-pigz-produce-a-different-md5sum
     """
+    folder_path = os.path.abspath(folder_path.rstrip("/"))
     base_name = os.path.basename(folder_path)
     dir_path = os.path.dirname(folder_path)
-    tar_base = f"{base_name}.tar.gz"
-    with cd(dir_path):
-        """cmd:
-        find . -print0 | LC_ALL=C sort -z | \
-                    PIGZ=-n tar -Ipigz --mtime='1970-01-01 00:00:00' --mode=a+rwX --owner=0 \
-                    --group=0 --numeric-owner --no-recursion \
-                    --null -T - -cvf /tmp/work/output.tar.gz && md5sum /tmp/work/output.tar.gz
-        """
-        cmd = [
-            "tar",
-            "-Ipigz",
-            "--exclude=.mypy_cache",  # exclude some hidden folders
-            "--exclude=.venv",
-            "--mtime=1970-01-01 00:00:00",
-            "--mode=a+rwX",
-            "--owner=0",
-            "--group=0",
-            # "--absolute-names",  # --absolute-names is not needed, since absolute paths are not used
-            "--numeric-owner",
-            "--no-recursion",
-            "--null",
-            "-T",
-            "-",
-            "-cvf",
-            tar_base,
-        ]
-        if is_exclude_git:
-            # consider ignoring to add .git into the requested folder
-            idx = 2
-            cmd = cmd[:idx] + ["--exclude=.git"] + cmd[idx:]
-
-        p1 = Popen(["find", base_name, "-print0"], stdout=PIPE)
-        p2 = Popen(["sort", "-z"], stdin=p1.stdout, stdout=PIPE, env={"LC_ALL": "C"})
-        p1.stdout.close()
-        p3 = Popen(cmd, stdin=p2.stdout, stdout=PIPE, env={"PIGZ": "-n"},)  # alternative: "GZIP"
-        p2.stdout.close()
-        p3.communicate()
-        tar_hash = generate_md5sum(tar_base)
-        tar_file = f"{tar_hash}.tar.gz"
-        shutil.move(tar_base, tar_file)
-        log(f"==> Created tar file={dir_path}/{tar_file}")
-        log(f"==> tar_hash={tar_hash}")
+    tar_base = f"{dir_path}/{base_name}.tar.gz"
+    """cmd:
+    find . -print0 | LC_ALL=C sort -z | \
+                PIGZ=-n tar -Ipigz --mtime='1970-01-01 00:00:00' --mode=a+rwX --owner=0 \
+                --group=0 --numeric-owner --no-recursion \
+                --null -T - -cvf /tmp/work/output.tar.gz && md5sum /tmp/work/output.tar.gz
+    """
+    cmd = [
+        "tar",
+        "-Ipigz",
+        "--exclude=.mypy_cache",  # exclude some hidden folders
+        "--exclude=.venv",
+        "--mtime=1970-01-01 00:00:00",
+        "--mode=a+rwX",
+        "--owner=0",
+        "--group=0",
+        # "--absolute-names",  # --absolute-names is not needed, since absolute paths are not used
+        "--numeric-owner",
+        "--no-recursion",
+        "--null",
+        "-T",
+        "-",
+        "-cf",
+        "-",
+    ]
+    if is_exclude_git:
+        # consider ignoring to add .git into the requested folder
+        idx = 2
+        cmd = cmd[:idx] + ["--exclude=.git"] + cmd[idx:]
+
+    # paths are streamed into tar in sorted order and the archive is hashed while it is written
+    with open(tar_base, "wb") as f:
+        tar_hash = _write_archive(cmd, base_name, f, dir_path)
+
+    tar_file = f"{tar_hash}.tar.gz"
+    shutil.move(tar_base, f"{dir_path}/{tar_file}")
+    log(f"==> Created tar file={dir_path}/{tar_file}")
+    log(f"==> tar_hash={tar_hash}")
     return tar_hash, f"{dir_path}/{tar_file}"
 
 
@@ -863,6 +901,10 @@ class Link:
 class cd:
     """Context manager for changing the current working directory.
 
+    The working directory is shared by all the threads of the process, hence
+    it should not be used by the threads that process the jobs, which pass
+    `cwd` into their subprocesses instead.
+
     doc: https://stackoverflow.com/a/13197763/2402577
     """
 